@@ -1,7 +1,9 @@
 import uvicorn
 
 def main():
-    uvicorn.run("api.app:app", host="0.0.0.0", port=8101, debug=True, reload=True)
+    uvicorn.run(
+        "api.app:create_app", factory=True, host="0.0.0.0", port=8101, debug=True, reload=True
+    )
 
 if __name__ == "__main__":
     main()
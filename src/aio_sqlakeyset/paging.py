@@ -7,15 +7,20 @@ The modules in this directory are a heavily modified version of the "sqlakeyset"
 We started by making the library compatible with `asyncio` and 2.0 SQLAlchemy style, and ended up only keeping the
 parts we need.
 """
-from typing import Any, Optional
+import asyncio
+from bisect import bisect_right
+from typing import Any, AsyncIterator, Iterable, Optional, Sequence
 
-from sqlalchemy import tuple_
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from aio_sqlakeyset.columns import OC, find_order_key, parse_ob_clause
 from aio_sqlakeyset.results import Page, Paging
 from aio_sqlakeyset.serial import InvalidPage
 
+_PARTITION_LABEL = "_sqlakeyset_partition"
+_ROW_NUMBER_LABEL = "_sqlakeyset_row_number"
+
 
 def where_condition_for_page(ordering_columns: list[OC], place: tuple[Any], db: AsyncSession):
     """
@@ -43,12 +48,62 @@ def where_condition_for_page(ordering_columns: list[OC], place: tuple[Any], db:
     return condition
 
 
+def _prepare_selectable(selectable, db: AsyncSession, place: Optional[tuple[Any]], backwards: bool):
+    """
+    Apply the ordering and paging condition for a page to the selectable.
+
+    Returns:
+        The new selectable, its ordering columns, their mapped ordering columns, and the extra columns added to
+        it to get keyset markers from result rows.
+    """
+    # Build a list of ordering columns (ocols) in the form of `MappedOrderColumn` objects.
+    order_cols = parse_ob_clause(selectable, backwards)
+    mapped_ocols = [find_order_key(ocol, selectable.column_descriptions) for ocol in order_cols]
+
+    # Update the selectable with the new order_by clauses.
+    new_order_by_clauses = [col.ob_clause for col in mapped_ocols]
+    selectable = selectable.order_by(None).order_by(*new_order_by_clauses)
+
+    # Add the extra columns required for the ordering.
+    extra_columns = [col.extra_column for col in mapped_ocols if col.extra_column is not None]
+    selectable = selectable.add_columns(*extra_columns)
+
+    if place:
+        selectable = _apply_place(selectable, order_cols, place, db)
+
+    return selectable, order_cols, mapped_ocols, extra_columns
+
+
+def _apply_place(selectable, order_cols: list[OC], place: tuple[Any], db: AsyncSession):
+    # Prepare the condition for selecting a specific page.
+    condition = where_condition_for_page(order_cols, place, db)
+
+    # If there is at least one GROUP BY clause, we have an aggregate query.
+    # In this case, the paging condition is applied AFTER aggregation. To do so, we must use HAVING and not FILTER.
+    if selectable._group_by_clauses:
+        return selectable.having(condition)
+    return selectable.where(condition)
+
+
+def _get_marker(row, mapped_ocols) -> tuple[Any]:
+    return tuple(col.get_from_row(row) for col in mapped_ocols)
+
+
+def _build_page(rows, row_keys, per_page, order_cols, mapped_ocols, n_extra, backwards, place, start=0) -> Page:
+    # The page is a view of `rows` from `start` on. The `n_extra` trailing extra columns are trimmed off the rows as
+    # they are read, and markers are only taken from the rows at the edges of the page.
+    paging = Paging(rows, per_page, mapped_ocols, backwards, place, get_marker=_get_marker, start=start, n_extra=n_extra)
+    return Page(paging.rows, paging, keys=row_keys[: -n_extra or None])
+
+
 async def get_page(
         selectable,
         per_page: int,
         db: AsyncSession,
         place: Optional[tuple[Any]] = None,
-        backwards: bool = False
+        backwards: bool = False,
+        params: Optional[dict[str, Any]] = None,
+        probe: bool = False,
     ) -> Page:
     """
     Get a page from an SQLAlchemy Core selectable.
@@ -58,45 +113,315 @@ async def get_page(
         per_page: Number of rows per page.
         place: Keyset representing the place after which to start the page.
         backwards: If ``True``, reverse pagination direction.
+        params: Values for the bind params of the selectable, if any.
+        probe: If ``True``, only find out whether there are rows beyond the page, without fetching the page. The
+            page comes back empty, and its paging only knows about the places before and after it.
 
     Returns:
         The result page.
     """
-    # Build a list of ordering columns (ocols) in the form of `MappedOrderColumn` objects.
-    order_cols = parse_ob_clause(selectable, backwards)
-    mapped_ocols = [find_order_key(ocol, selectable.column_descriptions) for ocol in order_cols]
+    selectable, order_cols, mapped_ocols, extra_columns = _prepare_selectable(selectable, db, place, backwards)
 
-    # Update the selectable with the new order_by clauses.
-    new_order_by_clauses = [col.ob_clause for col in mapped_ocols]
-    selectable = selectable.order_by(None).order_by(*new_order_by_clauses)
+    if probe:
+        # Skip the page and fetch the one row after it, if any.
+        selectable = selectable.offset(per_page).limit(1)
+    else:
+        # Limit the amount of results in the page. The 1 extra is to check if there's a further page.
+        selectable = selectable.limit(per_page + 1)
 
-    # Add the extra columns required for the ordering.
-    extra_columns = [col.extra_column for col in mapped_ocols if col.extra_column is not None]
-    selectable = selectable.add_columns(*extra_columns)
+    # Run the selectable and get back the query rows.
+    # NOTE: Do not use `.scalars` here, as it might lead to some rows being omitted by the ORM.
+    selected = await db.execute(selectable, params)
+    row_keys = list(selected.keys())
+    rows = selected.all()
 
-    if place:
-        # Prepare the condition for selecting a specific page.
-        condition = where_condition_for_page(order_cols, place, db)
+    # Finally, construct the `Page` object. A probed row is all excess, past a page of zero rows.
+    return _build_page(
+        rows, row_keys, 0 if probe else per_page, order_cols, mapped_ocols, len(extra_columns), backwards, place
+    )
 
-        # If there is at least one GROUP BY clause, we have an aggregate query.
-        # In this case, the paging condition is applied AFTER aggregation. To do so, we must use HAVING and not FILTER.
-        if selectable._group_by_clauses:
-            selectable = selectable.having(condition)
-        else:
-            selectable = selectable.where(condition)
 
-    # Limit the amount of results in the page. The 1 extra is to check if there's a further page.
-    selectable = selectable.limit(per_page + 1)
+async def iter_pages(
+        selectable,
+        per_page: int,
+        db: AsyncSession,
+        place: Optional[tuple[Any]] = None,
+        backwards: bool = False,
+        params: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[Page]:
+    """
+    Walk an SQLAlchemy Core selectable page by page, from a single server side cursor.
 
-    # Run the selectable and get back the query rows.
-    # NOTE: Do not use `.scalars` here, as it might lead to some rows being omitted by the ORM.
-    selected = await db.execute(selectable)
+    Rows are fetched ``per_page`` at a time with ``stream_results``, and at most two pages are held in memory. Every
+    page is a regular `Page`, so the bookmark of its last row resumes the walk from there, even from another cursor.
+
+    Args:
+        selectable: The source selectable.
+        per_page: Number of rows per page.
+        place: Keyset representing the place after which to start the walk.
+        backwards: If ``True``, reverse pagination direction.
+        params: Values for the bind params of the selectable, if any.
+
+    Yields:
+        The pages, in paging order.
+    """
+    selectable, order_cols, mapped_ocols, extra_columns = _prepare_selectable(selectable, db, place, backwards)
+    n_extra = len(extra_columns)
+
+    result = await db.stream(selectable, params)
+    try:
+        row_keys = list(result.keys())
+        rows = []
+        async for fetched in result.partitions(per_page):
+            if rows:
+                # The first row fetched is the extra row of the pending page, it has a further page.
+                rows.append(fetched[0])
+                page = _build_page(rows, row_keys, per_page, order_cols, mapped_ocols, n_extra, backwards, place)
+                yield page
+                place = page.paging.marker_n
+            rows = fetched
+        if rows:
+            yield _build_page(rows, row_keys, per_page, order_cols, mapped_ocols, n_extra, backwards, place)
+    finally:
+        await result.close()
+
+
+class PageStream:
+    """
+    A page fetched ``fetch_size`` rows at a time, for callers that can use its first rows before the last ones arrive.
+    See `stream_page`.
+
+    Every batch is its own query, from the keyset of the last row fetched, rather than a read from a server side
+    cursor: the session's other statements can run between batches, while a cursor would hold its connection.
+
+    ``page`` is the page of the rows fetched so far: its rows and its ``bookmark_first`` are the page's from the first
+    fetch on, the rest of its paging is only the page's once ``complete``. Callers fetching concurrently take turns,
+    the rows are fetched once.
+    """
+
+    def __init__(self, selectable, per_page: int, db: AsyncSession, place=None, params=None, fetch_size: int = 100):
+        # Without the place, every batch adds its own. The markers of extra columns are read by their labels, so
+        # all the batches share the same ones.
+        self._selectable, self._order_cols, self._mapped_ocols, extra_columns = _prepare_selectable(
+            selectable, db, None, False
+        )
+        self._per_page = per_page
+        self._db = db
+        self._place = place
+        self._params = params
+        self._fetch_size = fetch_size
+        self._n_extra = len(extra_columns)
+        self._rows = []
+        self._row_keys = []
+        self._lock = asyncio.Lock()
+        self.complete = False
+        self.page = self._build_page()
+
+    def _build_page(self) -> Page:
+        return _build_page(
+            self._rows, self._row_keys, self._per_page, self._order_cols, self._mapped_ocols, self._n_extra, False,
+            self._place,
+        )
+
+    async def fetch(self) -> bool:
+        """
+        Fetch the next rows into ``page``.
+
+        Returns:
+            Whether there may be more rows to fetch, ``False`` once the page is complete.
+        """
+        async with self._lock:
+            if self.complete:
+                return False
+            place = _get_marker(self._rows[-1], self._mapped_ocols) if self._rows else self._place
+            selectable = self._selectable
+            if place:
+                selectable = _apply_place(selectable, self._order_cols, place, self._db)
+            # The page's 1 extra row is to check if there's a further page.
+            limit = min(self._fetch_size, self._per_page + 1 - len(self._rows))
+            selected = await self._db.execute(selectable.limit(limit), self._params)
+            self._row_keys = list(selected.keys())
+            fetched = selected.all()
+            self._rows.extend(fetched)
+            self.complete = len(fetched) < limit or len(self._rows) > self._per_page
+            self.page = self._build_page()
+            return not self.complete
+
+    async def fetch_all(self) -> Page:
+        """Fetch the rest of the page, and return it"""
+        while await self.fetch():
+            pass
+        return self.page
+
+
+def stream_page(
+        selectable,
+        per_page: int,
+        db: AsyncSession,
+        place: Optional[tuple[Any]] = None,
+        params: Optional[dict[str, Any]] = None,
+        fetch_size: int = 100,
+    ) -> PageStream:
+    """
+    Get a page of an SQLAlchemy Core selectable like `get_page` does, ``fetch_size`` rows at a time as they're
+    needed. Nothing runs until the first `PageStream.fetch`.
+
+    Only forwards: a page fetched backwards is in reverse, its first row is the last one fetched.
+
+    Args:
+        selectable: The source selectable.
+        per_page: Number of rows per page.
+        place: Keyset representing the place after which to start the page.
+        params: Values for the bind params of the selectable, if any.
+        fetch_size: Number of rows fetched at a time.
+
+    Returns:
+        The page stream.
+    """
+    return PageStream(selectable, per_page, db, place=place, params=params, fetch_size=fetch_size)
+
+
+async def get_pages(
+        selectable,
+        partition_by,
+        partitions: Iterable[Any],
+        per_page: int,
+        db: AsyncSession,
+        place: Optional[tuple[Any]] = None,
+        backwards: bool = False,
+        params: Optional[dict[str, Any]] = None,
+        probe: bool = False,
+    ) -> dict[Any, Page]:
+    """
+    Get the same page of an SQLAlchemy Core selectable for many partitions of it, in a single statement.
+
+    This is what nested connections need, e.g. the first 10 resources of each of 50 tags. Rows are numbered per
+    partition with ``ROW_NUMBER() OVER (PARTITION BY ...)`` in the page order, and only the first ``per_page + 1`` of
+    each partition are fetched, so every partition gets its own accurate `Paging`.
+
+    Args:
+        selectable: The source selectable. It has to select columns, not ORM entities.
+        partition_by: Column or expression of the selectable to partition rows by, e.g. a parent id.
+        partitions: The values of ``partition_by`` to get pages for.
+        per_page: Number of rows per page.
+        place: Keyset representing the place after which to start the page, the same for every partition.
+        backwards: If ``True``, reverse pagination direction.
+        params: Values for the bind params of the selectable, if any.
+        probe: If ``True``, only fetch the row after each page, see `get_page`.
+
+    Returns:
+        A page for every partition, in the order of ``partitions``.
+    """
+    partitions = list(partitions)
+    selectable, order_cols, mapped_ocols, extra_columns = _prepare_selectable(selectable, db, place, backwards)
+
+    selectable = selectable.where(partition_by.in_(partitions))
+    if selectable._group_by_clauses:
+        selectable = selectable.group_by(partition_by)
+
+    # Number the rows of each partition in the page order. The ordering columns themselves are used in the window,
+    # labels of appended columns can't be referred to from there.
+    row_number = func.row_number().over(partition_by=partition_by, order_by=[ocol.uo for ocol in order_cols])
+    selectable = selectable.order_by(None).add_columns(
+        partition_by.label(_PARTITION_LABEL),
+        row_number.label(_ROW_NUMBER_LABEL),
+    )
+    numbered = selectable.subquery()
+    row_number = numbered.c[_ROW_NUMBER_LABEL]
+    selectable = (
+        select(numbered)
+        .where(row_number == per_page + 1 if probe else row_number <= per_page + 1)
+        .order_by(numbered.c[_PARTITION_LABEL], numbered.c[_ROW_NUMBER_LABEL])
+    )
+
+    selected = await db.execute(selectable, params)
     row_keys = list(selected.keys())
-    rows = selected.all()
+    rows_by_partition = {partition: [] for partition in partitions}
+    for row in selected.all():
+        rows_by_partition[row[-2]].append(row)
+
+    # The partition and row number columns are trimmed off along with the extra ordering columns.
+    n_extra = len(extra_columns) + 2
+    page_size = 0 if probe else per_page
+    return {
+        partition: _build_page(rows, row_keys, page_size, order_cols, mapped_ocols, n_extra, backwards, place)
+        for partition, rows in rows_by_partition.items()
+    }
+
+
+async def get_markers(
+        selectable,
+        every: int,
+        db: AsyncSession,
+        params: Optional[dict[str, Any]] = None,
+    ) -> list[tuple[int, tuple[Any]]]:
+    """
+    Get the keyset markers of every ``every``-th row of an SQLAlchemy Core selectable, in a single statement.
+
+    Markers are places like the ones `get_page` takes, so a page can be started right after any of them. Along with
+    `get_page_at`, they let you jump to a page by its number without an ``OFFSET`` from the start.
 
-    # Finally, construct the `Page` object.
-    # Trim off the extra columns and return as a correct-as-possible sqlalchemy Row.
-    out_rows = [row[: -len(extra_columns) or None] for row in rows]
-    key_rows = [tuple(col.get_from_row(row) for col in mapped_ocols) for row in rows]
-    paging = Paging(out_rows, per_page, order_cols, backwards, place, markers=key_rows)
-    return Page(paging.rows, paging, keys=row_keys[: -len(extra_columns) or None])
+    Args:
+        selectable: The source selectable, in the (forward) order of the pages.
+        every: Number of rows between two markers.
+        params: Values for the bind params of the selectable, if any.
+
+    Returns:
+        ``(position, marker)`` pairs in page order, ``position`` being the 0-based position of the row ``marker``
+        belongs to.
+    """
+    selectable, order_cols, mapped_ocols, _ = _prepare_selectable(selectable, db, None, False)
+    row_number = func.row_number().over(order_by=[ocol.uo for ocol in order_cols])
+    numbered = selectable.order_by(None).add_columns(row_number.label(_ROW_NUMBER_LABEL)).subquery()
+    row_number = numbered.c[_ROW_NUMBER_LABEL]
+    selectable = select(numbered).where(row_number % every == 0).order_by(row_number)
+
+    rows = (await db.execute(selectable, params)).all()
+    return [(row[-1] - 1, _get_marker(row, mapped_ocols)) for row in rows]
+
+
+async def get_page_at(
+        selectable,
+        per_page: int,
+        position: int,
+        db: AsyncSession,
+        markers: Sequence[tuple[int, tuple[Any]]] = (),
+        params: Optional[dict[str, Any]] = None,
+    ) -> Page:
+    """
+    Get the page starting at a row position of an SQLAlchemy Core selectable, walking there from the nearest marker.
+
+    The row before the page is found with an ``OFFSET`` from the nearest marker before it, and its place starts the
+    page, so the cost of the walk depends on the distance between markers and not on ``position``. Without markers,
+    the walk starts from the first row.
+
+    Args:
+        selectable: The source selectable, in the (forward) order of the pages.
+        per_page: Number of rows per page.
+        position: 0-based position of the first row of the page.
+        markers: ``(position, marker)`` pairs sorted by position, like the ones returned by `get_markers`.
+        params: Values for the bind params of the selectable, if any.
+
+    Returns:
+        The result page, with places and bookmarks like any other page.
+    """
+    if position <= 0:
+        return await get_page(selectable, per_page, db, params=params)
+
+    # The nearest marker at or before the row just before the page.
+    index = bisect_right([marker_position for marker_position, _ in markers], position - 1) - 1
+    start, place = markers[index] if index >= 0 else (-1, None)
+    if start == position - 1:
+        return await get_page(selectable, per_page, db, place=place, params=params)
+
+    selectable, order_cols, mapped_ocols, extra_columns = _prepare_selectable(selectable, db, place, False)
+    # One row before the page for its place, and one after to check if there's a further page.
+    selectable = selectable.offset(position - 2 - start).limit(per_page + 2)
+
+    selected = await db.execute(selectable, params)
+    row_keys = list(selected.keys())
+    rows = selected.all()
+    if not rows:
+        return _build_page([], row_keys, per_page, order_cols, mapped_ocols, len(extra_columns), False, None)
+    place = _get_marker(rows[0], mapped_ocols)
+    return _build_page(rows, row_keys, per_page, order_cols, mapped_ocols, len(extra_columns), False, place, start=1)
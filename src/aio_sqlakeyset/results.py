@@ -1,6 +1,7 @@
 """Paging data structures and bookmark handling."""
 import base64
 import csv
+from collections.abc import Sequence
 from typing import Any, Optional
 
 from aio_sqlakeyset.serial import BadBookmark, Serial
@@ -61,19 +62,86 @@ def unserialize_bookmark(bookmark: Optional[str]) -> tuple[Optional[tuple[Any]],
     return cells, backwards
 
 
-class Page(list):
+class Rows(Sequence):
     """
-    A :class:`list` of result rows with access to paging information and
-    some convenience methods.
+    Read-only view of ``count`` rows of a row buffer starting at ``start``, in reverse if ``backwards``. The last
+    ``n_extra`` columns of the buffered rows are left out when a row is accessed, without them a buffered row is
+    returned as is. The buffer isn't copied, so pages built out of the same fetched rows share them.
     """
 
+    __slots__ = ("_buffer", "_start", "_count", "_backwards", "_n_extra")
+
+    def __init__(self, buffer, start: int = 0, count: Optional[int] = None, backwards: bool = False, n_extra: int = 0):
+        self._buffer = buffer
+        self._start = start
+        self._count = len(buffer) - start if count is None else count
+        self._backwards = backwards
+        self._n_extra = n_extra
+
+    def __len__(self):
+        return self._count
+
+    def _buffer_index(self, index: int) -> int:
+        """Position in the buffer of the row at `index` in the view"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("row index out of range")
+        if self._backwards:
+            index = self._count - 1 - index
+        return self._start + index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        row = self._buffer[self._buffer_index(index)]
+        return row[: -self._n_extra] if self._n_extra else row
+
+    def __iter__(self):
+        indexes = range(self._start, self._start + self._count)
+        for index in reversed(indexes) if self._backwards else indexes:
+            row = self._buffer[index]
+            yield row[: -self._n_extra] if self._n_extra else row
+
+    def __eq__(self, other):
+        if isinstance(other, (Rows, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Rows({list(self)!r})"
+
+
+class Page(Sequence):
+    """
+    A sequence of result rows with access to paging information and some convenience methods. It's a view of the
+    same rows as ``paging.rows``, built by `Paging` without copying them.
+    """
+
+    __slots__ = ("_rows", "paging", "_keys")
+
     def __init__(self, iterable, paging: "Paging", keys=None):
-        super().__init__(iterable)
+        self._rows = iterable if isinstance(iterable, Rows) else Rows(list(iterable))
         self.paging = paging
         """The :class:`Paging` information describing how this page relates to the
        whole resultset."""
         self._keys = keys
 
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __eq__(self, other):
+        return self._rows == (other._rows if isinstance(other, Page) else other)
+
+    def __repr__(self):
+        return f"Page({list(self._rows)!r})"
+
     def scalar(self):
         """
         Assuming paging was called with ``per_page=1`` and a single-column
@@ -111,8 +179,28 @@ class Paging:
     Object with paging information. Most properties return a page marker.
     Prefix these properties with ``bookmark_`` to get the serialized version of
     that page marker.
+
+    ``rows`` is the buffer of fetched rows, the page being the first ``per_page`` of them from ``start`` on, and the
+    row after it telling whether there's a further page. Markers are taken from the buffered rows with
+    ``get_marker(row, ocols)``, or looked up in ``markers`` by position from ``start``, and only for the rows at the
+    edges of the page. The last ``n_extra`` columns of the rows are left out of ``rows`` (see `Rows`).
     """
 
+    __slots__ = (
+        "original_rows",
+        "rows",
+        "per_page",
+        "backwards",
+        "marker_0",
+        "marker_1",
+        "marker_n",
+        "marker_nplus1",
+        "_previous",
+        "_first",
+        "_last",
+        "_next",
+    )
+
     def __init__(
         self,
         rows,
@@ -122,45 +210,45 @@ class Paging:
         current_marker,
         get_marker=None,
         markers=None,
+        start=0,
+        n_extra=0,
     ):
 
         self.original_rows = rows
 
         if get_marker:
 
-            def _get_marker(i):
-                return get_marker(self.original_rows[i], ocols)
+            def marker(i):
+                return get_marker(rows[start + i], ocols)
 
-            marker = _get_marker
         else:
-            if rows and not markers:
+            if len(rows) > start and not markers:
                 raise ValueError
-            marker = markers.__getitem__
+            marker = markers.__getitem__ if markers else None
 
         self.per_page = per_page
         self.backwards = backwards
 
-        excess = rows[per_page:]
-        rows = rows[:per_page]
-        self.rows = rows
+        available = len(rows) - start
+        count = min(per_page, available)
+        self.rows = Rows(rows, start, count, backwards, n_extra)
         self.marker_0 = current_marker
 
-        if rows:
+        if count:
             self.marker_1 = marker(0)
-            self.marker_n = marker(len(rows) - 1)
+            self.marker_n = marker(count - 1)
         else:
             self.marker_1 = None
             self.marker_n = None
 
-        if excess:
-            self.marker_nplus1 = marker(len(rows))
+        if available > count:
+            self.marker_nplus1 = marker(count)
         else:
             self.marker_nplus1 = None
 
         four = [self.marker_0, self.marker_1, self.marker_n, self.marker_nplus1]
 
         if backwards:
-            self.rows.reverse()
             four.reverse()
 
         self._previous, self._first, self._last, self._next = four
@@ -1,37 +1,122 @@
-"""Main api module for the app"""
+"""
+Main api module for the app. The app is built by `create_app`, and `app` is built
+the first time it's accessed, like `uvicorn api.app:app` does. Importing this module
+doesn't import the routes, build the graphql schema or create the engine. See
+`python -m benchmarks.startup` for where startup time goes.
+"""
 import os
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from strawberry.fastapi import GraphQLRouter
 from api.exception_handler import default_exception_handler
 
 from api.settings import get_settings
-from api.routers import resource
-from api.graphql.schema import schema
-from api.graphql.core.context import get_context_for_fastapi
+from api.db.session import dispose_engine, get_engine
 
 settings = get_settings()
 
-app = FastAPI(
-    title="App",
-    # for dev
-    debug=os.getenv("DEBUG", default="0") == "1",
-)
-app.add_exception_handler(Exception, default_exception_handler)
-
-# add middlewares
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_headers=["*"],
-    allow_methods=["OPTIONS", "GET", "POST"],
-)
-# add any event handlers if needed
-
-# add routes
-app.include_router(resource.router, prefix="/resources", tags=["Resources"])
-
-# garphql route
-graphql_app = GraphQLRouter(schema, context_getter=get_context_for_fastapi)
-app.include_router(graphql_app, prefix="/graphql")
\ No newline at end of file
+
+def create_app() -> FastAPI:
+    from api.graphql.core.context import get_context_for_fastapi
+    from api.graphql.core.router import GraphQLRouter
+    from api.graphql.schema import get_schema
+    from api.routers import export, resource
+
+    app = FastAPI(
+        title="App",
+        # for dev
+        debug=os.getenv("DEBUG", default="0") == "1",
+    )
+    app.add_exception_handler(Exception, default_exception_handler)
+
+    # add middlewares
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_headers=["*"],
+        allow_methods=["OPTIONS", "GET", "POST"],
+    )
+    # add any event handlers if needed
+    # the engine is created in the process that serves, after a server forked its
+    # workers, and its connections are closed once the requests in flight drained
+    app.add_event_handler("startup", get_engine)
+    app.add_event_handler("shutdown", dispose_engine)
+
+    # add routes
+    app.include_router(resource.router, prefix="/resources", tags=["Resources"])
+    app.include_router(export.router, prefix="/export", tags=["Export"])
+
+    # garphql route, with the optional layers only imported when enabled
+    result_cache = None
+    if settings.result_cache_enabled:
+        from api.graphql.core.cache import InMemoryCacheBackend, ResultCache
+
+        result_cache = ResultCache(
+            InMemoryCacheBackend(
+                max_entries=settings.result_cache_max_entries,
+                max_bytes=settings.result_cache_max_bytes,
+            ),
+            ttl=settings.result_cache_ttl,
+        )
+    coalescer = None
+    if settings.coalesce_queries:
+        from api.graphql.coalescing_map import COALESCING_MAP
+        from api.graphql.core.coalescing import Coalescer
+
+        coalescer = Coalescer(COALESCING_MAP)
+    capture = None
+    if settings.traffic_capture_enabled:
+        from api.graphql.core.capture import TrafficCapture
+
+        capture = TrafficCapture(
+            settings.traffic_capture_path,
+            max_bytes=settings.traffic_capture_max_bytes,
+            backups=settings.traffic_capture_backups,
+            redact=settings.traffic_capture_redact,
+            sample_rate=settings.traffic_capture_sample_rate,
+        )
+        app.add_event_handler("shutdown", capture.close)
+    http_cache = None
+    if settings.http_cache_enabled:
+        from api.graphql.cache_control_map import CACHE_CONTROL_MAP
+        from api.graphql.core.http_cache import HTTPCache
+
+        http_cache = HTTPCache(
+            CACHE_CONTROL_MAP,
+            default=settings.http_cache_default_policy,
+            max_validators=settings.http_cache_max_validators,
+        )
+    persisted_queries = None
+    if settings.persisted_queries_path or settings.persisted_queries_register:
+        from api.graphql.core.persisted_queries import PersistedQueries
+
+        options = dict(
+            register=settings.persisted_queries_register,
+            max_entries=settings.persisted_queries_max_entries,
+        )
+        persisted_queries = (
+            PersistedQueries.from_file(settings.persisted_queries_path, **options)
+            if settings.persisted_queries_path
+            else PersistedQueries(**options)
+        )
+    graphql_app = GraphQLRouter(
+        get_schema(),
+        context_getter=get_context_for_fastapi,
+        result_cache=result_cache,
+        coalescer=coalescer,
+        capture=capture,
+        stream_batch_size=(
+            settings.stream_batch_size if settings.incremental_delivery_enabled else None
+        ),
+        http_cache=http_cache,
+        persisted_queries=persisted_queries,
+    )
+    app.include_router(graphql_app, prefix="/graphql")
+    return app
+
+
+def __getattr__(name):
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
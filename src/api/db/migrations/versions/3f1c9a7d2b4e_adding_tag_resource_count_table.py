@@ -0,0 +1,34 @@
+"""Adding tag resource count table
+
+Revision ID: 3f1c9a7d2b4e
+Revises: e8ca2e61866c
+Create Date: 2026-10-19 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b4e'
+down_revision = 'e8ca2e61866c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tag_tagresourcecount',
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('resource_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag_tag.id'], ),
+    sa.PrimaryKeyConstraint('tag_id')
+    )
+    # backfill the counters from the existing associations
+    op.execute(
+        "INSERT INTO tag_tagresourcecount (tag_id, resource_count) "
+        "SELECT tag_id, count(*) FROM resource_resourcetagassociation GROUP BY tag_id"
+    )
+
+
+def downgrade():
+    op.drop_table('tag_tagresourcecount')
@@ -0,0 +1,88 @@
+"""Adding row and table versions
+
+Revision ID: 9b2d4c6e8a10
+Revises: 3f1c9a7d2b4e
+Create Date: 2026-10-19 16:40:12.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2d4c6e8a10'
+down_revision = '3f1c9a7d2b4e'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('resource_resource', 'tag_tag')
+TABLES = (
+    'resource_resource',
+    'resource_resourcetagassociation',
+    'tag_tag',
+    'tag_tagresourcecount',
+)
+
+
+def upgrade():
+    for table in VERSIONED_TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_table('table_version',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='1', nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(
+        sa.table('table_version', sa.column('table_name', sa.String())),
+        [{'table_name': table} for table in TABLES],
+    )
+
+    # triggers rather than the ORM, so that core statements and COPY bump
+    # versions too
+    op.execute(
+        """
+        CREATE FUNCTION bump_row_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := OLD.version + 1;
+            NEW.updated_at := now();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_version (table_name) VALUES (TG_TABLE_NAME)
+            ON CONFLICT (table_name) DO UPDATE SET version = table_version.version + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in VERSIONED_TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_bump_row_version BEFORE UPDATE ON {table} "
+            "FOR EACH ROW EXECUTE PROCEDURE bump_row_version()"
+        )
+    for table in TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_bump_table_version "
+            f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            "FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()"
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER {table}_bump_table_version ON {table}")
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER {table}_bump_row_version ON {table}")
+    op.execute("DROP FUNCTION bump_table_version()")
+    op.execute("DROP FUNCTION bump_row_version()")
+    op.drop_table('table_version')
+    for table in VERSIONED_TABLES:
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
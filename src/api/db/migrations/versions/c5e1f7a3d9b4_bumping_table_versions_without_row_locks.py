@@ -0,0 +1,88 @@
+"""Bumping table versions without row locks
+
+Revision ID: c5e1f7a3d9b4
+Revises: 9b2d4c6e8a10
+Create Date: 2026-10-20 10:12:45.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1f7a3d9b4'
+down_revision = '9b2d4c6e8a10'
+branch_labels = None
+depends_on = None
+
+# a table's changes are folded into one row every this many changes (of any table)
+FOLD_EVERY = 64
+
+
+def upgrade():
+    # a row per change instead of a counter per table, so that writers only ever
+    # insert, and don't wait on each other's counter row until they commit. The
+    # version of a table is the sum of its visible changes, which follows the
+    # snapshot of the reader like the counter did.
+    op.drop_constraint('table_version_pkey', 'table_version', type_='primary')
+    op.execute('ALTER TABLE table_version ADD COLUMN id bigserial')
+    op.create_primary_key('table_version_pkey', 'table_version', ['id'])
+    op.alter_column('table_version', 'version', new_column_name='changes')
+    op.create_index(op.f('ix_table_version_table_name'), 'table_version', ['table_name'], unique=False)
+
+    # Folding deletes the table's rows and inserts their sum. It's skipped while
+    # another transaction folds the same table, whose deleted rows would make it
+    # wait, and in repeatable read transactions, which can't delete rows that a
+    # fold committed after their snapshot.
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        DECLARE
+            change_id bigint;
+        BEGIN
+            INSERT INTO table_version (table_name) VALUES (TG_TABLE_NAME)
+            RETURNING id INTO change_id;
+            IF change_id % {FOLD_EVERY} = 0
+                AND current_setting('transaction_isolation') = 'read committed'
+                AND pg_try_advisory_xact_lock(hashtext('table_version:' || TG_TABLE_NAME))
+            THEN
+                WITH folded AS (
+                    DELETE FROM table_version WHERE table_name = TG_TABLE_NAME
+                    RETURNING changes
+                )
+                INSERT INTO table_version (table_name, changes)
+                SELECT TG_TABLE_NAME, sum(changes) FROM folded;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_version (table_name) VALUES (TG_TABLE_NAME)
+            ON CONFLICT (table_name) DO UPDATE SET version = table_version.version + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        WITH folded AS (
+            DELETE FROM table_version RETURNING table_name, changes
+        )
+        INSERT INTO table_version (table_name, changes)
+        SELECT table_name, sum(changes) FROM folded GROUP BY table_name
+        """
+    )
+    op.drop_index(op.f('ix_table_version_table_name'), table_name='table_version')
+    op.alter_column('table_version', 'changes', new_column_name='version')
+    op.drop_constraint('table_version_pkey', 'table_version', type_='primary')
+    op.drop_column('table_version', 'id')
+    op.create_primary_key('table_version_pkey', 'table_version', ['table_name'])
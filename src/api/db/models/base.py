@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer
+from sqlalchemy import BigInteger, Column, DateTime, FetchedValue, Integer, String, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -13,3 +13,28 @@ class IDPrimaryKey:
         index=True,
         unique=True,
     )
+
+
+class Versioned:
+    # Bumped by a trigger on every update of the row, whoever updates it, see the
+    # migration adding them. Used for the ETags of api/graphql/core/http_cache.py.
+    version = Column(
+        Integer, nullable=False, server_default="1", server_onupdate=FetchedValue()
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        server_onupdate=FetchedValue(),
+    )
+
+
+class TableVersion(Base):
+    # Changes of every table, a row inserted by a trigger on every statement
+    # writing to it, in the writing transaction. The version of a table is the sum
+    # of its changes, rows are folded into one now and then. For reads that row
+    # versions can't tell apart, like lists and counts, whose rows may come and go.
+    __tablename__ = "table_version"
+    id = Column(BigInteger, primary_key=True)
+    table_name = Column(String, nullable=False, index=True)
+    changes = Column(BigInteger, nullable=False, server_default="1")
@@ -10,11 +10,12 @@ from sqlalchemy import (
 )
 from sqlalchemy.orm import relationship
 
-from api.db.models.base import Base, IDPrimaryKey
+from api.db.models.base import Base, IDPrimaryKey, Versioned
 
-class Resource(Base, IDPrimaryKey):
+class Resource(Base, IDPrimaryKey, Versioned):
     __tablename__ = "resource_resource"
     name = Column(String, index=True, unique=True)
+    slug = Column(String, index=True, unique=True)
     description = Column(Text)
     tags = relationship(
         "Tag", secondary=lambda: ResourceTagAssociation.__table__, backref="resources"
@@ -1,11 +1,19 @@
 """Model for tag table"""
-from sqlalchemy import Column, String
+from sqlalchemy import Column, ForeignKey, Integer, String
 
-from api.db.models.base import Base, IDPrimaryKey
+from api.db.models.base import Base, IDPrimaryKey, Versioned
 
 
 # For now this is just a stub.
-class Tag(Base, IDPrimaryKey):
+class Tag(Base, IDPrimaryKey, Versioned):
     __tablename__ = "tag_tag"
     name = Column(String, index=True, unique=True)
+    slug = Column(String, index=True, unique=True)
 
+
+class TagResourceCount(Base):
+    # Denormalized number of resources per tag. Kept up to date by the resource
+    # mutations, so that reading a tag's resource count is a primary key lookup.
+    __tablename__ = "tag_tagresourcecount"
+    tag_id = Column(Integer, ForeignKey("tag_tag.id"), primary_key=True)
+    resource_count = Column(Integer, nullable=False, default=0, server_default="0")
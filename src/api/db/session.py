@@ -1,10 +1,56 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+"""
+The engine and the session factory. Both are created on first use, by the app's
+startup or by whatever needs them first, rather than when the module is imported.
+`from api.db.session import engine` still works, and creates them.
+"""
+from functools import lru_cache
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from api.settings import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(settings.database_dsn)
 
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def pool_options() -> dict:
+    """Pool of every worker process, its share of the connection budget"""
+    if settings.db_connection_budget is None:
+        return {}
+    return {
+        "pool_size": settings.db_connection_budget // settings.worker_count,
+        "max_overflow": 0,
+    }
+
+
+@lru_cache
+def get_engine() -> AsyncEngine:
+    return create_async_engine(settings.database_dsn, **pool_options())
+
+
+@lru_cache
+def get_sessionmaker() -> sessionmaker:
+    return sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+
+
+def import_driver():
+    """
+    Imports the dialect and the driver the engine will use, without creating it, for
+    servers to import them once before forking their workers.
+    """
+    make_url(settings.database_dsn).get_dialect().dbapi()
+
+
+async def dispose_engine():
+    """Closes the connections of the engine, if it was created"""
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+
+
+def __getattr__(name):
+    if name == "engine":
+        return get_engine()
+    if name == "AsyncSessionLocal":
+        return get_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,12 @@
+"""
+Per operation Cache-Control policies of query results, used when
+`http_cache_enabled` is set in settings. Keys are operation names, values are the
+Cache-Control header of their responses, e.g. "public, max-age=60".
+
+BY DEFAULT, queries get `http_cache_default_policy` from settings, "no-cache":
+caches may keep results, but have to revalidate them with their ETag before every
+use, which is cheap while nothing they were built from changed. So only update the
+below dictionary IF an operation can be served a little stale, or must never be
+stored ("no-store").
+"""
+CACHE_CONTROL_MAP = {}
@@ -0,0 +1,10 @@
+"""
+Per operation overrides for coalescing of identical in-flight queries, used when
+`coalesce_queries` is enabled in settings. Keys are operation names, values are
+whether to coalesce that operation.
+
+BY DEFAULT, every query is coalesced. So only update the below dictionary IF you
+want some operation to always be executed on its own, e.g. because its result
+depends on when exactly it runs.
+"""
+COALESCING_MAP = {}
@@ -0,0 +1,137 @@
+"""
+Sparse bookmark index, for jumping to a page by its number (`at:`) on keyset
+connections without an OFFSET scan from the first row.
+
+For a sorted statement, an index keeps the keyset marker of every `every`-th row
+along with the row's position. A page is fetched from the nearest marker before
+it, walking less than `every` rows (see `get_page_at` in aio_sqlakeyset). Indexes
+are built on first use, one per sorted statement, which with `statement_cache`
+means one per sort order of a sorter. Only unfiltered statements get an index:
+filters bind their values as params.
+
+Before an index is used, the versions of its tables are read (see `TableVersion`
+in `api/db/models/base.py`). They're bumped by triggers, so writes from other
+workers, COPY loads and psql are noticed too. When they changed since the markers
+were read, the markers are read again in the background, and meanwhile pages are
+walked to from the ones at hand. A marker stays a valid place to walk from after
+writes, only its position can be off by the rows inserted or deleted before it,
+and so can the page, until the new markers are in.
+
+Without an index (disabled, filtered connections, tables without versions), `at:`
+only reaches as far as an index would walk, `every` rows, instead of scanning
+from the first row to any page asked for.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aio_sqlakeyset.paging import get_markers, get_page_at
+from aio_sqlakeyset.results import Page
+from sqlalchemy.sql.selectable import Select
+
+from api.db.session import get_sessionmaker
+from api.graphql.core.cache import table_tags
+from api.graphql.core.http_cache import read_table_versions
+from api.settings import get_settings
+from exceptions import InvalidPaginationArgsError
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class BookmarkIndex:
+    """Markers of every `every`-th row of a sorted statement that selects ids"""
+
+    def __init__(self, statement: Select, every: int):
+        self.statement = statement
+        self.every = every
+        self.tables = table_tags(statement)
+        self.markers: List[Tuple[int, Tuple[Any]]] = []
+        # versions of the tables the markers were read at
+        self.versions: Optional[Dict[str, Optional[int]]] = None
+        self._build: Optional[asyncio.Future] = None
+
+    async def build(self, versions: Dict[str, Optional[int]]):
+        # a session of its own, the build outlives the request that started it
+        async with get_sessionmaker()() as db:
+            markers = await get_markers(self.statement, self.every, db)
+        self.markers, self.versions = markers, versions
+
+    def start_build(self, versions: Dict[str, Optional[int]]) -> asyncio.Future:
+        """Builds the index in the background, unless a build is running already"""
+        if self._build is None or self._build.done():
+            self._build = asyncio.ensure_future(self.build(versions))
+            self._build.add_done_callback(self._built)
+        return self._build
+
+    def _built(self, build: asyncio.Future):
+        if not build.cancelled() and build.exception() is not None:
+            logger.warning("Building a bookmark index failed: %r", build.exception())
+
+    async def get_markers(self, db) -> Optional[List[Tuple[int, Tuple[Any]]]]:
+        """
+        The markers to walk from, None if the index's tables have no versions and it
+        can't be used. The first use waits for the index to be built, later uses get
+        the markers at hand while changed tables have them built again.
+        """
+        # read before the markers, a write committed in between only makes the
+        # next use build the index again
+        versions = await read_table_versions(db, self.tables)
+        if None in versions.values():
+            return None
+        if versions != self.versions:
+            build = self.start_build(versions)
+            if self.versions is None:
+                await asyncio.shield(build)
+        return self.markers
+
+
+class BookmarkIndexes:
+    """
+    The bookmark indexes of the process, see the module docstring. When disabled,
+    `at:` only reaches the first `every` rows.
+    """
+
+    def __init__(self, enabled: bool = True, every: int = 1000, maxsize: int = 64):
+        self.enabled = enabled
+        self.every = every
+        self.maxsize = maxsize
+        self._indexes: "OrderedDict[Select, BookmarkIndex]" = OrderedDict()
+
+    def get_index(self, statement: Select) -> BookmarkIndex:
+        index = self._indexes.get(statement)
+        if index is None:
+            index = self._indexes[statement] = BookmarkIndex(statement, self.every)
+            if len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(statement)
+        return index
+
+    async def get_page_at(
+        self,
+        statement: Select,
+        db,
+        per_page: int,
+        position: int,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Page:
+        """Page of `per_page` rows starting at the 0-based `position`"""
+        markers = None
+        if self.enabled and not params:
+            markers = await self.get_index(statement).get_markers(db)
+        if markers is None and position > self.every:
+            raise InvalidPaginationArgsError(
+                f"At can only reach the first {self.every} rows of connections "
+                "without a bookmark index, like filtered ones."
+            )
+        return await get_page_at(
+            statement, per_page, position, db, markers or (), params
+        )
+
+
+bookmark_indexes = BookmarkIndexes(
+    settings.bookmark_index_enabled, settings.bookmark_index_every
+)
@@ -0,0 +1,347 @@
+"""
+Opt-in cache for the results of GraphQL queries.
+
+Results are cached under the normalized document, the variables and the scope of
+the caller, and are tagged with the tables and rows they were built from. The tags
+are recorded by sqlalchemy session events, so resolvers and mutations don't have to
+do anything about it:
+- a select of entities, or of columns of an entity, by primary key (what our by id
+  dataloaders do) tags the rows it asked for, like `resource_resource:1`.
+- any other select (pagination, counts) tags the tables it read from, like
+  `resource_resource`, since any write to those tables can change its result.
+- a committed write tags both the table and the rows it wrote, and invalidates every
+  entry carrying one of those tags.
+"""
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from graphql import GraphQLError, OperationType, parse, print_ast
+from graphql.utilities import get_operation_ast
+from sqlalchemy import Column, Table, event, inspect
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+from api.db.models import Base
+
+READ_TAGS = "result_cache_read_tags"
+WRITE_TAGS = "result_cache_write_tags"
+COMMITTED_WRITE_TAGS = "result_cache_committed_write_tags"
+
+
+def row_tag(table_name: str, identity: Iterable[Any]) -> str:
+    return f"{table_name}:{','.join(str(value) for value in identity)}"
+
+
+def start_recording(session) -> None:
+    """Start recording the tags of everything `session` reads and writes."""
+    session.info[READ_TAGS] = set()
+    session.info[WRITE_TAGS] = set()
+    session.info[COMMITTED_WRITE_TAGS] = set()
+
+
+def stop_recording(session) -> Tuple[Set[str], Set[str]]:
+    """Stop recording, and return the tags read and the tags written and committed."""
+    session.info.pop(WRITE_TAGS, None)
+    return (
+        session.info.pop(READ_TAGS, set()),
+        session.info.pop(COMMITTED_WRITE_TAGS, set()),
+    )
+
+
+def record_reads(session, tags: Iterable[str]) -> None:
+    """
+    Record reads served without a statement, like counts from memory, so that the
+    result depends on what they were read from.
+    """
+    if READ_TAGS in session.info:
+        session.info[READ_TAGS].update(tags)
+
+
+def table_tags(statement) -> Set[str]:
+    """Names of the tables `statement` reads from or writes to."""
+    return {
+        element.name
+        for element in visitors.iterate(statement)
+        if isinstance(element, Table)
+    }
+
+
+def _requested_row_tags(statement) -> Optional[Set[str]]:
+    """
+    Row tags for a select of an entity, or of columns of a single entity, filtered
+    only on `pk IN (...)` or `pk = value`. None for any other select, those get
+    table tags instead.
+    """
+    entities = {desc.get("entity") for desc in statement.column_descriptions}
+    if len(entities) != 1 or None in entities:
+        return None
+    clause = statement.whereclause
+    if not (
+        isinstance(clause, BinaryExpression)
+        and clause.operator in (operators.in_op, operators.eq)
+        and isinstance(clause.left, Column)
+        and clause.left.primary_key
+        and isinstance(clause.right, BindParameter)
+    ):
+        return None
+    table = clause.left.table
+    if len(table.primary_key.columns) != 1:
+        return None
+    value = clause.right.effective_value
+    values = value if clause.operator is operators.in_op else [value]
+    return {row_tag(table.name, [_value]) for _value in values}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_statement(orm_execute_state):
+    info = orm_execute_state.session.info
+    if READ_TAGS not in info:
+        return
+    statement = orm_execute_state.statement
+    if not orm_execute_state.is_select:
+        # core writes, like the tag resource counter upserts
+        info[WRITE_TAGS].update(table_tags(statement))
+    elif not (
+        orm_execute_state.is_relationship_load or orm_execute_state.is_column_load
+    ):
+        # rows loaded on behalf of a relationship are tagged by the load event,
+        # and changes to the relationship itself show up as writes to the parent.
+        tags = _requested_row_tags(statement)
+        info[READ_TAGS].update(tags if tags is not None else table_tags(statement))
+
+
+@event.listens_for(Base, "load", propagate=True)
+def _record_load(target, context):
+    info = context.session.info
+    if READ_TAGS in info:
+        state = inspect(target)
+        info[READ_TAGS].add(row_tag(state.mapper.local_table.name, state.identity))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flush(session, flush_context):
+    if WRITE_TAGS not in session.info:
+        return
+    tags = session.info[WRITE_TAGS]
+    for obj in chain(session.new, session.dirty, session.deleted):
+        state = inspect(obj)
+        mapper = state.mapper
+        table_name = mapper.local_table.name
+        tags.add(table_name)
+        # new objects don't have an identity until the flush is finalized, but
+        # their primary key has been populated by now.
+        identity = state.identity or mapper.primary_key_from_instance(obj)
+        tags.add(row_tag(table_name, identity))
+        # many to many changes are written to the secondary table by the flush.
+        # Don't let the history check load anything, we're inside the flush.
+        for relationship in mapper.relationships:
+            if relationship.secondary is None:
+                continue
+            history = attributes.get_history(
+                obj, relationship.key, passive=attributes.PASSIVE_NO_INITIALIZE
+            )
+            if history.has_changes():
+                tags.add(relationship.secondary.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_write_tags(session):
+    if WRITE_TAGS in session.info:
+        session.info[COMMITTED_WRITE_TAGS].update(session.info[WRITE_TAGS])
+        session.info[WRITE_TAGS] = set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_write_tags(session):
+    if WRITE_TAGS in session.info:
+        session.info[WRITE_TAGS] = set()
+
+
+class CacheBackend(ABC):
+    """Storage for cached results. Implement this to keep them in e.g. redis."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(
+        self, key: str, value: Dict[str, Any], tags: Set[str], ttl: Optional[float]
+    ) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        """Remove every entry with any of the given tags, returns how many were removed."""
+        raise NotImplementedError
+
+
+class _Entry:
+    __slots__ = ("value", "tags", "size", "expires_at")
+
+    def __init__(self, value, tags, size, expires_at):
+        self.value = value
+        self.tags = tags
+        self.size = size
+        self.expires_at = expires_at
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    LRU cache in the process' memory, bounded both by number of entries and by
+    their approximate size (the length of the json encoded result).
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    async def set(self, key, value, tags, ttl):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = _Entry(value, frozenset(tags), size, expires_at)
+        self.size += size
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate(self, tags):
+        keys = set()
+        for tag in tags:
+            keys |= self._keys_by_tag.get(tag, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+
+
+@lru_cache(maxsize=1024)
+def normalize_document(
+    query: str, operation_name: Optional[str]
+) -> Tuple[Optional[str], Optional[OperationType]]:
+    """
+    The document printed back from its AST, so that formatting and comments don't
+    matter, and the type of the operation that would be executed.
+    """
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return None, None
+    operation = get_operation_ast(document, operation_name)
+    return print_ast(document), operation.operation if operation else None
+
+
+def operation_key(
+    query: str,
+    variables: Optional[Dict[str, Any]],
+    operation_name: Optional[str],
+    scope: Any = None,
+) -> Optional[str]:
+    """
+    Hash identifying a query by its normalized document, variables and the scope
+    of the caller. None if the operation is not a query, or can't be parsed.
+    """
+    document, operation_type = normalize_document(query, operation_name)
+    if operation_type != OperationType.QUERY:
+        return None
+    raw_key = json.dumps(
+        [document, operation_name, variables, scope], sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+class ResultCache:
+    """Caches results of queries on a backend, see the module docstring."""
+
+    def __init__(self, backend: CacheBackend, ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        # bumped on every invalidation, so that a query which ran concurrently with
+        # a mutation doesn't put a result that might already be stale in the cache.
+        self.generation = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = await self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def get_entry(
+        self,
+        key: str,
+        current: Optional[Callable[[Dict[str, Optional[int]]], Awaitable[bool]]] = None,
+    ) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Optional[int]]]]]:
+        """
+        The result cached under `key`, and the versions of what it read when it was
+        executed if they were read (see `api/graphql/core/http_cache.py`). With
+        `current`, only entries with versions it accepts are served, the others
+        count as misses.
+        """
+        entry = await self.backend.get(key)
+        if entry is not None and current is not None:
+            if entry["versions"] is None or not await current(entry["versions"]):
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["data"], entry["versions"]
+
+    async def set(
+        self,
+        key: str,
+        value: Dict[str, Any],
+        tags: Set[str],
+        generation: int,
+        versions: Optional[Dict[str, Optional[int]]] = None,
+    ):
+        if generation == self.generation:
+            entry = {"data": value, "versions": versions}
+            await self.backend.set(key, entry, tags, self.ttl)
+
+    async def invalidate(self, tags: Set[str]):
+        self.generation += 1
+        self.invalidated += await self.backend.invalidate(tags)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidated": self.invalidated,
+        }
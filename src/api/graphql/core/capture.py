@@ -0,0 +1,231 @@
+"""
+Opt-in capture of the GraphQL traffic, to replay it later with
+`benchmarks/replay.py`.
+
+Every captured operation is written as a json line to a local file, rotated once it
+grows past `max_bytes` and keeping `backups` older files, like logging's
+`RotatingFileHandler`. Every process writes its own file, the pid is added to the
+path (`traffic.jsonl` becomes `traffic.<pid>.jsonl`), so that workers don't rotate
+each other's files. Lines are written by a thread of the process, the event loop
+only queues them. When the queue is full, because the disk can't keep up, the
+operation isn't captured. A line holds the start time, the sha256 of the normalized
+document, the operation name and type, the variables, the duration, the number of
+statements sent to the database and the number of errors. The document itself is
+only written along with the first operation using it in each file, so that every
+file can be replayed on its own.
+
+Values of variables whose name matches one of the `redact` patterns (fnmatch,
+case-insensitive, at any depth of input objects) are replaced before being
+written. Values inlined in documents are written as they are, so anything secret
+should be passed as a variable.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api.graphql.core.cache import normalize_document
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "[redacted]"
+
+_statements: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "traffic_capture_statements", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(*args):
+    counter = _statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class Started(NamedTuple):
+    timestamp: float
+    perf_counter: float
+    statements: List[int]
+    token: contextvars.Token
+
+
+def process_path(path: str) -> str:
+    """`path` with the pid of the process before its extension"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{extension}"
+
+
+class CaptureFile:
+    """
+    Json lines file rotated by size, see the module docstring. Not thread safe,
+    only the writer thread of `TrafficCapture` uses it.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._documents = set()
+
+    def write(self, entry: Dict[str, Any], document: str):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        elif self.max_bytes and self._file.tell() >= self.max_bytes:
+            self.rotate()
+        if entry["hash"] not in self._documents:
+            self._documents.add(entry["hash"])
+            entry = {**entry, "document": document}
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self._file.flush()
+
+    def rotate(self):
+        """Renames the file to `<path>.1`, `<path>.1` to `<path>.2` and so on."""
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._documents.clear()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TrafficCapture:
+    """
+    Captures operations to a `CaptureFile` per process, `sample_rate` of them.
+    Built before the app's workers are forked, so the file and its writer thread
+    are only started by the first operation captured in a process.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 100 * 1024 * 1024,
+        backups: int = 5,
+        redact: Iterable[str] = (),
+        sample_rate: float = 1.0,
+        max_queued: int = 10000,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.redact = [pattern.lower() for pattern in redact]
+        self.sample_rate = sample_rate
+        self.max_queued = max_queued
+        self.captured = 0
+        self.dropped = 0
+        self.file: Optional[CaptureFile] = None
+        self._pid = None
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+
+    def _start_writer(self):
+        self._pid = os.getpid()
+        self.file = CaptureFile(process_path(self.path), self.max_bytes, self.backups)
+        self._queue = queue.Queue(self.max_queued)
+        self._writer = threading.Thread(
+            target=self._write_queued, name="traffic-capture", daemon=True
+        )
+        self._writer.start()
+
+    def _write_queued(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self.file.write(*item)
+            except OSError:
+                logger.exception("Failed to write a captured operation")
+        self.file.close()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self) -> Started:
+        """Starts timing an operation and counting its statements."""
+        statements = [0]
+        token = _statements.set(statements)
+        return Started(time.time(), time.perf_counter(), statements, token)
+
+    def record(
+        self,
+        started: Started,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        result: Any,
+    ):
+        """
+        Writes an operation started with `start`. `result` is None if the
+        execution raised.
+        """
+        duration = time.perf_counter() - started.perf_counter
+        _statements.reset(started.token)
+
+        document, operation_type = normalize_document(query, operation_name)
+        document = document or query
+        errors = 1 if result is None else len(result.errors or ())
+        if self._pid != os.getpid():
+            self._start_writer()
+        item = (
+            {
+                "timestamp": started.timestamp,
+                "hash": hashlib.sha256(document.encode()).hexdigest(),
+                "operation_name": operation_name,
+                "operation_type": operation_type.value if operation_type else None,
+                "variables": self.redact_variables(variables),
+                "duration_ms": round(duration * 1000, 3),
+                "statements": started.statements[0],
+                "errors": errors,
+            },
+            document,
+        )
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.captured += 1
+
+    def redact_variables(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                name: REDACTED
+                if self._is_redacted(name)
+                else self.redact_variables(item)
+                for name, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self.redact_variables(item) for item in value]
+        return value
+
+    def _is_redacted(self, name: str) -> bool:
+        name = name.lower()
+        return any(fnmatchcase(name, pattern) for pattern in self.redact)
+
+    def close(self):
+        """Writes the queued operations, and closes the file"""
+        if self._pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join()
+            self._pid = None
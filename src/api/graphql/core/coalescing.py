@@ -0,0 +1,67 @@
+"""
+Single flight execution of identical queries. While a query is executing, any
+identical query (same normalized document, variables and caller scope) that
+arrives awaits the result of the one in flight instead of executing again.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """
+    Coalesces identical in-flight operations. `operations` overrides whether a
+    specific operation (by name) is coalesced, everything else uses `default`.
+    """
+
+    def __init__(self, operations: Optional[Dict[str, bool]] = None, default: bool = True):
+        self.operations = operations or {}
+        self.default = default
+        self.executions = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, "asyncio.Future"] = {}
+
+    def enabled_for(self, operation_name: Optional[str]) -> bool:
+        return self.operations.get(operation_name, self.default)
+
+    async def run(self, key: str, execute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `execute`, unless an execution for `key` is already in flight, in which
+        case wait for that one and return its result.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # we were cancelled ourselves
+                # the request executing it went away, execute on our own
+            else:
+                self.coalesced += 1
+                return result
+            return await execute()
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.executions += 1
+        try:
+            result = await execute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # retrieve it, so asyncio doesn't complain when nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"executions": self.executions, "coalesced": self.coalesced}
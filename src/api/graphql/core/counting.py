@@ -0,0 +1,226 @@
+"""
+Counting the rows of connections, for `Connection.totalCount`. There are three
+ways to count, see `CountMode`. Counts are only ever run when `totalCount` is
+selected, connections get a counter to call and not a count.
+"""
+import json
+import time
+from collections import OrderedDict
+from enum import Enum
+from itertools import chain
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import strawberry
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.sql.selectable import Select
+
+from api.graphql.core.cache import record_reads, table_tags
+from api.settings import get_settings
+
+settings = get_settings()
+
+WRITTEN_TABLES = "count_cache_written_tables"
+
+
+@strawberry.enum
+class CountMode(Enum):
+    """How `totalCount` is computed"""
+
+    # count(*) over the filtered query
+    EXACT = "exact"
+    # the planner's estimate of the rows of the filtered query, cheap but rough
+    ESTIMATED = "estimated"
+    # exact count, cached per filter for a while and dropped when the tables
+    # it counted are written to
+    CACHED = "cached"
+
+
+class explain(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON)` of a statement, runs with the statement's params"""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain, "postgresql")
+def _compile_explain(element, compiler, **kwargs):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kwargs)
+
+
+def params_key(params: Optional[Dict[str, Any]]) -> Tuple:
+    """Hashable version of the params of a statement"""
+    return tuple(
+        sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in (params or {}).items()
+        )
+    )
+
+
+async def count_exact(query: Select, db, params=None) -> int:
+    statement = select(func.count()).select_from(query.order_by(None).subquery())
+    return (await db.execute(statement, params)).scalar_one()
+
+
+async def count_estimated(query: Select, db, params=None) -> int:
+    plan = (await db.execute(explain(query.order_by(None)), params)).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_exact_many(
+    query: Select, db, partition_by, partitions: Iterable[Any], params=None
+) -> Dict[Any, int]:
+    """Exact counts for many partitions of the query, in a single statement."""
+    partitions = list(partitions)
+    inner = (
+        query.order_by(None)
+        .add_columns(partition_by.label("_count_partition"))
+        .where(partition_by.in_(partitions))
+    )
+    if inner._group_by_clauses:
+        # grouped queries count groups, keep them apart per partition
+        inner = inner.group_by(partition_by)
+    inner = inner.subquery()
+    statement = select(inner.c._count_partition, func.count()).group_by(
+        inner.c._count_partition
+    )
+    counts = dict((await db.execute(statement, params)).all())
+    return {partition: counts.get(partition, 0) for partition in partitions}
+
+
+class CountCache:
+    """
+    LRU of exact counts with a ttl. Every count remembers the tables it read, and
+    commits that write to one of those tables drop it.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counts: "OrderedDict[Hashable, Tuple[int, Set[str], Optional[float]]]" = (
+            OrderedDict()
+        )
+
+    def get(self, key: Hashable) -> Optional[int]:
+        entry = self._counts.get(key)
+        if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+            del self._counts[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._counts.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: Hashable, count: int, tables: Set[str]):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._counts[key] = (count, tables, expires_at)
+        self._counts.move_to_end(key)
+        if len(self._counts) > self.maxsize:
+            self._counts.popitem(last=False)
+
+    def invalidate(self, tables: Set[str]):
+        for key in [key for key, entry in self._counts.items() if entry[1] & tables]:
+            del self._counts[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._counts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+count_cache = CountCache(settings.count_cache_max_entries, settings.count_cache_ttl)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_tables(session, flush_context):
+    tables = session.info.setdefault(WRITTEN_TABLES, set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        mapper = inspect(obj).mapper
+        tables.add(mapper.local_table.name)
+        # a changed many to many is written to the secondary table
+        tables.update(
+            relationship.secondary.name
+            for relationship in mapper.relationships
+            if relationship.secondary is not None
+        )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_executed_tables(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info.setdefault(WRITTEN_TABLES, set()).update(
+            table_tags(orm_execute_state.statement)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_counts(session):
+    tables = session.info.pop(WRITTEN_TABLES, None)
+    if tables:
+        count_cache.invalidate(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session):
+    session.info.pop(WRITTEN_TABLES, None)
+
+
+async def count(query: Select, db, params=None, mode=CountMode.EXACT) -> int:
+    """Counts the rows of `query`, ignoring its order by."""
+    if mode is CountMode.ESTIMATED:
+        return await count_estimated(query, db, params)
+    if mode is CountMode.EXACT:
+        return await count_exact(query, db, params)
+    key = (query, params_key(params))
+    total = count_cache.get(key)
+    if total is None:
+        total = await count_exact(query, db, params)
+        count_cache.set(key, total, table_tags(query))
+    else:
+        record_reads(db, table_tags(query))
+    return total
+
+
+async def count_many(
+    query: Select,
+    db,
+    partition_by,
+    partitions: Iterable[Any],
+    params=None,
+    mode=CountMode.EXACT,
+) -> Dict[Any, int]:
+    """
+    Same as `count`, for many partitions of the query in a single statement. The
+    planner can't estimate partitions, so estimated counts are exact here.
+    """
+    partitions = list(partitions)
+    if mode is not CountMode.CACHED:
+        return await count_exact_many(query, db, partition_by, partitions, params)
+    base_key = (query, params_key(params))
+    counts = {partition: count_cache.get((*base_key, partition)) for partition in partitions}
+    missing: List[Any] = [partition for partition, total in counts.items() if total is None]
+    tables = table_tags(query)
+    if len(missing) < len(partitions):
+        record_reads(db, tables)
+    if missing:
+        for partition, total in (
+            await count_exact_many(query, db, partition_by, missing, params)
+        ).items():
+            count_cache.set((*base_key, partition), total, tables)
+            counts[partition] = total
+    return counts
@@ -38,6 +38,8 @@ class DataLoader(aiodataloader.DataLoader):
         if self.context != context:
             self.context = context
             kwargs["get_cache_key"] = self.get_cache_key_fn
+            if self.order_key:
+                kwargs["batch_load_fn"] = self.batch_load_in_key_order
             super().__init__(*args, **kwargs)
 
     async def load_many(
@@ -55,6 +57,21 @@ class DataLoader(aiodataloader.DataLoader):
     async def batch_load_fn(self, keys):
         raise NotImplementedError
 
+    async def batch_load_in_key_order(self, keys):
+        """
+        aiodataloader expects exactly one result per key, in the order of the keys.
+        Queries return rows in whatever order the db likes and skip missing keys,
+        so line the results up with the keys using the order key, with None for
+        keys that weren't found.
+        """
+        # aiodataloader sets this method as the instance's batch_load_fn, so get
+        # the actual one from the class.
+        results = await type(self).batch_load_fn(self, keys)
+        key_result_map = {
+            self.get_serializable_key_for_result(result): result for result in results
+        }
+        return [key_result_map.get(self.get_cache_key(key)) for key in keys]
+
     def get_serializable_key_for_result(self, result):
         if type(self.order_key) == str:
             return self.get_cache_key(getattr(result, self.order_key))
@@ -70,6 +87,8 @@ class DataLoader(aiodataloader.DataLoader):
         if not self.order_key:
             raise Exception("Cannot order without an order key")
         key_result_map = {
-            self.get_serializable_key_for_result(result): result for result in results
+            self.get_serializable_key_for_result(result): result
+            for result in results
+            if result is not None
         }
-        return [key_result_map[self.get_cache_key(key)] for key in keys]
+        return [key_result_map.get(self.get_cache_key(key)) for key in keys]
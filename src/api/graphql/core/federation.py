@@ -0,0 +1,42 @@
+"""Federation schema, with entities resolved in batches"""
+import strawberry
+
+from api.graphql.core.node import node_registry
+from api.settings import get_settings
+
+settings = get_settings()
+
+
+class Schema(strawberry.federation.Schema):
+    """
+    Strawberry resolves `_entities` by calling `resolve_reference` once for every
+    representation, and tells the types of results apart by their strawberry type.
+    Our entities are keyed by their global id, so instead all the representations
+    are resolved together through `node_registry`, with one dataloader batch per
+    type. Results are models, and types are told apart by their `is_type_of`.
+    Like `nodes(ids:)`, at most `MAX_NODE_IDS` representations are taken.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        entity_type = self._schema.type_map.get("_Entity")
+        if entity_type is not None:
+            # fall back to graphql-core's resolver, which asks every type's is_type_of
+            entity_type.resolve_type = None
+
+    async def entities_resolver(self, root, info, representations):
+        if len(representations) > settings.max_node_ids:
+            raise ValueError(
+                f"Cannot provide more than {settings.max_node_ids} representations "
+                "at a time."
+            )
+        decoded = []
+        for representation in representations:
+            if not isinstance(representation, dict):
+                decoded.append((None, None))
+                continue
+            type_name, key = node_registry.decode(representation.get("id") or "")
+            if type_name != representation.get("__typename"):
+                type_name, key = None, None
+            decoded.append((type_name, key))
+        return await node_registry.resolve_decoded(info.context, decoded)
@@ -0,0 +1,202 @@
+"""
+Opt-in HTTP caching of the results of queries, so that browsers, CDNs and proxies
+can keep them:
+- responses carry an ETag computed from the versions of what they were built from,
+  the tags recorded by `api/graphql/core/cache.py`: rows of versioned tables (see
+  `Versioned` in `api/db/models/base.py`) by their row's version, everything else,
+  like lists and counts, by its table's version, the sum of its changes (see
+  `TableVersion`).
+- the tags an operation read are remembered by its operation key. A request with an
+  `If-None-Match` for a remembered operation gets a 304 after a couple of primary
+  key lookups, before anything is executed. Otherwise, the result is compared to it
+  once executed, which still saves sending it.
+- responses get a Cache-Control per operation name, `policies`, or `default`.
+
+The result and the versions are read in the same repeatable read snapshot, see
+`begin_snapshot`, so a write committed meanwhile can't give an old result a new
+ETag. A row's version doesn't change with its many to many relationships, which are
+rows of their secondary table, so rows also depend on the version of those tables.
+With the result cache, the versions are cached along with the result, and an entry
+is served only if they are still those of the request's snapshot. Results served by
+the coalescer only get a Cache-Control, since what they read isn't known.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set
+
+from sqlalchemy import BigInteger, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.db.models import Base, TableVersion
+from api.graphql.core.cache import row_tag
+
+
+def _versioned_tables():
+    tables = {}
+    for mapper in Base.registry.mappers:
+        table = mapper.local_table
+        if "version" in table.c and len(table.primary_key.columns) == 1:
+            secondaries = {
+                relationship.secondary.name
+                for relationship in mapper.relationships
+                if relationship.secondary is not None
+            }
+            tables[table.name] = (table, secondaries)
+    return tables
+
+
+# table name: (table, names of the secondary tables of its relationships)
+VERSIONED_TABLES = _versioned_tables()
+
+
+async def begin_snapshot(db: AsyncSession) -> None:
+    """
+    Begins the session's transaction in repeatable read, so that every statement of
+    the request reads the same snapshot. Call it before anything else runs on it.
+    """
+    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+
+async def read_versions(db: AsyncSession, tags: Iterable[str]) -> Dict[str, Optional[int]]:
+    """
+    Current version of what every tag stands for, None for rows that don't exist
+    (anymore). At most a statement per versioned table and one for table versions.
+    """
+    ids_by_table: Dict[str, Set[Any]] = {}
+    table_names = set()
+    for tag in tags:
+        table_name, _, identity = tag.partition(":")
+        versioned = VERSIONED_TABLES.get(table_name)
+        if identity and versioned is not None:
+            table, secondaries = versioned
+            (pk,) = table.primary_key.columns
+            ids_by_table.setdefault(table_name, set()).add(pk.type.python_type(identity))
+            table_names.update(secondaries)
+        else:
+            table_names.add(table_name)
+
+    versions: Dict[str, Optional[int]] = {}
+    for table_name, ids in ids_by_table.items():
+        table, _ = VERSIONED_TABLES[table_name]
+        (pk,) = table.primary_key.columns
+        res = await db.execute(select(pk, table.c.version).where(pk.in_(ids)))
+        found = dict(res.all())
+        versions.update({row_tag(table_name, [_id]): found.get(_id) for _id in ids})
+    if table_names:
+        versions.update(await read_table_versions(db, table_names))
+    return versions
+
+
+async def read_table_versions(
+    db: AsyncSession, table_names: Iterable[str]
+) -> Dict[str, Optional[int]]:
+    """
+    Current version of tables, the sum of their changes (see `TableVersion`). None
+    for tables without triggers.
+    """
+    table_names = set(table_names)
+    res = await db.execute(
+        select(
+            TableVersion.table_name, cast(func.sum(TableVersion.changes), BigInteger)
+        )
+        .where(TableVersion.table_name.in_(table_names))
+        .group_by(TableVersion.table_name)
+    )
+    found = dict(res.all())
+    return {name: found.get(name) for name in table_names}
+
+
+def compute_etag(key: str, versions: Dict[str, Optional[int]]) -> str:
+    """Weak ETag of the result of operation `key`, built from data at `versions`"""
+    raw = json.dumps([key, sorted(versions.items())])
+    return f'W/"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an `If-None-Match` header matches `etag`, with the weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+class HTTPCache:
+    """
+    ETags and Cache-Control of query results, see the module docstring. The tags
+    of at most `max_validators` operations are remembered, least recently used
+    first out.
+    """
+
+    # set by the router when the result of the request gets an ETag, and filled
+    # with the tags it read once executed
+    read_tags_context_key = "http_cache_read_tags"
+    # the versions of those tags, when they were read along with the result
+    versions_context_key = "http_cache_versions"
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, str]] = None,
+        default: str = "no-cache",
+        max_validators: int = 10000,
+    ):
+        self.policies = policies or {}
+        self.default = default
+        self.max_validators = max_validators
+        self.not_modified = 0
+        self.short_circuited = 0
+        self._validators: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+
+    def cache_control(self, operation_name: Optional[str]) -> str:
+        return self.policies.get(operation_name, self.default)
+
+    async def short_circuit(
+        self, db: AsyncSession, key: str, if_none_match: Optional[str]
+    ) -> Optional[str]:
+        """
+        The ETag of operation `key`, if the client's `If-None-Match` still matches
+        it and it can be told without executing the operation. None otherwise.
+        """
+        tags = self._validators.get(key)
+        if tags is None or not if_none_match:
+            return None
+        self._validators.move_to_end(key)
+        etag = compute_etag(key, await read_versions(db, tags))
+        if not etag_matches(if_none_match, etag):
+            return None
+        self.not_modified += 1
+        self.short_circuited += 1
+        return etag
+
+    async def etag(
+        self,
+        db: AsyncSession,
+        key: str,
+        tags: Iterable[str],
+        versions: Optional[Dict[str, Optional[int]]] = None,
+    ) -> str:
+        """
+        ETag of the result of operation `key` that read `tags`, which are remembered.
+        `versions` are the versions of the tags, if they were read already.
+        """
+        tags = frozenset(tags)
+        self._validators[key] = tags
+        self._validators.move_to_end(key)
+        while len(self._validators) > self.max_validators:
+            self._validators.popitem(last=False)
+        if versions is None:
+            versions = await read_versions(db, tags)
+        return compute_etag(key, versions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "not_modified": self.not_modified,
+            "short_circuited": self.short_circuited,
+            "validators": len(self._validators),
+        }
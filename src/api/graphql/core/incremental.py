@@ -0,0 +1,564 @@
+"""
+Incremental delivery of results with `@defer` and `@stream`, which neither
+strawberry nor graphql-core support yet:
+- `@defer` on a fragment leaves its fields out of the payload it's in, and sends
+  them in a later one.
+- `@stream` on a list field sends its first `initialCount` items in the payload
+  it's in, and the others in later ones, `batch_size` items at most per payload.
+  A list resolved to an async iterator is streamed as its items arrive, like the
+  edges of `PaginationHelper.stream_connection`.
+
+Both only apply when the request's context has an `IncrementalDelivery`, which the
+router adds when the client accepts `multipart/mixed` responses. Otherwise they're
+ignored and the whole result comes at once, which the spec allows.
+
+Payloads are those of graphql-js 17 and Apollo Router (deferSpec=20220824): the
+first one is the usual result along with `hasNext`, the next ones have a list of
+`incremental` results, `{data, path}` for deferred fragments and `{items, path}`
+for streamed items, along with `hasNext`. They're sent as the parts of a
+`multipart/mixed` response.
+
+The deferred fragments and streamed lists of a payload are executed once it's
+complete, all together so that their dataloaders batch, and dropped when an error
+nulled their place in it. The root fields of mutations are never deferred, they're
+executed one after the other.
+"""
+import asyncio
+from copy import copy
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import orjson
+from graphql import (
+    DirectiveLocation,
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLDirective,
+    GraphQLError,
+    GraphQLInt,
+    GraphQLNonNull,
+    GraphQLString,
+    OperationType,
+    located_error,
+)
+from graphql.execution import ExecutionContext
+from graphql.execution.collect_fields import (
+    does_fragment_condition_match,
+    get_field_entry_key,
+    should_include_node,
+)
+from graphql.execution.values import get_directive_values
+from graphql.language import FieldNode, InlineFragmentNode
+from graphql.pyutils import Path, is_iterable
+
+DeferDirective = GraphQLDirective(
+    name="defer",
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        "if": GraphQLArgument(
+            GraphQLNonNull(GraphQLBoolean),
+            default_value=True,
+            description="Deferred when true or undefined.",
+        ),
+        "label": GraphQLArgument(GraphQLString, description="Unique name"),
+    },
+    description="Directs the executor to defer this fragment when the `if` "
+    "argument is true or undefined.",
+)
+
+StreamDirective = GraphQLDirective(
+    name="stream",
+    locations=[DirectiveLocation.FIELD],
+    args={
+        "if": GraphQLArgument(
+            GraphQLNonNull(GraphQLBoolean),
+            default_value=True,
+            description="Stream when true or undefined.",
+        ),
+        "label": GraphQLArgument(GraphQLString, description="Unique name"),
+        "initialCount": GraphQLArgument(
+            GraphQLNonNull(GraphQLInt),
+            default_value=0,
+            description="Number of items to return immediately",
+        ),
+    },
+    description="Directs the executor to stream plural fields when the `if` "
+    "argument is true or undefined.",
+)
+
+
+def _is_present(value: Any, keys: List[Any]) -> bool:
+    """Whether there's a value other than null at `keys` in `value`"""
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and isinstance(key, int) and key < len(value):
+            value = value[key]
+        else:
+            return False
+        if value is None:
+            return False
+    return value is not None
+
+
+def _part(payload: Dict[str, Any]) -> bytes:
+    return (
+        b"\r\n---\r\nContent-Type: application/json; charset=utf-8\r\n\r\n"
+        + orjson.dumps(payload)
+    )
+
+
+class IncrementalDelivery:
+    """
+    Incremental delivery of a request's result. The execution context holds back
+    the deferred fragments and the rest of the streamed lists of the initial
+    payload in `records`, `multipart` sends the payload and executes them.
+    """
+
+    context_key = "incremental_delivery"
+    media_type = 'multipart/mixed; boundary="-"; deferSpec=20220824'
+
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = batch_size
+        self.records: List["Record"] = []
+
+    @classmethod
+    def from_context(cls, context: Any) -> Optional["IncrementalDelivery"]:
+        if isinstance(context, dict):
+            return context.get(cls.context_key)
+        return None
+
+    def has_next(self, data: Optional[Dict[str, Any]]) -> bool:
+        """Whether payloads follow the initial one, whose data is `data`"""
+        self.records = [
+            record for record in self.records if _is_present(data, record.keys)
+        ]
+        return bool(self.records)
+
+    async def payloads(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        The payloads following the initial one, call `has_next` first. Results that
+        are ready at the same time are sent together.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks = [asyncio.ensure_future(self._run(record, queue)) for record in self.records]
+        running = len(tasks)
+        try:
+            while running:
+                incremental = []
+                done = await queue.get()
+                while True:
+                    if done is None:  # a record has no more results
+                        running -= 1
+                    else:
+                        result, records = done
+                        incremental.append(result)
+                        running += len(records)
+                        tasks.extend(
+                            asyncio.ensure_future(self._run(record, queue))
+                            for record in records
+                        )
+                    if queue.empty():
+                        break
+                    done = queue.get_nowait()
+                if incremental:
+                    yield {"incremental": incremental, "hasNext": running > 0}
+                elif not running:
+                    yield {"hasNext": False}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def _run(record: "Record", queue: asyncio.Queue):
+        try:
+            async for done in record.execute():
+                queue.put_nowait(done)
+        except Exception as error:
+            # errors of fields are in the results already, this one is unexpected,
+            # but the client still gets the record's result, as an error
+            queue.put_nowait((record.error_result(error), []))
+        finally:
+            queue.put_nowait(None)
+
+    async def multipart(self, result: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """
+        The body of a `multipart/mixed` response, with the initial payload `result`
+        and the ones following it, call `has_next` first.
+        """
+        yield _part({**result, "hasNext": True})
+        async for payload in self.payloads():
+            yield _part(payload)
+        yield b"\r\n-----\r\n"
+
+
+class CollectedFields(dict):
+    """The fields of a selection set, and apart those of its deferred fragments"""
+
+    __slots__ = ("deferred",)
+
+    def __init__(self):
+        super().__init__()
+        # (label, fields) of every deferred fragment
+        self.deferred: List[Tuple[Optional[str], "CollectedFields"]] = []
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    """
+    graphql-core's execution context, which holds back deferred fragments and the
+    rest of streamed lists in `records` when the request is delivered
+    incrementally. See `IncrementalDelivery`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delivery = IncrementalDelivery.from_context(self.context_value)
+        self.records: List[Record] = (
+            self.delivery.records if self.delivery is not None else []
+        )
+
+    def child(self) -> "IncrementalExecutionContext":
+        """A context to execute a record with, with its own errors and records"""
+        context = copy(self)
+        context.errors = []
+        context.records = []
+        return context
+
+    def present_records(self, keys: List[Any], value: Any) -> List["Record"]:
+        """Records held back by this context whose place in `value`, at `keys`, wasn't nulled"""
+        return [
+            record
+            for record in self.records
+            if _is_present(value, record.keys[len(keys) :])
+        ]
+
+    def result(
+        self, result: Dict[str, Any], label: Optional[str]
+    ) -> Dict[str, Any]:
+        """An incremental result, with the label and errors if any"""
+        if label is not None:
+            result["label"] = label
+        if self.errors:
+            self.schema._strawberry_schema.process_errors(self.errors)
+            result["errors"] = [error.formatted for error in self.errors]
+        return result
+
+    def get_defer(self, node) -> Optional[Dict[str, Any]]:
+        if self.delivery is None or not node.directives:
+            return None
+        defer = get_directive_values(DeferDirective, node, self.variable_values)
+        return defer if defer is not None and defer["if"] else None
+
+    def get_stream(self, node: FieldNode) -> Optional[Dict[str, Any]]:
+        if self.delivery is None or not node.directives:
+            return None
+        stream = get_directive_values(StreamDirective, node, self.variable_values)
+        return stream if stream is not None and stream["if"] else None
+
+    def collect_fields(self, runtime_type, selection_sets) -> CollectedFields:
+        """graphql-core's `collect_fields`, with deferred fragments apart"""
+        fields = CollectedFields()
+        visited_fragment_names = set()
+        for selection_set in selection_sets:
+            self._collect_fields(runtime_type, selection_set, fields, visited_fragment_names)
+        return fields
+
+    def _collect_fields(self, runtime_type, selection_set, fields, visited):
+        for selection in selection_set.selections:
+            if not should_include_node(self.variable_values, selection):
+                continue
+            if isinstance(selection, FieldNode):
+                fields.setdefault(get_field_entry_key(selection), []).append(selection)
+                continue
+            defer = self.get_defer(selection)
+            if isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            else:
+                name = selection.name.value
+                # a fragment spread again is already collected, unless it's deferred
+                if name in visited and defer is None:
+                    continue
+                fragment = self.fragments.get(name)
+                if fragment is None:
+                    continue
+            if not does_fragment_condition_match(self.schema, fragment, runtime_type):
+                continue
+            if defer is None:
+                if fragment is not selection:
+                    visited.add(name)
+                self._collect_fields(runtime_type, fragment.selection_set, fields, visited)
+            else:
+                # fragments deferred in this one are deferred again, after it
+                deferred = CollectedFields()
+                self._collect_fields(runtime_type, fragment.selection_set, deferred, set(visited))
+                if deferred or deferred.deferred:
+                    fields.deferred.append((defer.get("label"), deferred))
+
+    def execute_operation(self, operation, root_value):
+        if self.delivery is None or operation.operation != OperationType.QUERY:
+            return super().execute_operation(operation, root_value)
+        root_type = self.schema.get_root_type(operation.operation)
+        fields = self.collect_fields(root_type, [operation.selection_set])
+        return self.execute_fields(root_type, root_value, None, fields)
+
+    def collect_subfields(self, return_type, field_nodes):
+        if self.delivery is None:
+            return super().collect_subfields(return_type, field_nodes)
+        key = (return_type, *map(id, field_nodes))
+        fields = self._subfields_cache.get(key)
+        if fields is None:
+            fields = self._subfields_cache[key] = self.collect_fields(
+                return_type,
+                [node.selection_set for node in field_nodes if node.selection_set],
+            )
+        return fields
+
+    def execute_fields(self, parent_type, source_value, path, fields):
+        if isinstance(fields, CollectedFields):
+            for label, deferred_fields in fields.deferred:
+                self.records.append(
+                    DeferredFragment(
+                        self, label, parent_type, source_value, path, deferred_fields
+                    )
+                )
+        return super().execute_fields(parent_type, source_value, path, fields)
+
+    def build_resolve_info(self, field_def, field_nodes, parent_type, path):
+        info = super().build_resolve_info(field_def, field_nodes, parent_type, path)
+        directives = field_nodes[0].directives
+        if directives and any(directive.name.value == "stream" for directive in directives):
+            # strawberry's DirectivesExtension applies every directive of a field
+            # as one of its own, and can't read their variables. @stream is ours,
+            # so resolvers get the field without it.
+            node = copy(field_nodes[0])
+            node.directives = tuple(
+                directive for directive in directives if directive.name.value != "stream"
+            )
+            info = info._replace(field_nodes=[node, *field_nodes[1:]])
+        return info
+
+    def complete_list_value(self, return_type, field_nodes, info, path, result):
+        stream = self.get_stream(field_nodes[0])
+        if stream is None:
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+        initial_count = stream["initialCount"]
+        if initial_count < 0:
+            raise GraphQLError("initialCount must be a positive integer", field_nodes)
+        if isinstance(result, AsyncIterable) and not is_iterable(result):
+            return self.complete_streamed_async_list(
+                return_type, field_nodes, info, path, result, initial_count, stream.get("label")
+            )
+        if not is_iterable(result):
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+        items = list(result)
+        if len(items) > initial_count:
+            self.records.append(
+                StreamedList(
+                    self,
+                    stream.get("label"),
+                    return_type.of_type,
+                    field_nodes,
+                    info,
+                    path,
+                    items[initial_count:],
+                    initial_count,
+                )
+            )
+        return super().complete_list_value(
+            return_type, field_nodes, info, path, items[:initial_count]
+        )
+
+    async def complete_streamed_async_list(
+        self, return_type, field_nodes, info, path, result, initial_count, label
+    ):
+        iterator = result.__aiter__()
+        items = []
+        try:
+            while len(items) < initial_count:
+                items.append(await iterator.__anext__())
+        except StopAsyncIteration:
+            pass
+        else:
+            self.records.append(
+                StreamedList(
+                    self, label, return_type.of_type, field_nodes, info, path, iterator, len(items)
+                )
+            )
+        completed = super().complete_list_value(return_type, field_nodes, info, path, items)
+        return await completed if self.is_awaitable(completed) else completed
+
+
+class DeferredFragment:
+    """The fields of a deferred fragment, of the object at `path`"""
+
+    def __init__(
+        self,
+        context: IncrementalExecutionContext,
+        label: Optional[str],
+        parent_type,
+        source: Any,
+        path: Optional[Path],
+        fields: CollectedFields,
+    ):
+        self.context = context
+        self.label = label
+        self.parent_type = parent_type
+        self.source = source
+        self.path = path
+        self.keys = path.as_list() if path else []
+        self.fields = fields
+
+    async def execute(self) -> AsyncIterator[Tuple[Dict[str, Any], List["Record"]]]:
+        context = self.context.child()
+        try:
+            data = context.execute_fields(self.parent_type, self.source, self.path, self.fields)
+            if context.is_awaitable(data):
+                data = await data
+        except GraphQLError as error:
+            context.errors.append(error)
+            data = None
+        result = context.result({"data": data, "path": self.keys}, self.label)
+        yield result, context.present_records(self.keys, data)
+
+    def error_result(self, error: Exception) -> Dict[str, Any]:
+        """The result of the fragment when executing it raised `error`"""
+        context = self.context.child()
+        context.errors.append(located_error(error, None, self.keys))
+        return context.result({"data": None, "path": self.keys}, self.label)
+
+
+class _IteratorError(NamedTuple):
+    error: Exception
+
+
+class StreamedList:
+    """
+    The items of a streamed list from `start` on, a list or an async iterator. The
+    items of an async iterator are sent as they arrive, those that arrived while
+    the previous ones were completed are sent together.
+    """
+
+    def __init__(
+        self,
+        context: IncrementalExecutionContext,
+        label: Optional[str],
+        item_type,
+        field_nodes: List[FieldNode],
+        info,
+        path: Path,
+        items,
+        start: int,
+    ):
+        self.context = context
+        self.label = label
+        self.item_type = item_type
+        self.field_nodes = field_nodes
+        self.info = info
+        self.path = path
+        self.keys = path.as_list()
+        self.items = items
+        self.start = start
+        # index of the next item to send
+        self.index = start
+
+    async def execute(self) -> AsyncIterator[Tuple[Dict[str, Any], List["Record"]]]:
+        index = self.start
+        async for batch, error in self._batches(self.context.delivery.batch_size):
+            context = self.context.child()
+            try:
+                if error is not None:
+                    raise located_error(error, self.field_nodes, self.keys + [index])
+                items = await asyncio.gather(
+                    *(
+                        self._complete_item(context, item, self.path.add_key(index + offset))
+                        for offset, item in enumerate(batch)
+                    )
+                )
+            except GraphQLError as error:
+                context.errors.append(error)
+                items = None
+            result = context.result({"items": items, "path": self.keys + [index]}, self.label)
+            if items is None:
+                yield result, []
+                return
+            value = {index + offset: item for offset, item in enumerate(items)}
+            yield result, context.present_records(self.keys, value)
+            index += len(items)
+            self.index = index
+
+    def error_result(self, error: Exception) -> Dict[str, Any]:
+        """The result of the rest of the list when executing it raised `error`"""
+        context = self.context.child()
+        keys = self.keys + [self.index]
+        context.errors.append(located_error(error, self.field_nodes, keys))
+        return context.result({"items": None, "path": keys}, self.label)
+
+    async def _complete_item(self, context, item, path):
+        """Like graphql-core completes list items, raising for non null items"""
+        try:
+            if context.is_awaitable(item):
+                item = await item
+            completed = context.complete_value(
+                self.item_type, self.field_nodes, self.info, path, item
+            )
+            if context.is_awaitable(completed):
+                completed = await completed
+            return completed
+        except Exception as raw_error:
+            error = located_error(raw_error, self.field_nodes, path.as_list())
+            context.handle_field_error(error, self.item_type)
+            return None
+
+    async def _batches(self, size: int) -> AsyncIterator[Tuple[List, Optional[Exception]]]:
+        if isinstance(self.items, list):
+            for start in range(0, len(self.items), size):
+                yield self.items[start : start + size], None
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        end = object()
+
+        async def produce():
+            try:
+                async for item in self.items:
+                    queue.put_nowait(item)
+            except Exception as error:
+                queue.put_nowait(_IteratorError(error))
+            finally:
+                queue.put_nowait(end)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            done = False
+            while not done:
+                batch, error = [], None
+                item = await queue.get()
+                while True:
+                    if item is end:
+                        done = True
+                        break
+                    if isinstance(item, _IteratorError):
+                        error, done = item.error, True
+                        break
+                    batch.append(item)
+                    if len(batch) == size or queue.empty():
+                        break
+                    item = queue.get_nowait()
+                if batch:
+                    yield batch, None
+                if error is not None:
+                    yield [], error
+        finally:
+            producer.cancel()
+
+
+Record = Union[DeferredFragment, StreamedList]
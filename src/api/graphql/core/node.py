@@ -0,0 +1,93 @@
+"""Relay's Node interface, and resolution of nodes from their global ids"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import strawberry
+from graphql_relay import from_global_id
+
+from api.graphql.core.dataloader import DataLoader
+
+
+@strawberry.interface
+class Node:
+    """An object with a globally unique ID"""
+
+    id: strawberry.ID
+
+
+class NodeRegistry:
+    """
+    Maps node types to the by id dataloaders that fetch them. Nodes asked for
+    together are grouped by type, and every type is fetched with one batch from
+    its dataloader.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Tuple[Type[DataLoader], Callable[[str], Any]]] = {}
+
+    def register(
+        self,
+        node_type: type,
+        loader: Type[DataLoader],
+        parse_key: Callable[[str], Any] = int,
+    ):
+        """
+        `parse_key` turns the id part of a global id into the key of `loader`.
+        """
+        self._loaders[node_type._type_definition.name] = (loader, parse_key)
+
+    def get_loader(self, type_name: str) -> Optional[Type[DataLoader]]:
+        loader, _ = self._loaders.get(type_name, (None, None))
+        return loader
+
+    def decode(self, global_id: str) -> Tuple[Optional[str], Any]:
+        """The type name and loader key of a global id, (None, None) if it isn't valid"""
+        if not isinstance(global_id, str):
+            return None, None
+        type_name, _id = from_global_id(global_id)
+        if type_name not in self._loaders:
+            return None, None
+        _, parse_key = self._loaders[type_name]
+        try:
+            return type_name, parse_key(_id)
+        except (TypeError, ValueError):
+            return None, None
+
+    async def load_many(self, context, type_name: str, keys: List[Any]) -> List[Any]:
+        loader, _ = self._loaders[type_name]
+        return await loader(context).load_many(keys)
+
+    async def resolve(self, context, global_ids: List[str]) -> List[Optional[Any]]:
+        """
+        Nodes for the given global ids, in the same order. None for ids that are
+        invalid or point to nothing.
+        """
+        return await self.resolve_decoded(
+            context, [self.decode(global_id) for global_id in global_ids]
+        )
+
+    async def resolve_decoded(
+        self, context, decoded: List[Tuple[Optional[str], Any]]
+    ) -> List[Optional[Any]]:
+        """Same as `resolve`, for ids already decoded with `decode`."""
+        keys_by_type: Dict[str, List[Any]] = {}
+        for type_name, key in decoded:
+            if type_name is not None:
+                keys_by_type.setdefault(type_name, []).append(key)
+
+        type_names = list(keys_by_type)
+        results = await asyncio.gather(
+            *(
+                self.load_many(context, type_name, keys_by_type[type_name])
+                for type_name in type_names
+            )
+        )
+        nodes = {
+            (type_name, key): node
+            for type_name, _nodes in zip(type_names, results)
+            for key, node in zip(keys_by_type[type_name], _nodes)
+        }
+        return [nodes.get(decoded_id) for decoded_id in decoded]
+
+
+node_registry = NodeRegistry()
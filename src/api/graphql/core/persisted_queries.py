@@ -0,0 +1,113 @@
+"""
+Persisted queries, so that clients can send an id instead of the document, and
+queries fit in the URL of a GET request that caches can keep (see
+`api/graphql/core/http_cache.py`).
+
+Requests name a persisted query with an `id` param, or with the
+`extensions.persistedQuery.sha256Hash` of Apollo's automatic persisted queries.
+Documents come from:
+- a manifest, a json object of id to document loaded at startup. Clients built
+  against it only ever send ids.
+- with `register`, requests sending a document along with its sha256 hash, which
+  is checked. They're kept in the worker's memory, `max_entries` at most. An
+  unknown hash gets a `PersistedQueryNotFound` error, and Apollo clients send the
+  document again.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class PersistedQueryError(Exception):
+    """
+    The persisted query of a request can't be found or registered. Answered with
+    a 200 like other graphql errors, unless the request itself is malformed.
+    """
+
+    def __init__(self, message: str, code: str, status_code: int = 200):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status_code = status_code
+
+    def as_result(self) -> Dict[str, Any]:
+        return {"errors": [{"message": self.message, "extensions": {"code": self.code}}]}
+
+
+def _bad_request(message: str) -> PersistedQueryError:
+    return PersistedQueryError(message, "BAD_REQUEST", status_code=400)
+
+
+class PersistedQueries:
+    """Persisted queries of a manifest, and registered ones, see the module docstring"""
+
+    def __init__(
+        self,
+        manifest: Optional[Dict[str, str]] = None,
+        register: bool = False,
+        max_entries: int = 10000,
+    ):
+        self.manifest = manifest or {}
+        self.register = register
+        self.max_entries = max_entries
+        self._registered: "OrderedDict[str, str]" = OrderedDict()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "PersistedQueries":
+        with open(path) as file:
+            return cls(json.load(file), **kwargs)
+
+    def get(self, query_id: str) -> Optional[str]:
+        query = self.manifest.get(query_id)
+        if query is None:
+            query = self._registered.get(query_id)
+            if query is not None:
+                self._registered.move_to_end(query_id)
+        return query
+
+    def resolve(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The request data `data`, with the document of its persisted query if it
+        names one. Registers the document it sends along with a hash, if enabled.
+        """
+        if not isinstance(data, dict):
+            return data
+        extensions = data.get("extensions") or {}
+        if isinstance(extensions, str):  # a GET param
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise _bad_request("extensions must be a json object")
+        if not isinstance(extensions, dict):
+            raise _bad_request("extensions must be a json object")
+        persisted = extensions.get("persistedQuery") or {}
+        if not isinstance(persisted, dict):
+            raise _bad_request("extensions.persistedQuery must be an object")
+        query_id = data.get("id") or persisted.get("sha256Hash")
+        if not query_id:
+            return data
+        if not isinstance(query_id, str):
+            raise _bad_request("persisted query ids must be strings")
+
+        query = data.get("query")
+        if query is None:
+            query = self.get(query_id)
+            if query is None:
+                raise PersistedQueryError(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            return {**data, "query": query}
+
+        if self.register and "sha256Hash" in persisted and query_id not in self.manifest:
+            if not isinstance(query, str):
+                raise _bad_request("query must be a string")
+            if hashlib.sha256(query.encode()).hexdigest() != query_id:
+                raise PersistedQueryError(
+                    "provided sha does not match query", "INVALID_PERSISTED_QUERY"
+                )
+            self._registered[query_id] = query
+            self._registered.move_to_end(query_id)
+            while len(self._registered) > self.max_entries:
+                self._registered.popitem(last=False)
+        return data
@@ -1,11 +1,31 @@
-from typing import Generic, List, Optional, TypeVar
+import asyncio
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+)
 
 import strawberry
-from aio_sqlakeyset.paging import get_page
+from aio_sqlakeyset.paging import PageStream, get_page, get_pages, stream_page
 from aio_sqlakeyset.results import Paging, unserialize_bookmark
+from graphql.execution.values import get_directive_values
+from graphql.language import FieldNode, InlineFragmentNode, SelectionSetNode
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.selectable import Select
+from strawberry.types import Info
 
+from api.graphql.core.bookmarks import bookmark_indexes
+from api.graphql.core.counting import CountMode, count, count_many, params_key
+from api.graphql.core.incremental import IncrementalDelivery, StreamDirective
 from exceptions import InvalidPaginationArgsError
 
 GenericType = TypeVar("GenericType")
@@ -22,6 +42,50 @@ class Connection(Generic[GenericType]):
 
     page_info: "PageInfo"
     edges: list["Edge[GenericType]"]
+    # counts the rows of the connection, only called when totalCount is selected
+    counter: strawberry.Private[Optional[Callable[[CountMode], Awaitable[int]]]] = None
+    count_mode: strawberry.Private[CountMode] = CountMode.EXACT
+
+    @strawberry.field(
+        description="Number of nodes in the connection across all pages. Null if "
+        "the connection can't be counted. Leave mode out for the connection's default."
+    )
+    async def total_count(self, mode: Optional[CountMode] = None) -> Optional[int]:
+        if self.counter is None:
+            return None
+        return await self.counter(mode or self.count_mode)
+
+
+class StreamedConnection(Connection):
+    """
+    A connection whose edges are streamed as the rows of its page arrive, see
+    `PaginationHelper.stream_connection`. Its page info waits for the whole page.
+    """
+
+    def __init__(
+        self,
+        edges: AsyncIterator["Edge"],
+        stream: PageStream,
+        build_page_info: Callable[[Paging], "PageInfo"],
+        counter: Optional[Callable[[CountMode], Awaitable[int]]] = None,
+        count_mode: CountMode = CountMode.EXACT,
+    ):
+        self.edges = edges
+        self.stream = stream
+        self.build_page_info = build_page_info
+        self.counter = counter
+        self.count_mode = count_mode
+        self._page_info = None
+
+    @property
+    def page_info(self) -> Awaitable["PageInfo"]:
+        if self._page_info is None:
+            self._page_info = asyncio.ensure_future(self._fetch_page_info())
+        return self._page_info
+
+    async def _fetch_page_info(self) -> "PageInfo":
+        page = await self.stream.fetch_all()
+        return self.build_page_info(page.paging)
 
 
 @strawberry.type
@@ -50,24 +114,138 @@ class Edge(Generic[GenericType]):
     cursor: str
 
 
+def _fields(info: Info, selection_set: Optional[SelectionSetNode]) -> Iterator[FieldNode]:
+    """
+    Fields of a selection set, with the fields of fragments flattened in. Walks the
+    AST rather than `info.selected_fields`, which in strawberry can't convert
+    inline fragments without a type condition, like `... @defer { }`.
+    """
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _fields(info, selection.selection_set)
+        else:
+            fragment = info._raw_info.fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _fields(info, fragment.selection_set)
+
+
+class ConnectionSelection:
+    """
+    What the selection set of a connection asks for, so that `PaginationHelper`
+    can skip the work nobody asked for. Directives are not evaluated, fields under
+    `@skip` or `@include` count as selected. By default everything is selected.
+    """
+
+    # node fields that don't need the node to be loaded
+    id_fields = {"id", "__typename"}
+
+    def __init__(
+        self,
+        edges: bool = True,
+        cursors: bool = True,
+        node_fields: Optional[Set[str]] = None,
+        start_cursor: bool = True,
+        end_cursor: bool = True,
+        stream_edges: bool = False,
+    ):
+        self.edges = edges
+        self.cursors = cursors
+        # None when not known, which means all of them
+        self.node_fields = node_fields
+        self.start_cursor = start_cursor
+        self.end_cursor = end_cursor
+        # whether edges are under `@stream`, see `PaginationHelper.streams_edges`
+        self.stream_edges = stream_edges
+
+    @classmethod
+    def from_info(cls, info: Info) -> "ConnectionSelection":
+        """Selection of the connection field being resolved"""
+        edges = cursors = start_cursor = end_cursor = stream_edges = False
+        node_fields = set()
+        variables = info._raw_info.variable_values
+        for connection in info._raw_info.field_nodes:
+            for field in _fields(info, connection.selection_set):
+                name = field.name.value
+                if name == "edges":
+                    edges = True
+                    stream = get_directive_values(StreamDirective, field, variables)
+                    stream_edges |= stream is not None and stream["if"]
+                    for edge_field in _fields(info, field.selection_set):
+                        if edge_field.name.value == "cursor":
+                            cursors = True
+                        elif edge_field.name.value == "node":
+                            node_fields.update(
+                                node_field.name.value
+                                for node_field in _fields(info, edge_field.selection_set)
+                            )
+                elif name == "pageInfo":
+                    names = {
+                        page_info_field.name.value
+                        for page_info_field in _fields(info, field.selection_set)
+                    }
+                    start_cursor |= "startCursor" in names
+                    end_cursor |= "endCursor" in names
+        return cls(edges, cursors, node_fields, start_cursor, end_cursor, stream_edges)
+
+    @property
+    def needs_rows(self) -> bool:
+        """Whether the rows of the page are needed, or just whether there are more"""
+        return self.edges or self.start_cursor or self.end_cursor
+
+    @property
+    def needs_nodes(self) -> bool:
+        """Whether nodes have to be loaded, or their ids are enough"""
+        return self.node_fields is None or bool(self.node_fields - self.id_fields)
+
+
 class PaginationHelper:
     """
     Helper object, takes a query and returns relay compliant paginated data.
     Create a new helper object for every new query. Don't reuse existing helper
-    objects
+    objects.
+
+    Pass the request's context to have pages memoized for the rest of the request,
+    so that a document selecting the same connection twice (under different
+    aliases, or from different fragments) only runs one query for it.
+
+    Pass `at` along with `first` to get the `at`-th page of `first` nodes, see
+    `api/graphql/core/bookmarks.py`.
+
+    Pass the resolver's info to skip what the connection's selection doesn't need:
+    without edges or cursors in page info only the row after the page is fetched
+    to find out if there are more, nodes aren't loaded when only their ids are
+    selected (see `load_nodes`), and cursors are only serialized when selected.
+
+    When the edges are under `@stream` and the request is delivered incrementally
+    (see `api/graphql/core/incremental.py`), `stream_connection` builds a connection
+    whose edges are sent as the rows of the page arrive, check `streams_edges`.
     """
 
+    memo_context_key = "pagination_memo"
+
     def __init__(
         self,
         before: Optional[str] = None,
         after: Optional[str] = None,
         first: Optional[int] = None,
         last: Optional[int] = None,
+        context: Optional[Dict] = None,
+        info: Optional[Info] = None,
+        at: Optional[int] = None,
     ):
         self.before = before
         self.after = after
         self.first = first
         self.last = last
+        self.context = context
+        self.at = at
+        self.selection = (
+            ConnectionSelection.from_info(info) if info else ConnectionSelection()
+        )
 
         self.validate()
 
@@ -97,6 +275,28 @@ class PaginationHelper:
                 "Mixing before and after is not supported."
             )
 
+        if self.at is not None:
+            if self.first is None:
+                raise InvalidPaginationArgsError("At without first is not supported.")
+            if self.after:
+                raise InvalidPaginationArgsError("Mixing at and after is not supported.")
+            if self.at < 1:
+                raise InvalidPaginationArgsError("At cannot be less than one.")
+
+    @property
+    def streams_edges(self) -> bool:
+        """
+        Whether the connection's edges can be streamed with `stream_connection`:
+        they're under `@stream`, the request is delivered incrementally and the
+        page is fetched forwards from a cursor.
+        """
+        return (
+            self.selection.stream_edges
+            and self.mode == "forwards"
+            and self.at is None
+            and IncrementalDelivery.from_context(self.context) is not None
+        )
+
     @property
     def mode(self):
         if self.last:
@@ -109,30 +309,218 @@ class PaginationHelper:
         cursor = self.before if backwards else self.after
         per_page = self.last if backwards else self.first
         place, _ = unserialize_bookmark(cursor) if cursor else (None, None)
-        return {"backwards": backwards, "place": place, "per_page": per_page}
+        return {
+            "backwards": backwards,
+            "place": place,
+            "per_page": per_page,
+            "probe": not self.selection.needs_rows,
+        }
 
-    def build_connection(self, nodes: List, paging: Paging) -> Connection:
-        """Build the connection object to return."""
+    def build_connection(
+        self,
+        nodes: List,
+        paging: Paging,
+        counter: Optional[Callable[[CountMode], Awaitable[int]]] = None,
+        count_mode: CountMode = CountMode.EXACT,
+    ) -> Connection:
+        """
+        Build the connection object to return. `counter` is called with a
+        `CountMode` when `totalCount` is selected, see `count`.
+        """
+        selection = self.selection
         edges = [Edge(node=node, cursor="") for node in nodes]
-        if edges:
+        if edges and selection.cursors:
             edges[0].cursor = paging.bookmark_first
             # TODO: Add cursor for other edges as well.
             edges[-1].cursor = paging.bookmark_last
-        page_info = PageInfo(
+        return Connection(
+            page_info=self.build_page_info(paging),
+            edges=edges,
+            counter=counter,
+            count_mode=count_mode,
+        )
+
+    def build_page_info(self, paging: Paging) -> PageInfo:
+        selection = self.selection
+        return PageInfo(
             has_next_page=paging.has_next,
             has_previous_page=paging.has_previous,
-            start_cursor=paging.bookmark_first,
-            end_cursor=paging.bookmark_last,
+            start_cursor=paging.bookmark_first if selection.start_cursor else None,
+            end_cursor=paging.bookmark_last if selection.end_cursor else None,
         )
-        return Connection(page_info=page_info, edges=edges)
 
-    async def paginate(self, query: Select, db: AsyncSession):
+    def stream_connection(
+        self,
+        query: Select,
+        db: AsyncSession,
+        loader,
+        params: Optional[Dict[str, Any]] = None,
+        counter: Optional[Callable[[CountMode], Awaitable[int]]] = None,
+        count_mode: CountMode = CountMode.EXACT,
+    ) -> StreamedConnection:
+        """
+        Same as `paginate`, `load_nodes` and `build_connection`, but nothing is
+        fetched up front: the page's rows are fetched as its edges are streamed,
+        `batch_size` rows of the incremental delivery at a time, every batch its own
+        keyset query continuing after the previous one (see `PageStream`), and
+        their nodes loaded from `loader` one batch at a time. Only when
+        `streams_edges`. Pages aren't memoized.
+        """
+        delivery = IncrementalDelivery.from_context(self.context)
+        place, _ = unserialize_bookmark(self.after) if self.after else (None, None)
+        stream = stream_page(
+            query, self.first, db, place=place, params=params, fetch_size=delivery.batch_size
+        )
+        return StreamedConnection(
+            self.stream_edges(stream, loader),
+            stream,
+            self.build_page_info,
+            counter=counter,
+            count_mode=count_mode,
+        )
+
+    async def stream_edges(self, stream: PageStream, loader) -> AsyncIterator[Edge]:
+        """
+        Edges of the page of `stream` as its rows are fetched. Like
+        `build_connection`, the first and last edges have cursors, so the last
+        edge of every fetch is held back until it's known whether it's the page's.
+        """
+        cursors = self.selection.cursors
+        last = None
+        fetched = 0
+        more = True
+        while more:
+            more = await stream.fetch()
+            page = stream.page
+            rows = [page[index] for index in range(fetched, len(page))]
+            if not rows:
+                continue
+            edges = [
+                Edge(node=node, cursor="")
+                for node in await self.load_nodes(rows, loader)
+            ]
+            if cursors and not fetched:
+                edges[0].cursor = page.paging.bookmark_first
+            fetched = len(page)
+            if last is not None:
+                yield last
+            for edge in edges[:-1]:
+                yield edge
+            last = edges[-1]
+        if last is not None:
+            if cursors:
+                last.cursor = stream.page.paging.bookmark_last
+            yield last
+
+    def get_memo_key(self, query: Select, params: Optional[Dict[str, Any]]):
+        """
+        Statements from `statement_cache` are shared by every sorter/filter input
+        of the same shape, so the statement along with the values bound to it and
+        the pagination args identify the page. Probes are told apart from pages.
+        """
+        return (
+            query,
+            params_key(params),
+            self.before,
+            self.after,
+            self.first,
+            self.last,
+            self.at,
+            self.selection.needs_rows,
+        )
+
+    async def paginate(
+        self, query: Select, db: AsyncSession, params: Optional[Dict[str, Any]] = None
+    ):
         """
         Paginates the given query with pagination data. Pass as effecient a query
         as possible, and fetch extra information from dataloader if needed. Or,
-        call this from dataloader itself if needed.
+        call this from dataloader itself if needed. `params` are the values for
+        the query's bind params, as returned by `StatementCache.build`.
         """
+        if self.at is not None:
+            position = (self.at - 1) * self.first
+            get = bookmark_indexes.get_page_at(query, db, self.first, position, params)
+        else:
+            sqlakeyset_args = self.__translate_args_to_sqlakeyset_args()
+            get = get_page(query, db=db, params=params, **sqlakeyset_args)
+        if self.context is None:
+            page = await get
+        else:
+            memo = self.context.setdefault(self.memo_context_key, {})
+            key = self.get_memo_key(query, params)
+            if key not in memo:
+                # store the task, so that identical connections resolved
+                # concurrently wait for the same query.
+                memo[key] = asyncio.ensure_future(get)
+            else:
+                get.close()
+            page = await memo[key]
+        # a new dict every time, callers replace the nodes with their own objects
+        return {"nodes": page, "paging": page.paging}
+
+    async def paginate_many(
+        self,
+        query: Select,
+        db: AsyncSession,
+        partition_by,
+        partitions: Iterable[Any],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Dict[Any, Dict]:
+        """
+        Same as `paginate`, but for many partitions of the query at once, like the
+        resources of many tags. `partition_by` is the column to partition on and
+        `partitions` its values, every partition gets its own page and all of them
+        are fetched in a single statement.
+        """
+        if self.at is not None:
+            raise InvalidPaginationArgsError("At is not supported on nested connections.")
         sqlakeyset_args = self.__translate_args_to_sqlakeyset_args()
-        page = await get_page(query, db=db, **sqlakeyset_args)
-        paging = page.paging
-        return {"nodes": page, "paging": paging}
+        pages = await get_pages(
+            query,
+            partition_by,
+            partitions,
+            db=db,
+            params=params,
+            **sqlakeyset_args,
+        )
+        return {
+            partition: {"nodes": page, "paging": page.paging}
+            for partition, page in pages.items()
+        }
+
+    async def load_nodes(self, rows: List, loader) -> List:
+        """
+        Nodes for the rows of a page of ids, from `loader`. When only ids are
+        selected, instances of the loader's `model` carrying just the id are
+        enough.
+        """
+        ids = [row[0] for row in rows]  # row[0] because rows are of form (id,).
+        if not self.selection.needs_nodes:
+            return [loader.model(id=_id) for _id in ids]
+        return await loader.load_many(ids)
+
+    async def count(
+        self,
+        query: Select,
+        db: AsyncSession,
+        params: Optional[Dict[str, Any]] = None,
+        mode: CountMode = CountMode.EXACT,
+    ) -> int:
+        """
+        Number of rows of the whole query, not just the page, see
+        `api/graphql/core/counting.py`. Pagination args don't matter here.
+        """
+        return await count(query, db, params, mode)
+
+    async def count_many(
+        self,
+        query: Select,
+        db: AsyncSession,
+        partition_by,
+        partitions: Iterable[Any],
+        params: Optional[Dict[str, Any]] = None,
+        mode: CountMode = CountMode.EXACT,
+    ) -> Dict[Any, int]:
+        """Same as `count`, for many partitions like `paginate_many`."""
+        return await count_many(query, db, partition_by, partitions, params, mode)
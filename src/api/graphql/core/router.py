@@ -0,0 +1,346 @@
+"""GraphQL router used by the app, strawberry's fastapi router with our additions"""
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional
+
+from fastapi import status
+from fastapi.responses import (
+    ORJSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.requests import Request
+from strawberry.exceptions import MissingQueryError
+from strawberry.fastapi import GraphQLRouter as BaseGraphQLRouter
+from strawberry.http import parse_request_data
+from strawberry.schema.exceptions import InvalidOperationTypeError
+from strawberry.types import ExecutionResult
+from strawberry.types.graphql import OperationType
+
+from api.graphql.core.cache import (
+    ResultCache,
+    operation_key,
+    start_recording,
+    stop_recording,
+)
+from api.graphql.core.coalescing import Coalescer
+from api.graphql.core.http_cache import (
+    HTTPCache,
+    begin_snapshot,
+    etag_matches,
+    read_versions,
+)
+from api.graphql.core.incremental import IncrementalDelivery
+from api.graphql.core.persisted_queries import PersistedQueries, PersistedQueryError
+
+if TYPE_CHECKING:
+    # registers an engine event when imported, only the app imports it when enabled
+    from api.graphql.core.capture import TrafficCapture
+
+
+class GraphQLRouter(BaseGraphQLRouter):
+    """
+    Adds opt-in layers around schema execution. Two of them for queries only:
+    - `result_cache` serves queries from a cache, and results of mutations
+      invalidate the entries built from the rows they changed. See
+      `api/graphql/core/cache.py`.
+    - `coalescer` makes identical queries that arrive while one is executing wait
+      for its result instead of executing again. See `api/graphql/core/coalescing.py`.
+
+    And `capture` writes every operation, with its timing and statement count, to
+    a file to replay later. See `api/graphql/core/capture.py`.
+
+    `http_cache` gives results of queries an ETag and a Cache-Control, and answers
+    conditional requests with a 304. See `api/graphql/core/http_cache.py`. With
+    `persisted_queries`, requests can send the id of a document instead of the
+    document, e.g. as GET requests. See `api/graphql/core/persisted_queries.py`.
+
+    Results are encoded with orjson rather than the json module. With a
+    `stream_batch_size`, results of operations using `@defer` or `@stream` are
+    delivered incrementally to clients accepting `multipart/mixed` responses, and
+    skip the result cache and the coalescer. See `api/graphql/core/incremental.py`.
+    """
+
+    def __init__(
+        self,
+        *args,
+        result_cache: Optional[ResultCache] = None,
+        coalescer: Optional[Coalescer] = None,
+        capture: Optional["TrafficCapture"] = None,
+        stream_batch_size: Optional[int] = None,
+        http_cache: Optional[HTTPCache] = None,
+        persisted_queries: Optional[PersistedQueries] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.result_cache = result_cache
+        self.coalescer = coalescer
+        self.capture = capture
+        self.stream_batch_size = stream_batch_size
+        self.http_cache = http_cache
+        self.persisted_queries = persisted_queries
+
+    def get_cache_scope(self, context) -> Any:
+        """
+        Part of the cache and coalescing key that depends on who is asking. We have
+        no auth yet, so everyone shares the same results. Override this once
+        results depend on the user.
+        """
+        return None
+
+    def get_incremental_delivery(
+        self, request: Request, query: Optional[str]
+    ) -> Optional[IncrementalDelivery]:
+        """
+        The incremental delivery of the request's result, if it can have one: the
+        client accepts `multipart/mixed` responses and the query uses the
+        directives. Otherwise they're ignored.
+        """
+        if (
+            self.stream_batch_size is None
+            or not query
+            or "multipart/mixed" not in request.headers.get("accept", "")
+            or ("@defer" not in query and "@stream" not in query)
+        ):
+            return None
+        return IncrementalDelivery(self.stream_batch_size)
+
+    async def execute(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        context: Any = None,
+        operation_name: Optional[str] = None,
+        root_value: Any = None,
+        allowed_operation_types: Optional[Iterable[OperationType]] = None,
+    ):
+        kwargs = dict(
+            variables=variables,
+            context=context,
+            operation_name=operation_name,
+            root_value=root_value,
+            allowed_operation_types=allowed_operation_types,
+        )
+        if self.capture is None or not self.capture.sampled():
+            return await self.execute_with_layers(query, **kwargs)
+
+        started = self.capture.start()
+        result = None
+        try:
+            result = await self.execute_with_layers(query, **kwargs)
+        finally:
+            self.capture.record(started, query, variables, operation_name, result)
+        return result
+
+    async def execute_with_layers(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        context: Any = None,
+        operation_name: Optional[str] = None,
+        root_value: Any = None,
+        allowed_operation_types: Optional[Iterable[OperationType]] = None,
+    ):
+        """Executes the operation through the result cache and the coalescer."""
+        key = None
+        if (
+            (self.result_cache is not None or self.coalescer is not None)
+            and (
+                allowed_operation_types is None
+                or OperationType.QUERY in allowed_operation_types
+            )
+            # the rest of an incremental result is executed after this returns
+            and IncrementalDelivery.from_context(context) is None
+        ):
+            key = operation_key(
+                query, variables, operation_name, self.get_cache_scope(context)
+            )
+
+        async def _execute():
+            return await self.execute_with_cache(
+                key,
+                query,
+                variables=variables,
+                context=context,
+                operation_name=operation_name,
+                root_value=root_value,
+                allowed_operation_types=allowed_operation_types,
+            )
+
+        if key is None:
+            return await _execute()
+
+        if self.result_cache is not None:
+            current = None
+            if HTTPCache.read_tags_context_key in context:
+                # the result gets an ETag, so it has to be the one of this request's
+                # snapshot, which the versions read along with it tell
+                async def current(versions):
+                    return await read_versions(context["db"], versions) == versions
+
+            entry = await self.result_cache.get_entry(key, current)
+            if entry is not None:
+                data, versions = entry
+                if current is not None:
+                    context[HTTPCache.read_tags_context_key] = set(versions)
+                    context[HTTPCache.versions_context_key] = versions
+                return ExecutionResult(data=data, errors=None)
+
+        if self.coalescer is not None and self.coalescer.enabled_for(operation_name):
+            return await self.coalescer.run(key, _execute)
+        return await _execute()
+
+    async def execute_with_cache(
+        self, key: Optional[str], query: str, context: Any = None, **kwargs
+    ):
+        """
+        Executes the operation, recording what it read and wrote when there's a
+        result cache, or when its result gets an ETag. The result is cached under
+        `key` if given, and committed writes invalidate the cache.
+        """
+        cache = self.result_cache
+        etag_read_tags = HTTPCache.read_tags_context_key in context
+        if cache is None and not etag_read_tags:
+            return await super().execute(query, context=context, **kwargs)
+
+        db = context["db"]
+        generation = cache.generation if cache is not None else None
+        start_recording(db)
+        try:
+            result = await super().execute(query, context=context, **kwargs)
+        finally:
+            read_tags, write_tags = stop_recording(db)
+
+        if etag_read_tags:
+            context[HTTPCache.read_tags_context_key] = read_tags
+        if cache is None:
+            return result
+        if write_tags:
+            await cache.invalidate(write_tags)
+        if key is not None and not result.errors and result.data is not None:
+            versions = None
+            if etag_read_tags:
+                # read in the request's snapshot, like the result
+                versions = await read_versions(db, read_tags)
+                context[HTTPCache.versions_context_key] = versions
+            await cache.set(key, result.data, read_tags, generation, versions)
+        return result
+
+    async def execute_request(
+        self, request: Request, response: Response, data: dict, context, root_value
+    ) -> Response:
+        """
+        strawberry's `execute_request`, answering with an `ORJSONResponse` instead
+        of a `JSONResponse`, or with a `multipart/mixed` response when the result is
+        delivered incrementally, or with a 304 when the client's copy is fresh.
+        """
+        if self.persisted_queries is not None:
+            try:
+                data = self.persisted_queries.resolve(data)
+            except PersistedQueryError as e:
+                return self._merge_responses(
+                    response, ORJSONResponse(e.as_result(), status_code=e.status_code)
+                )
+        try:
+            request_data = parse_request_data(data)
+        except MissingQueryError:
+            missing_query_response = PlainTextResponse(
+                "No GraphQL query found in the request",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+            return self._merge_responses(response, missing_query_response)
+
+        method = request.method
+        allowed_operation_types = OperationType.from_http(method)
+        if not self.allow_queries_via_get and method == "GET":
+            allowed_operation_types = allowed_operation_types - {OperationType.QUERY}
+
+        delivery = self.get_incremental_delivery(request, request_data.query)
+        if delivery is not None:
+            context[IncrementalDelivery.context_key] = delivery
+
+        http_cache_key = None
+        if (
+            self.http_cache is not None
+            and delivery is None
+            and OperationType.QUERY in allowed_operation_types
+        ):
+            http_cache_key = operation_key(
+                request_data.query,
+                request_data.variables,
+                request_data.operation_name,
+                self.get_cache_scope(context),
+            )
+        if http_cache_key is not None:
+            db = context["db"]
+            await begin_snapshot(db)
+            etag = await self.http_cache.short_circuit(
+                db, http_cache_key, request.headers.get("if-none-match")
+            )
+            if etag is not None:
+                return self.not_modified_response(
+                    response, etag, request_data.operation_name
+                )
+            context[HTTPCache.read_tags_context_key] = None
+
+        try:
+            result = await self.execute(
+                request_data.query,
+                variables=request_data.variables,
+                context=context,
+                operation_name=request_data.operation_name,
+                root_value=root_value,
+                allowed_operation_types=allowed_operation_types,
+            )
+        except InvalidOperationTypeError as e:
+            return PlainTextResponse(
+                e.as_http_error_reason(method),
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        response_data = await self.process_result(request, result)
+        if delivery is not None and delivery.has_next(result.data):
+            return self._merge_responses(
+                response,
+                StreamingResponse(
+                    delivery.multipart(response_data),
+                    status_code=status.HTTP_200_OK,
+                    media_type=IncrementalDelivery.media_type,
+                ),
+            )
+        json_response = ORJSONResponse(response_data, status_code=status.HTTP_200_OK)
+        if http_cache_key is not None:
+            read_tags = context.get(HTTPCache.read_tags_context_key)
+            if result.errors or result.data is None:
+                json_response.headers["Cache-Control"] = "no-store"
+            else:
+                if read_tags is not None:
+                    # otherwise it was executed for another request by the coalescer,
+                    # and what it read isn't known
+                    etag = await self.http_cache.etag(
+                        context["db"],
+                        http_cache_key,
+                        read_tags,
+                        context.get(HTTPCache.versions_context_key),
+                    )
+                    if etag_matches(request.headers.get("if-none-match"), etag):
+                        self.http_cache.not_modified += 1
+                        return self.not_modified_response(
+                            response, etag, request_data.operation_name
+                        )
+                    json_response.headers["ETag"] = etag
+                json_response.headers["Cache-Control"] = self.http_cache.cache_control(
+                    request_data.operation_name
+                )
+        return self._merge_responses(response, json_response)
+
+    def not_modified_response(
+        self, response: Response, etag: str, operation_name: Optional[str]
+    ) -> Response:
+        not_modified = Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={
+                "ETag": etag,
+                "Cache-Control": self.http_cache.cache_control(operation_name),
+            },
+        )
+        return self._merge_responses(response, not_modified)
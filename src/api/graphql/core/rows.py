@@ -0,0 +1,25 @@
+"""
+Read-only nodes built straight from core rows, for queries that don't need ORM
+objects. See `read_only_nodes` in settings.
+"""
+from typing import Any
+
+
+class RowNode:
+    """
+    Base for read-only nodes. Subclasses list their fields in `__slots__`, and
+    are built from rows of those columns, in the same order. Fields that aren't
+    given are None.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values: Any, **fields: Any):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        for name in self.__slots__[len(values) :]:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
@@ -1,9 +1,15 @@
+import dataclasses
+import logging
+from collections import OrderedDict
 from enum import Enum
+from typing import Any, Dict, Hashable, Tuple
 
 import strawberry
 from sqlalchemy import asc, desc
 from sqlalchemy.sql.selectable import Select
 
+logger = logging.getLogger(__name__)
+
 
 @strawberry.enum
 class SortDirection(str, Enum):
@@ -22,12 +28,26 @@ class BaseSorter:
     def validate(self) -> bool:
         return True  # no validation by default
 
+    def shape(self) -> Tuple:
+        """
+        Everything that changes the statement built by `_add_sorters`. Every
+        sorter input changes the ORDER BY, so by default all of them are part of it.
+        """
+        return tuple(
+            (field.name, getattr(self, field.name))
+            for field in dataclasses.fields(self)
+        )
+
+    def bind_params(self) -> Dict[str, Any]:
+        """Values for the bind params used in `_add_sorters`, if any."""
+        return {}
+
     def _add_sorters(self, query: Select) -> Select:
         raise NotImplementedError
 
     def add_sorters(self, query: Select) -> Select:
         if self.validate():
-            return self._add_sorters(query)
+            return self._add_sorters(query).params(**self.bind_params())
 
     @staticmethod
     def default():
@@ -39,13 +59,95 @@ class BaseFilter:
     def validate(self) -> bool:
         return True  # no validation by default
 
+    def shape(self) -> Tuple:
+        """
+        Everything that changes the statement built by `_add_filters`. By default
+        that is just which filters are set, the values themselves should go in
+        as bind params through `bind_params`.
+        """
+        return tuple(
+            field.name for field in dataclasses.fields(self) if getattr(self, field.name)
+        )
+
+    def bind_params(self) -> Dict[str, Any]:
+        """Values for the bind params used in `_add_filters`."""
+        return {}
+
     def _add_filters(self, query: Select) -> Select:
         raise NotImplementedError
 
     def add_filters(self, query: Select) -> Select:
         if self.validate():
-            return self._add_filters(query)
+            return self._add_filters(query).params(**self.bind_params())
 
     @staticmethod
     def default():
         return {}
+
+
+class StatementCache:
+    """
+    Statements built by sorters and filters, keyed by the shape of their input
+    instead of its values. Filters put their values in bind params (lists as
+    `= ANY(:array)`), so every request with the same shape runs the exact same
+    statement. Sqlalchemy then compiles it once, and asyncpg can reuse its
+    prepared statement.
+
+    Base queries are keyed by a name given by the caller, which has to stand for
+    one constant query. Sqlalchemy's own cache key can't be used for that, it
+    leaves out the values of bound literals, so `X.kind == 1` and `X.kind == 2`
+    would share a statement.
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._statements: "OrderedDict[Hashable, Select]" = OrderedDict()
+
+    def build(
+        self, name: Hashable, query: Select, sorter: BaseSorter, filter: BaseFilter
+    ) -> Tuple[Select, Dict[str, Any]]:
+        """
+        Returns the statement for `query`, the base query called `name`, with the
+        sorter and filter applied, and the params to execute it with.
+        """
+        if not (sorter.validate() and filter.validate()):
+            raise ValueError("Invalid sorter or filter.")
+        key = (
+            name,
+            type(sorter),
+            sorter.shape(),
+            type(filter),
+            filter.shape(),
+        )
+        statement = self._statements.get(key)
+        if statement is None:
+            self.misses += 1
+            statement = sorter._add_sorters(filter._add_filters(query))
+            self._statements[key] = statement
+            if len(self._statements) > self.maxsize:
+                self._statements.popitem(last=False)
+            logger.debug(
+                "Statement cache miss for %s, hit rate %.2f", key[1:], self.hit_rate
+            )
+        else:
+            self.hits += 1
+            self._statements.move_to_end(key)
+        return statement, {**filter.bind_params(), **sorter.bind_params()}
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._statements),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+statement_cache = StatementCache()
@@ -0,0 +1,29 @@
+from typing import List, Optional
+
+import strawberry
+from strawberry.types import Info
+
+from api.graphql.core.node import Node, node_registry
+from api.settings import get_settings
+
+settings = get_settings()
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    async def node(self, info: Info, id: strawberry.ID) -> Optional[Node]:
+        (node,) = await node_registry.resolve(info.context, [id])
+        return node
+
+    @strawberry.field
+    async def nodes(self, info: Info, ids: List[strawberry.ID]) -> List[Optional[Node]]:
+        """
+        Ids are grouped by type, so this costs one query per type no matter how
+        many ids are asked for. At most `MAX_NODE_IDS` ids are taken.
+        """
+        if len(ids) > settings.max_node_ids:
+            raise ValueError(
+                f"Cannot provide more than {settings.max_node_ids} ids at a time."
+            )
+        return await node_registry.resolve(info.context, ids)
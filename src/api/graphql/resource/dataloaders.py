@@ -1,13 +1,25 @@
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased, selectinload
 
-from api.db.models import Resource
+from api.db.models import Resource, ResourceTagAssociation, Tag
+from api.graphql.core.counting import params_key
 from api.graphql.core.dataloader import DataLoader
+from api.graphql.core.rows import RowNode
+from api.graphql.tag.dataloaders import TagRow
+from api.settings import get_settings
+
+settings = get_settings()
+
+
+class ResourceRow(RowNode):
+    __slots__ = ("id", "name", "description", "tags")
+    columns = (Resource.id, Resource.name, Resource.description)
 
 
 class ResourceByIdLoader(DataLoader):
     context_key = "resource_by_id"
     order_key = "id"
+    model = Resource
 
     async def batch_load_fn(self, keys):
         query = (
@@ -18,3 +30,130 @@ class ResourceByIdLoader(DataLoader):
         session = self.context["db"]
         res = await session.execute(query)
         return res.scalars().all()
+
+
+class ResourceRowByIdLoader(DataLoader):
+    """
+    Same as `ResourceByIdLoader`, but loads read-only `ResourceRow`s from core
+    rows, which never go through the session's identity map. Their tags are
+    `TagRow`s, loaded with a second query like selectinload does.
+    """
+
+    context_key = "resource_row_by_id"
+    order_key = "id"
+    model = ResourceRow
+
+    async def batch_load_fn(self, keys):
+        session = self.context["db"]
+        res = await session.execute(
+            select(*ResourceRow.columns).where(Resource.id.in_(keys))
+        )
+        resources = {row[0]: ResourceRow(*row, tags=[]) for row in res}
+        res = await session.execute(
+            select(ResourceTagAssociation.resource_id, *TagRow.columns)
+            .join(Tag, Tag.id == ResourceTagAssociation.tag_id)
+            .where(ResourceTagAssociation.resource_id.in_(keys))
+        )
+        tags = {}
+        for resource_id, tag_id, *tag in res:
+            if tag_id not in tags:
+                tags[tag_id] = TagRow(tag_id, *tag)
+            resources[resource_id].tags.append(tags[tag_id])
+        return list(resources.values())
+
+
+# loads the resources returned by queries, see `read_only_nodes` in settings
+ResourceNodeLoader = (
+    ResourceRowByIdLoader if settings.read_only_nodes else ResourceByIdLoader
+)
+
+
+class ResourceIdPagesByTagIdLoader(DataLoader):
+    """
+    Pages of resource ids for many tags, used by the `Tag.resources` connection.
+    Keys are `(tag_id, page_key)`, and all the tags asking for the same page (same
+    sorter, filter and pagination args) are paginated together in a single
+    statement. Use `load_page` rather than `load`.
+    """
+
+    context_key = "resource_id_pages_by_tag_id"
+    # aliased, so that it doesn't get mixed up with the association table joined
+    # by the tags filter of ResourcesFilter.
+    tag_association = aliased(ResourceTagAssociation, name="tag_association")
+    query = select(Resource.id).where(Resource.id == tag_association.resource_id)
+
+    def __init__(self, context, *args, **kwargs):
+        if self.context != context:
+            self.page_requests = {}
+        super().__init__(context, *args, **kwargs)
+
+    async def load_page(self, tag_id, helper, query, params=None):
+        """
+        `query` must be built on top of `self.query`, with the sorters and filters
+        of the connection applied.
+        """
+        page_key = helper.get_memo_key(query, params)
+        self.page_requests.setdefault(page_key, (helper, query, params))
+        return await self.load((tag_id, page_key))
+
+    async def batch_load_fn(self, keys):
+        tag_ids_by_page = {}
+        for tag_id, page_key in keys:
+            tag_ids_by_page.setdefault(page_key, []).append(tag_id)
+        pages = {}
+        for page_key, tag_ids in tag_ids_by_page.items():
+            helper, query, params = self.page_requests[page_key]
+            _pages = await helper.paginate_many(
+                query,
+                self.context["db"],
+                partition_by=self.tag_association.tag_id,
+                partitions=tag_ids,
+                params=params,
+            )
+            for tag_id, page in _pages.items():
+                pages[(tag_id, page_key)] = page
+        return [pages[key] for key in keys]
+
+
+class ResourceCountsByTagIdLoader(DataLoader):
+    """
+    Total counts of the `Tag.resources` connection for many tags. Keys are
+    `(tag_id, count_key)`, and all the tags counting the same filtered query in
+    the same mode are counted together in a single statement. Use `load_count`
+    rather than `load`.
+    """
+
+    context_key = "resource_counts_by_tag_id"
+
+    def __init__(self, context, *args, **kwargs):
+        if self.context != context:
+            self.count_requests = {}
+        super().__init__(context, *args, **kwargs)
+
+    async def load_count(self, tag_id, helper, query, params=None, mode=None):
+        """
+        `query` must be built on top of `ResourceIdPagesByTagIdLoader.query`, like
+        the query of the page.
+        """
+        count_key = (query, params_key(params), mode)
+        self.count_requests.setdefault(count_key, (helper, query, params, mode))
+        return await self.load((tag_id, count_key))
+
+    async def batch_load_fn(self, keys):
+        tag_ids_by_count = {}
+        for tag_id, count_key in keys:
+            tag_ids_by_count.setdefault(count_key, []).append(tag_id)
+        counts = {}
+        for count_key, tag_ids in tag_ids_by_count.items():
+            helper, query, params, mode = self.count_requests[count_key]
+            _counts = await helper.count_many(
+                query,
+                self.context["db"],
+                partition_by=ResourceIdPagesByTagIdLoader.tag_association.tag_id,
+                partitions=tag_ids,
+                params=params,
+                mode=mode,
+            )
+            for tag_id, total in _counts.items():
+                counts[(tag_id, count_key)] = total
+        return [counts[key] for key in keys]
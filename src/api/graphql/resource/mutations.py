@@ -6,6 +6,7 @@ from sqlalchemy import select
 
 from api.db.models import Resource as ResourceModel
 from api.graphql.resource.types import Resource
+from api.graphql.tag.counters import update_resource_counts
 from api.graphql.tag.dataloaders import TagByIdLoader
 
 @strawberry.input
@@ -33,6 +34,8 @@ class Mutation:
             # Since we defined relationship on the model, we can just add to resource.tags
             # and sqlalchemy takes care of populating the association table
             resource.tags.extend(tags)
+            # same transaction as the resource, so the counters never drift
+            await update_resource_counts(db, [tag.id for tag in tags])
         db.add(resource)
         await db.commit()
         return resource # committing automatically adds id back to the resource.
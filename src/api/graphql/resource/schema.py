@@ -3,15 +3,17 @@ from strawberry.types import Info
 from sqlalchemy import select
 
 from api.db.models import Resource as ResourceModel
+from api.graphql.core.counting import CountMode
 from api.graphql.core.relay import Connection, Optional, PaginationHelper
-from api.graphql.resource.dataloaders import ResourceByIdLoader
+from api.graphql.core.types import statement_cache
+from api.graphql.resource.dataloaders import ResourceNodeLoader
 from api.graphql.resource.types import Resource, ResourcesSorter, ResourcesFilter
 
 @strawberry.type
 class Query:
     @strawberry.field
     async def resource(self, info: Info, id: int) -> Resource:
-        return await ResourceByIdLoader(info.context).load(id)
+        return await ResourceNodeLoader(info.context).load(id)
 
     @strawberry.field
     async def resources(
@@ -21,6 +23,7 @@ class Query:
         after: Optional[str] = None,
         first: Optional[int] = None,
         last: Optional[int] = None,
+        at: Optional[int] = None,
         sortBy: ResourcesSorter = ResourcesSorter.default(),
         filter: ResourcesFilter = ResourcesFilter.default(),
     ) -> Connection[Resource]:
@@ -29,10 +32,18 @@ class Query:
         associated with those ids to leverage dataloader cache.
         """
         db = info.context["db"]
-        helper = PaginationHelper(before, after, first, last)
-        query = sortBy.add_sorters(filter.add_filters(select(ResourceModel.id)))
-        _data = await helper.paginate(query=query, db=db)
-        _data["nodes"] = await ResourceByIdLoader(info.context).load_many(
-            _node[0] for _node in _data["nodes"]
-        ) # _node[0] because _node is of form (id,).
-        return helper.build_connection(**_data)
+        helper = PaginationHelper(before, after, first, last, info.context, info, at)
+        query, params = statement_cache.build(
+            "resources", select(ResourceModel.id), sortBy, filter
+        )
+        loader = ResourceNodeLoader(info.context)
+        counter = lambda mode: helper.count(query, db, params, mode)  # noqa: E731
+        # resources are listed a lot more often than they are created
+        count_mode = CountMode.CACHED
+        if helper.streams_edges:
+            return helper.stream_connection(
+                query, db, loader, params, counter=counter, count_mode=count_mode
+            )
+        _data = await helper.paginate(query=query, db=db, params=params)
+        _data["nodes"] = await helper.load_nodes(_data["nodes"], loader)
+        return helper.build_connection(**_data, counter=counter, count_mode=count_mode)
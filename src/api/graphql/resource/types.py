@@ -2,11 +2,16 @@ from enum import Enum
 from typing import Optional, List
 import strawberry
 from graphql_relay import from_global_id
-from sqlalchemy import func
+from sqlalchemy import Integer, String, any_, bindparam, func
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.sql.selectable import Select
 from api.db.models import Resource as ResourceModel, Tag as TagModel, ResourceTagAssociation
-from api.graphql.tag.types import Tag
+from api.graphql.core.node import Node, node_registry
 from api.graphql.core.types import BaseFilter, BaseSorter
+from api.graphql.resource.dataloaders import ResourceNodeLoader, ResourceRow
+
+# lazy, since the Tag type refers back to resources through its connection
+Tag = strawberry.LazyType["Tag", "api.graphql.tag.types"]
 
 @strawberry.enum
 class ResourcesSorterFields(str, Enum):
@@ -39,30 +44,56 @@ class ResourcesFilter(BaseFilter):
         return True
 
     def _add_filters(self, query: Select):
+        # Only which filters are set decides the statement, values are bound at
+        # execution. See `bind_params` and `StatementCache`.
         if self.ids:
-            ids = [int(from_global_id(id)[1]) for id in self.ids]
-            query = query.filter(ResourceModel.id.in_(ids))
+            query = query.filter(
+                ResourceModel.id == any_(bindparam("resource_ids", type_=ARRAY(Integer)))
+            )
         if self.tags:
             query = (
                 query.filter(
                     ResourceModel.id == ResourceTagAssociation.resource_id,
                     ResourceTagAssociation.tag_id == TagModel.id,
-                    TagModel.name.in_(self.tags),
+                    TagModel.name == any_(bindparam("resource_tags", type_=ARRAY(String))),
                 )
                 .group_by(ResourceModel.id)
-                .having(func.count(ResourceModel.id) >= len(self.tags))
+                .having(
+                    func.count(ResourceModel.id)
+                    >= bindparam("resource_tag_count", type_=Integer)
+                )
             )
         if self.search:
-            query = query.filter(ResourceModel.slug.like(f"%{self.search.lower()}%"))
+            query = query.filter(
+                ResourceModel.slug.like(bindparam("resource_search", type_=String))
+            )
         return query
 
-@strawberry.type
-class Resource:
+    def bind_params(self):
+        params = {}
+        if self.ids:
+            params["resource_ids"] = [int(from_global_id(id)[1]) for id in self.ids]
+        if self.tags:
+            params["resource_tags"] = self.tags
+            params["resource_tag_count"] = len(self.tags)
+        if self.search:
+            params["resource_search"] = f"%{self.search.lower()}%"
+        return params
+
+@strawberry.federation.type(keys=["id"])
+class Resource(Node):
     id: strawberry.ID
     name: str
     description: str
 
+    @classmethod
+    def is_type_of(cls, obj, info) -> bool:
+        # resolvers return models or rows, which strawberry can't tell apart by itself
+        return isinstance(obj, (cls, ResourceModel, ResourceRow))
+
     @strawberry.field
     async def tags(self) -> List[Tag]:
         return self.tags
 
+
+node_registry.register(Resource, ResourceNodeLoader)
@@ -1,11 +1,19 @@
 """Composes all queries, mutations, and subscriptions and returns schema"""
+from functools import lru_cache
 from typing import Optional
 
 import strawberry
 from strawberry.extensions import AddValidationRules, QueryDepthLimiter
 
 from api.graphql.core.extensions import RelayIdExtension
+from api.graphql.core.federation import Schema
+from api.graphql.core.incremental import (
+    DeferDirective,
+    IncrementalExecutionContext,
+    StreamDirective,
+)
 from api.graphql.core.validators.query_cost import cost_validator
+from api.graphql.node.schema import Query as NodeQuery
 from api.graphql.resource.schema import Query as ResourceQuery
 from api.graphql.resource.mutations import Mutation as ResourceMutation
 from api.graphql.query_cost_map import COST_MAP
@@ -17,7 +25,7 @@ settings = get_settings()
 
 
 @strawberry.type
-class Query(ResourceQuery, TagQuery):
+class Query(NodeQuery, ResourceQuery, TagQuery):
     """
     We have to inherit from every Query we want. Each module in this folder
     would expose Query, and we import that into this file, and add it just like
@@ -32,14 +40,28 @@ class Mutation(TagMutation, ResourceMutation):
     pass
 
 
-schema = strawberry.federation.Schema(
-    Query,
-    Mutation,
-    extensions=[
-        RelayIdExtension,
-        QueryDepthLimiter(max_depth=settings.max_query_depth),
-        AddValidationRules(
-            [cost_validator(maximum_cost=settings.max_query_cost, cost_map=COST_MAP)]
-        ),
-    ],
-)
+@lru_cache
+def get_schema() -> Schema:
+    """The schema, built on first use rather than on import"""
+    schema = Schema(
+        Query,
+        Mutation,
+        extensions=[
+            RelayIdExtension,
+            QueryDepthLimiter(max_depth=settings.max_query_depth),
+            AddValidationRules(
+                [cost_validator(maximum_cost=settings.max_query_cost, cost_map=COST_MAP)]
+            ),
+        ],
+        execution_context_class=IncrementalExecutionContext,
+    )
+    # strawberry only knows of directives it implements, @defer and @stream are
+    # executed by graphql-core's execution context, see incremental.py
+    schema._schema.directives = (*schema._schema.directives, DeferDirective, StreamDirective)
+    return schema
+
+
+def __getattr__(name):
+    if name == "schema":
+        return get_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,31 @@
+"""Maintenance of the denormalized resource counts per tag"""
+from typing import Iterable
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.db.models import TagResourceCount
+
+
+async def update_resource_counts(db: AsyncSession, tag_ids: Iterable[int], delta: int = 1):
+    """
+    Add `delta` to the resource count of every given tag. This runs on the
+    session's transaction, so the counters are committed (or rolled back) together
+    with the resource changes that caused them.
+    """
+    # sorted so that concurrent transactions lock the counter rows in the same
+    # order and can't deadlock each other.
+    tag_ids = sorted(set(tag_ids))
+    if not tag_ids:
+        return
+    query = insert(TagResourceCount).values(
+        [{"tag_id": tag_id, "resource_count": delta} for tag_id in tag_ids]
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[TagResourceCount.tag_id],
+        set_={
+            "resource_count": TagResourceCount.resource_count
+            + query.excluded.resource_count
+        },
+    )
+    await db.execute(query)
@@ -1,14 +1,71 @@
-from sqlalchemy import select
+from sqlalchemy import func, select
 
-from api.db.models import Tag
+from api.db.models import ResourceTagAssociation, Tag, TagResourceCount
 from api.graphql.core.dataloader import DataLoader
+from api.graphql.core.rows import RowNode
+from api.settings import get_settings
+
+settings = get_settings()
+
+
+class TagRow(RowNode):
+    __slots__ = ("id", "name")
+    columns = (Tag.id, Tag.name)
 
 
 class TagByIdLoader(DataLoader):
     context_key = "tag_by_id"
     order_key = "id"
+    model = Tag
 
     async def batch_load_fn(self, keys):
         query = select(Tag).filter(Tag.id.in_(keys))
         res = await self.context["db"].execute(query)
         return res.scalars().all()
+
+
+class TagRowByIdLoader(DataLoader):
+    """
+    Same as `TagByIdLoader`, but loads read-only `TagRow`s from core rows, which
+    never go through the session's identity map.
+    """
+
+    context_key = "tag_row_by_id"
+    order_key = "id"
+    model = TagRow
+
+    async def batch_load_fn(self, keys):
+        query = select(*TagRow.columns).where(Tag.id.in_(keys))
+        res = await self.context["db"].execute(query)
+        return [TagRow(*row) for row in res]
+
+
+# loads the tags returned by queries. Mutations need the models, and use
+# TagByIdLoader directly.
+TagNodeLoader = TagRowByIdLoader if settings.read_only_nodes else TagByIdLoader
+
+
+class ResourceCountByTagIdLoader(DataLoader):
+    """
+    Number of resources associated with each tag. All the tags requested in one
+    go are counted with a single query, either a GROUP BY over the association
+    table or a lookup in the maintained counters table depending on settings.
+    """
+
+    context_key = "resource_count_by_tag_id"
+
+    async def batch_load_fn(self, keys):
+        if settings.tag_resource_count_mode == "counter":
+            query = select(
+                TagResourceCount.tag_id, TagResourceCount.resource_count
+            ).where(TagResourceCount.tag_id.in_(keys))
+        else:
+            query = (
+                select(ResourceTagAssociation.tag_id, func.count())
+                .where(ResourceTagAssociation.tag_id.in_(keys))
+                .group_by(ResourceTagAssociation.tag_id)
+            )
+        res = await self.context["db"].execute(query)
+        counts = dict(res.all())
+        # tags without any resources don't show up in the result
+        return [counts.get(key, 0) for key in keys]
@@ -6,7 +6,8 @@ from strawberry.types import Info
 
 from api.db.models import Tag as TagModel
 from api.graphql.core.relay import Connection, PaginationHelper
-from api.graphql.tag.dataloaders import TagByIdLoader
+from api.graphql.core.types import statement_cache
+from api.graphql.tag.dataloaders import TagNodeLoader
 from api.graphql.tag.types import Tag, TagsFilter, TagsSorter
 
 
@@ -14,7 +15,7 @@ from api.graphql.tag.types import Tag, TagsFilter, TagsSorter
 class Query:
     @strawberry.field
     async def tag(self, info: Info, id: int) -> Optional[Tag]:
-        return await TagByIdLoader(info.context).load(id)
+        return await TagNodeLoader(info.context).load(id)
 
     @strawberry.field
     async def tags(
@@ -24,13 +25,19 @@ class Query:
         after: Optional[str] = None,
         first: Optional[int] = None,
         last: Optional[int] = None,
+        at: Optional[int] = None,
         sortBy: TagsSorter = TagsSorter.default(),
         filter: TagsFilter = TagsFilter.default(),
     ) -> Connection[Tag]:
-        helper = PaginationHelper(before, after, first, last)
-        query = filter.add_filters(sortBy.add_sorters(select(TagModel.id)))
-        _data = await helper.paginate(query, info.context["db"])
-        _data["nodes"] = await TagByIdLoader(info.context).load_many(
-            [_node[0] for _node in _data["nodes"]]
+        helper = PaginationHelper(before, after, first, last, info.context, info, at)
+        query, params = statement_cache.build(
+            "tags", select(TagModel.id), sortBy, filter
         )
-        return helper.build_connection(**_data)
+        db = info.context["db"]
+        loader = TagNodeLoader(info.context)
+        counter = lambda mode: helper.count(query, db, params, mode)  # noqa: E731
+        if helper.streams_edges:
+            return helper.stream_connection(query, db, loader, params, counter=counter)
+        _data = await helper.paginate(query, db, params)
+        _data["nodes"] = await helper.load_nodes(_data["nodes"], loader)
+        return helper.build_connection(**_data, counter=counter)
@@ -3,10 +3,26 @@ from typing import List, Optional
 
 import strawberry
 from graphql_relay import from_global_id
+from sqlalchemy import Integer, String, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.sql.selectable import Select
+from strawberry.types import Info
 
 from api.db.models import Tag as TagModel
-from api.graphql.core.types import BaseFilter, BaseSorter
+from api.graphql.core.node import Node, node_registry
+from api.graphql.core.relay import Connection, PaginationHelper
+from api.graphql.core.types import BaseFilter, BaseSorter, statement_cache
+from api.graphql.resource.dataloaders import (
+    ResourceCountsByTagIdLoader,
+    ResourceIdPagesByTagIdLoader,
+    ResourceNodeLoader,
+)
+from api.graphql.resource.types import Resource, ResourcesFilter, ResourcesSorter
+from api.graphql.tag.dataloaders import (
+    ResourceCountByTagIdLoader,
+    TagNodeLoader,
+    TagRow,
+)
 
 
 @strawberry.enum
@@ -34,14 +50,66 @@ class TagsFilter(BaseFilter):
 
     def _add_filters(self, query: Select) -> Select:
         if self.ids:
-            ids = [int(from_global_id(id)[1]) for id in self.ids]
-            query = query.filter(TagModel.id.in_(ids))
+            query = query.filter(
+                TagModel.id == any_(bindparam("tag_ids", type_=ARRAY(Integer)))
+            )
         if self.search:
-            query = query.filter(TagModel.slug.like(f"%{self.search.lower()}%"))
+            query = query.filter(TagModel.slug.like(bindparam("tag_search", type_=String)))
         return query
 
+    def bind_params(self):
+        params = {}
+        if self.ids:
+            params["tag_ids"] = [int(from_global_id(id)[1]) for id in self.ids]
+        if self.search:
+            params["tag_search"] = f"%{self.search.lower()}%"
+        return params
 
-@strawberry.type
-class Tag:
+
+@strawberry.federation.type(keys=["id"])
+class Tag(Node):
     id: strawberry.ID
     name: str
+
+    @classmethod
+    def is_type_of(cls, obj, info) -> bool:
+        # resolvers return models or rows, which strawberry can't tell apart by itself
+        return isinstance(obj, (cls, TagModel, TagRow))
+
+    @strawberry.field
+    async def resource_count(self, info: Info) -> int:
+        # batched across all the tags in the response by the dataloader
+        return await ResourceCountByTagIdLoader(info.context).load(self.id)
+
+    @strawberry.field
+    async def resources(
+        self,
+        info: Info,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        first: Optional[int] = None,
+        last: Optional[int] = None,
+        sortBy: ResourcesSorter = ResourcesSorter.default(),
+        filter: ResourcesFilter = ResourcesFilter.default(),
+    ) -> Connection[Resource]:
+        """
+        Every tag in the response asking for the same page of resources is
+        paginated in a single query by the dataloader.
+        """
+        helper = PaginationHelper(before, after, first, last, info.context, info)
+        loader = ResourceIdPagesByTagIdLoader(info.context)
+        query, params = statement_cache.build(
+            "tag_resources", loader.query, sortBy, filter
+        )
+        _data = dict(await loader.load_page(self.id, helper, query, params))
+        _data["nodes"] = await helper.load_nodes(
+            _data["nodes"], ResourceNodeLoader(info.context)
+        )
+        counts = ResourceCountsByTagIdLoader(info.context)
+        return helper.build_connection(
+            **_data,
+            counter=lambda mode: counts.load_count(self.id, helper, query, params, mode),
+        )
+
+
+node_registry.register(Tag, TagNodeLoader)
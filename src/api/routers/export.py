@@ -0,0 +1,184 @@
+"""Bulk exports, for jobs that want whole datasets rather than pages"""
+from functools import lru_cache
+from typing import List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Integer, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import aliased
+
+from aio_sqlakeyset.paging import iter_pages
+from aio_sqlakeyset.results import serialize_bookmark, unserialize_bookmark
+from aio_sqlakeyset.serial import BadBookmark
+from api.db.models import Resource as ResourceModel
+from api.db.models import ResourceTagAssociation, Tag as TagModel
+from api.graphql.core.types import statement_cache
+from api.graphql.resource.types import ResourcesFilter, ResourcesSorter
+from api.settings import get_settings
+from dependencies.db import get_db
+
+settings = get_settings()
+
+router = APIRouter()
+
+
+@lru_cache
+def import_pyarrow():
+    """
+    pyarrow, None if it isn't installed (it's optional, `poetry install -E arrow`).
+    Imported by the first arrow export rather than on startup, it's slow to import.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+# aliased, so that the filters joining the association table don't correlate
+_association = aliased(ResourceTagAssociation)
+_tag = aliased(TagModel)
+resource_tag_names = (
+    select(func.array_agg(_tag.name))
+    .join(_association, _association.tag_id == _tag.id)
+    .where(_association.resource_id == ResourceModel.id)
+    .correlate(ResourceModel)
+    .scalar_subquery()
+)
+resource_tag_ids = (
+    select(func.array_agg(_association.tag_id, type_=ARRAY(Integer)))
+    .where(_association.resource_id == ResourceModel.id)
+    .correlate(ResourceModel)
+    .scalar_subquery()
+)
+export_query = select(
+    ResourceModel.id,
+    ResourceModel.name,
+    ResourceModel.description,
+    resource_tag_names.label("tags"),
+)
+
+
+def get_resources_filter(
+    ids: Optional[List[str]] = Query(None, description="Global ids, ten at most."),
+    tags: Optional[List[str]] = Query(
+        None, description="Tag names, resources having all of them. Ten at most."
+    ),
+    search: Optional[str] = Query(
+        None, description="Part of the slug of the resources, case insensitive."
+    ),
+) -> ResourcesFilter:
+    """The filters of the `resources` graphql query, from query params"""
+    resources_filter = ResourcesFilter(ids=ids, tags=tags, search=search)
+    try:
+        resources_filter.validate()
+    except AssertionError as exc:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(exc))
+    return resources_filter
+
+
+def get_place(after: Optional[str] = None):
+    try:
+        place, _ = unserialize_bookmark(after)
+    except (BadBookmark, ValueError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor.")
+    return place
+
+
+@router.get("/resources", response_class=StreamingResponse)
+async def export_resources(
+    place=Depends(get_place),
+    per_page: int = Query(settings.export_page_size, gt=0, le=10000),
+    resources_filter: ResourcesFilter = Depends(get_resources_filter),
+    db=Depends(get_db),
+):
+    """
+    Streams the filtered resources as NDJSON, one resource per line in id order.
+    Every line has a `cursor`, pass the last one received as `after` to resume.
+    """
+    query, params = statement_cache.build(
+        "export_resources", export_query, ResourcesSorter(), resources_filter
+    )
+
+    async def lines():
+        # the next page is only fetched once the previous one is sent, so a slow
+        # client holds one page in memory, not the whole export.
+        async for page in iter_pages(query, per_page, db, place=place, params=params):
+            yield b"".join(
+                orjson.dumps(
+                    {
+                        "id": _id,
+                        "name": name,
+                        "description": description,
+                        "tags": tags or [],
+                        "cursor": serialize_bookmark(((_id,), False)),
+                    }
+                )
+                + b"\n"
+                for _id, name, description, tags in page
+            )
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+arrow_query = select(
+    ResourceModel.id,
+    ResourceModel.name,
+    ResourceModel.description,
+    resource_tag_ids.label("tag_ids"),
+)
+# end of stream marker of the arrow ipc stream format
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+@router.get("/resources.arrow", response_class=StreamingResponse)
+async def export_resources_arrow(
+    batch_size: int = Query(settings.export_arrow_batch_size, gt=0, le=1000000),
+    resources_filter: ResourcesFilter = Depends(get_resources_filter),
+    db=Depends(get_db),
+):
+    """
+    Streams the filtered resources, with the ids of their tags, as an Arrow IPC
+    stream of record batches of `batch_size` rows. Batches are built column-wise
+    from the rows of a server side cursor, no ORM objects or json involved.
+    """
+    pyarrow = import_pyarrow()
+    if pyarrow is None:
+        raise HTTPException(
+            status.HTTP_501_NOT_IMPLEMENTED,
+            "Arrow exports need pyarrow, install with `poetry install -E arrow`.",
+        )
+    schema = pyarrow.schema(
+        [
+            ("id", pyarrow.int64()),
+            ("name", pyarrow.string()),
+            ("description", pyarrow.string()),
+            ("tag_ids", pyarrow.list_(pyarrow.int64())),
+        ]
+    )
+    query, params = statement_cache.build(
+        "export_resources_arrow", arrow_query, ResourcesSorter(), resources_filter
+    )
+
+    async def batches():
+        # an ipc stream is its schema message followed by record batch messages
+        yield schema.serialize().to_pybytes()
+        result = await db.stream(query, params)
+        try:
+            async for rows in result.partitions(batch_size):
+                batch = pyarrow.RecordBatch.from_arrays(
+                    [
+                        pyarrow.array(column, type=field.type)
+                        for column, field in zip(zip(*rows), schema)
+                    ],
+                    schema=schema,
+                )
+                yield batch.serialize().to_pybytes()
+        finally:
+            await result.close()
+        yield ARROW_EOS
+
+    return StreamingResponse(
+        batches(), media_type="application/vnd.apache.arrow.stream"
+    )
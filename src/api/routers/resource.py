@@ -1,15 +1,43 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
-from api.db.models import Resource as ResourceModel
+from api.db.models import Resource as ResourceModel, Tag as TagModel
+from api.graphql.core.cache import row_tag
+from api.graphql.core.http_cache import (
+    begin_snapshot,
+    compute_etag,
+    etag_matches,
+    read_versions,
+)
+from api.settings import get_settings
 from dependencies.db import get_db
 from schemas.resource import Resource
 
-router = APIRouter()
+settings = get_settings()
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+@router.get(
+    "/{id}",
+    responses={
+        status.HTTP_200_OK: {"model": Resource},
+        status.HTTP_304_NOT_MODIFIED: {"description": "The client's copy is fresh."},
+    },
+)
+async def get_resource(id: int, request: Request, db = Depends(get_db)):
+    headers = {}
+    if settings.http_cache_enabled:
+        # the resource's row, with its tags (see api/graphql/core/http_cache.py),
+        # read in the same snapshot as the resource
+        await begin_snapshot(db)
+        tags = [row_tag(ResourceModel.__tablename__, [id]), TagModel.__tablename__]
+        etag = compute_etag(request.url.path, await read_versions(db, tags))
+        headers = {"ETag": etag, "Cache-Control": settings.http_cache_default_policy}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-@router.get("/{id}", responses={status.HTTP_200_OK: {"model": Resource}})
-async def get_resource(id: int, db = Depends(get_db)):
     query = (
         select(ResourceModel)
         .where(ResourceModel.id == id)
@@ -17,5 +45,10 @@ async def get_resource(id: int, db = Depends(get_db)):
     )
     res = await db.execute(query)
     res = res.scalars().first()
+    if res is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Resource not found.")
     tags = [tag.name for tag in res.tags]
-    return Resource(name=res.name, description=res.description, tags=tags)
+    # the values come from the database, so the model is built without validating
+    # them, and returning the response skips fastapi's jsonable_encoder
+    resource = Resource.construct(name=res.name, description=res.description, tags=tags)
+    return ORJSONResponse(resource.dict(), headers=headers)
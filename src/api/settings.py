@@ -2,8 +2,9 @@
 import os
 from functools import lru_cache
 from pathlib import Path
+from typing import List, Literal, Optional
 
-from pydantic import BaseSettings
+from pydantic import BaseSettings, PositiveInt
 
 base_path = Path(__file__).parent
 
@@ -14,15 +15,96 @@ class Settings(BaseSettings):
     # database
     database_dsn: str = ""
 
+    # connections to the database across all the worker processes, split evenly
+    # between them, so there are never more workers than connections. None leaves
+    # sqlalchemy's default pool to every worker.
+    db_connection_budget: Optional[PositiveInt] = None
+
     # logging
     log_level: str = "info"
 
+    # production server, see serve.py
+    host: str = "0.0.0.0"
+    port: int = 8101
+    # worker processes, one per core by default, see `worker_count`
+    web_concurrency: Optional[int] = None
+    # seconds given to in-flight requests once the server is asked to stop
+    graceful_timeout: int = 30
+
     # general
     static_dir: str = os.path.join(base_path, "static")
 
     # graphql
     max_query_depth: int = 100
     max_query_cost: int = 1000
+    # most ids `nodes(ids:)` takes, and representations `_entities` takes
+    max_node_ids: int = 100
+    # "grouped" counts resources per tag with one GROUP BY over the association
+    # table, "counter" reads the counters maintained by the resource mutations.
+    tag_resource_count_mode: Literal["grouped", "counter"] = "grouped"
+
+    # queries load read-only nodes from core rows instead of ORM objects, see
+    # api/graphql/core/rows.py
+    read_only_nodes: bool = False
+
+    # graphql result cache, see api/graphql/core/cache.py
+    result_cache_enabled: bool = False
+    result_cache_max_entries: int = 10000
+    result_cache_max_bytes: int = 64 * 1024 * 1024
+    # safety net for writes that don't go through our sessions, in seconds. Every
+    # worker process has its own cache, which doesn't see the writes of the others
+    # before this unless http caching is enabled, see serve.py
+    result_cache_ttl: Optional[float] = 300
+
+    # cached totalCount of connections, see api/graphql/core/counting.py
+    count_cache_max_entries: int = 4096
+    count_cache_ttl: Optional[float] = 60
+
+    # bookmark index for jumping to pages with `at:`, see api/graphql/core/bookmarks.py
+    bookmark_index_enabled: bool = False
+    bookmark_index_every: int = 1000
+
+    # coalescing of identical in-flight queries, see api/graphql/core/coalescing.py
+    coalesce_queries: bool = False
+
+    # http caching of query results, see api/graphql/core/http_cache.py, and
+    # api/graphql/cache_control_map.py for per operation policies
+    http_cache_enabled: bool = False
+    http_cache_default_policy: str = "no-cache"
+    http_cache_max_validators: int = 10000
+
+    # persisted queries, see api/graphql/core/persisted_queries.py. A json file
+    # of id to document, and whether clients can register their own
+    persisted_queries_path: Optional[str] = None
+    persisted_queries_register: bool = False
+    persisted_queries_max_entries: int = 10000
+
+    # @defer and @stream, see api/graphql/core/incremental.py. Most items of a
+    # streamed list sent per payload, and rows fetched at a time for streamed edges
+    incremental_delivery_enabled: bool = True
+    stream_batch_size: int = 50
+
+    # capture of the graphql traffic, see api/graphql/core/capture.py
+    traffic_capture_enabled: bool = False
+    # every process writes its own file, with its pid added before the extension
+    traffic_capture_path: str = "traffic.jsonl"
+    traffic_capture_max_bytes: int = 100 * 1024 * 1024
+    traffic_capture_backups: int = 5
+    traffic_capture_sample_rate: float = 1.0
+    # fnmatch patterns of the names of variables whose values aren't written
+    traffic_capture_redact: List[str] = ["*password*", "*secret*", "*token*", "*auth*"]
+
+    # exports, see api/routers/export.py
+    export_page_size: int = 1000
+    export_arrow_batch_size: int = 10000
+
+    @property
+    def worker_count(self) -> int:
+        workers = self.web_concurrency or os.cpu_count() or 1
+        if self.db_connection_budget is not None:
+            # every worker needs a connection of its own
+            workers = min(workers, self.db_connection_budget)
+        return workers
 
     class Config:
         """pydantic's settings config"""
@@ -0,0 +1,5 @@
+"""
+Benchmarks, run them from the src folder against the database in your settings,
+e.g. `python -m benchmarks.federation_entities`. Every benchmark prints one json
+line per case, so results are easy to diff or to feed into something else.
+"""
@@ -0,0 +1,260 @@
+"""
+Loads large datasets of resources and tags with binary COPY, e.g.
+`python -m benchmarks.bulk_load --resources 10000000`, for the sizes where
+`benchmarks.dataset` (and creating resources through the api even more so) takes
+too long. Like `benchmarks.dataset`, it only replaces datasets it seeded, and the
+result can be used by the same benchmarks.
+
+Rows are generated in python, a chunk ahead of the one being copied, and copied
+into `tag_tag`, `resource_resource` and `resource_resourcetagassociation` through
+asyncpg's `copy_records_to_table`:
+- tags are named like the seeded ones, `bench-tag-<id>`, which is also their slug.
+- resources are named with three random words, `bench-Amber Cedar Dawn <id>`, so
+  sorting by name is unrelated to sorting by id, and get the slug of their name,
+  `bench-amber-cedar-dawn-<id>`, for the `search` filters.
+- every resource has `min_tags` to `max_tags` distinct tags, drawn from a Zipf
+  distribution: the tag of rank `k` (tag id `k`) is drawn in proportion to
+  `1 / k ^ zipf`, so low ids are the popular tags.
+- the same arguments load the same dataset.
+
+Everything happens in a single transaction. The constraints and indexes of the
+tables are dropped before copying and created again afterwards, which is much
+faster than maintaining them row by row. Then the resource counts per tag are
+backfilled, and the tables are analyzed.
+"""
+import argparse
+import asyncio
+import time
+from bisect import bisect
+from itertools import accumulate
+from random import Random
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+from api.db.session import engine
+from benchmarks.dataset import (
+    RESOURCE_PREFIX,
+    TABLES,
+    analyze,
+    finish_load,
+    scratch_size,
+    tag_name,
+)
+
+CHUNK_SIZE = 100_000
+
+WORDS = (
+    "amber arctic autumn bold brave bright calm cedar clever cobalt coral cosmic "
+    "crimson crystal dawn desert dusty eager echo ember fern flint frost gentle "
+    "golden granite harbor hazel hidden hollow indigo ivory jade jolly lunar "
+    "maple meadow misty noble ocean olive orchid pebble pine quiet rapid raven "
+    "river rustic sable silent silver solar spruce stone storm summer swift tidal "
+    "velvet willow winter wild zephyr"
+).split()
+
+
+class Zipf:
+    """Draws ranks from 1 to `n`, rank `k` in proportion to `1 / k ^ exponent`."""
+
+    def __init__(self, n: int, exponent: float, rng: Random):
+        self.cum_weights = list(
+            accumulate(1 / rank ** exponent for rank in range(1, n + 1))
+        )
+        self.total = self.cum_weights[-1]
+        self.rng = rng
+
+    def sample(self) -> int:
+        return bisect(self.cum_weights, self.rng.random() * self.total) + 1
+
+
+def name_and_slug(rng: Random, resource_id: int) -> Tuple[str, str]:
+    words = [rng.choice(WORDS) for _ in range(3)]
+    name = f"{RESOURCE_PREFIX}{' '.join(words).title()} {resource_id}"
+    slug = f"{RESOURCE_PREFIX}{'-'.join(words)}-{resource_id}"
+    return name, slug
+
+
+def generate_chunk(
+    start: int, stop: int, rng: Random, zipf: Zipf, min_tags: int, max_tags: int
+) -> Tuple[List[tuple], List[tuple]]:
+    """Rows of the resources with ids from `start` to `stop` excluded, and of their tags"""
+    resources = []
+    associations = []
+    for resource_id in range(start, stop):
+        name, slug = name_and_slug(rng, resource_id)
+        resources.append((resource_id, name, slug, f"Benchmark resource {resource_id}"))
+        tag_ids = set()
+        count = rng.randint(min_tags, max_tags)
+        while len(tag_ids) < count:
+            tag_ids.add(zipf.sample())
+        associations.extend((tag_id, resource_id) for tag_id in tag_ids)
+    return resources, associations
+
+
+async def drop_indexes(connection) -> List[str]:
+    """
+    Drops the constraints and indexes of the dataset's tables, and returns the
+    statements creating them again, in order.
+    """
+    tables = {"tables": list(TABLES)}
+    constraints = (
+        await connection.execute(
+            text(
+                "SELECT conrelid::regclass::text, conname, contype::text, "
+                "pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid::regclass::text = ANY(CAST(:tables AS text[])) "
+                "AND contype IN ('p', 'u', 'f')"
+            ),
+            tables,
+        )
+    ).all()
+    indexes = (
+        await connection.execute(
+            text(
+                "SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE schemaname = current_schema() "
+                "AND tablename = ANY(CAST(:tables AS text[]))"
+            ),
+            tables,
+        )
+    ).all()
+
+    # foreign keys depend on the unique indexes of the tables they reference
+    constraints = sorted(constraints, key=lambda constraint: constraint[2] != "f")
+    for table, name, _, _ in constraints:
+        await connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+    # indexes backing a constraint are gone with it
+    constraint_names = {name for _, name, _, _ in constraints}
+    indexes = [
+        (name, definition) for name, definition in indexes if name not in constraint_names
+    ]
+    for name, _ in indexes:
+        await connection.execute(text(f'DROP INDEX "{name}"'))
+
+    def add_constraints(foreign_keys: bool):
+        return [
+            f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'
+            for table, name, kind, definition in constraints
+            if (kind == "f") == foreign_keys
+        ]
+
+    return (
+        add_constraints(foreign_keys=False)
+        + [definition for _, definition in indexes]
+        + add_constraints(foreign_keys=True)
+    )
+
+
+async def load(
+    resources: int,
+    tags: int = 1000,
+    min_tags: int = 1,
+    max_tags: int = 8,
+    zipf: float = 1.0,
+    seed: int = 42,
+    maintenance_work_mem: str = "1GB",
+) -> dict:
+    """
+    Replaces the dataset with a generated one, see the module docstring. Returns
+    the size of the dataset and the duration of every step in seconds.
+    """
+    max_tags = min(max_tags, tags)
+    min_tags = min(min_tags, max_tags)
+    rng = Random(seed)
+    tag_zipf = Zipf(tags, zipf, rng)
+    loop = asyncio.get_running_loop()
+    timings = {}
+
+    async with engine.begin() as connection:
+        await scratch_size(connection)
+        started = time.perf_counter()
+        await connection.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY"))
+        await connection.execute(
+            text(f"SET LOCAL maintenance_work_mem = '{maintenance_work_mem}'")
+        )
+        create_indexes = await drop_indexes(connection)
+        # the sqlalchemy transaction is already begun on it by the statements above
+        copy = (await connection.get_raw_connection()).driver_connection
+
+        await copy.copy_records_to_table(
+            "tag_tag",
+            records=(
+                (tag_id, tag_name(tag_id), tag_name(tag_id)) for tag_id in range(1, tags + 1)
+            ),
+            columns=("id", "name", "slug"),
+        )
+        chunks = [
+            (start, min(start + CHUNK_SIZE, resources + 1))
+            for start in range(1, resources + 1, CHUNK_SIZE)
+        ]
+
+        def generate(chunk):
+            return loop.run_in_executor(
+                None, generate_chunk, *chunk, rng, tag_zipf, min_tags, max_tags
+            )
+
+        # the next chunk is generated while the current one is copied
+        pending = generate(chunks[0]) if chunks else None
+        for index, (_, stop) in enumerate(chunks):
+            resource_rows, association_rows = await pending
+            if index + 1 < len(chunks):
+                pending = generate(chunks[index + 1])
+            await copy.copy_records_to_table(
+                "resource_resource",
+                records=resource_rows,
+                columns=("id", "name", "slug", "description"),
+            )
+            await copy.copy_records_to_table(
+                "resource_resourcetagassociation",
+                records=association_rows,
+                columns=("tag_id", "resource_id"),
+            )
+            print(f"copied {stop - 1}/{resources} resources", flush=True)
+        timings["copy"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for statement in create_indexes:
+            await connection.execute(text(statement))
+        timings["indexes"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await finish_load(connection, resources, tags)
+        timings["counters"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await analyze()
+    timings["analyze"] = time.perf_counter() - started
+    return {
+        "resources": resources,
+        "tags": tags,
+        **{f"{step}_s": round(duration, 1) for step, duration in timings.items()},
+    }
+
+
+async def main(args):
+    result = await load(
+        args.resources,
+        args.tags,
+        args.min_tags,
+        args.max_tags,
+        args.zipf,
+        args.seed,
+        args.maintenance_work_mem,
+    )
+    print(f"dataset {result} loaded")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--resources", type=int, default=1_000_000)
+    parser.add_argument("--tags", type=int, default=1000)
+    parser.add_argument("--min-tags", type=int, default=1)
+    parser.add_argument("--max-tags", type=int, default=8)
+    parser.add_argument("--zipf", type=float, default=1.0, help="exponent of the tag popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--maintenance-work-mem", default="1GB", help="memory for building the indexes"
+    )
+    asyncio.run(main(parser.parse_args()))
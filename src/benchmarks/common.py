@@ -0,0 +1,60 @@
+"""Helpers shared by the benchmarks"""
+import json
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from sqlalchemy import event
+
+
+class StatementCounter:
+    """Counts the statements executed on an engine while inside the `with` block."""
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+async def measure(fn: Callable[[], Awaitable[Any]], repeat: int) -> List[float]:
+    """Runs `fn` once to warm up, then `repeat` times, returns the durations."""
+    await fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Durations in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "min_ms": ordered[0] * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest rank percentile of sorted samples"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(benchmark: str, case: Dict[str, Any], samples: List[float], **extra):
+    """Prints a result as one json line and returns it."""
+    result = {"benchmark": benchmark, **case, **summarize(samples), **extra}
+    print(json.dumps(result, default=str), flush=True)
+    return result
@@ -0,0 +1,189 @@
+"""
+Seeds a benchmark dataset of resources and tags into the database from your
+settings, e.g. `python -m benchmarks.dataset --resources 1000000`. Use a scratch
+database: seeding refuses to run on tables holding rows it didn't create, and
+replaces the dataset already there if it has a different size.
+
+Everything is generated by postgres itself (`generate_series`), in chunks of
+resources, so that millions of rows don't go through python:
+- resources are named `bench-<md5 of the position>`, so sorting by name is
+  unrelated to sorting by id, like with real names. Slugs are the same as names.
+- resource `n` has 1 to `max_tags` tags, cycling through that range. Which tags
+  follows a power law: the tag id is `tags * random() ^ skew`, so low ids are the
+  popular tags, `bench-tag-000001` being drawn `1 / tags ^ (1 / skew)` of the
+  time. `setseed` makes the same arguments seed the same dataset.
+- the resource counts per tag are backfilled, and the tables are analyzed.
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import bindparam, func, select, text
+
+from api.db.models import Resource, Tag
+from api.db.session import AsyncSessionLocal, engine
+
+RESOURCE_PREFIX = "bench-"
+TAG_PREFIX = "bench-tag-"
+CHUNK_SIZE = 500_000
+
+TABLES = (
+    "resource_resourcetagassociation",
+    "tag_tagresourcecount",
+    "resource_resource",
+    "tag_tag",
+)
+
+
+def tag_name(tag_id: int) -> str:
+    """Name of a seeded tag, tag ids start at 1 and lower ids are more popular"""
+    return f"{TAG_PREFIX}{tag_id:06d}"
+
+
+class DatasetError(Exception):
+    pass
+
+
+async def dataset_size(db) -> Optional[dict]:
+    """
+    Number of resources and tags of the seeded dataset, None if the tables hold
+    rows that weren't seeded.
+    """
+    foreign = await db.scalar(
+        select(func.count()).where(~Resource.name.startswith(RESOURCE_PREFIX))
+    ) + await db.scalar(select(func.count()).where(~Tag.name.startswith(TAG_PREFIX)))
+    if foreign:
+        return None
+    return {
+        "resources": await db.scalar(select(func.count(Resource.id))),
+        "tags": await db.scalar(select(func.count(Tag.id))),
+    }
+
+
+async def scratch_size(db) -> dict:
+    """`dataset_size`, raises if the tables hold rows that weren't seeded."""
+    size = await dataset_size(db)
+    if size is None:
+        raise DatasetError(
+            "The database has resources or tags that weren't seeded by the "
+            "benchmarks, seed into a scratch database instead."
+        )
+    return size
+
+
+async def seed(
+    resources: int,
+    tags: int = 1000,
+    max_tags: int = 8,
+    skew: float = 3.0,
+    seed: float = 0.42,
+    force: bool = False,
+) -> dict:
+    """
+    Seeds the dataset, see the module docstring. Does nothing if a dataset of the
+    same size is already there, unless `force`. Returns the size of the dataset.
+    """
+    async with AsyncSessionLocal() as db:
+        size = await scratch_size(db)
+        if size == {"resources": resources, "tags": tags} and not force:
+            return size
+
+        await db.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY"))
+        await db.execute(
+            text(
+                "INSERT INTO tag_tag (name, slug) "
+                "SELECT :prefix || lpad(n::text, 6, '0'), :prefix || lpad(n::text, 6, '0') "
+                "FROM generate_series(1, CAST(:tags AS integer)) AS n"
+            ),
+            {"prefix": TAG_PREFIX, "tags": tags},
+        )
+        await db.commit()
+
+        for start in range(1, resources + 1, CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE - 1, resources)
+            # a different seed per chunk, in setseed's [-1, 1]
+            chunk_seed = (seed + start / CHUNK_SIZE * 0.001) % 2 - 1
+            await db.execute(select(func.setseed(bindparam("seed"))), {"seed": chunk_seed})
+            await db.execute(
+                text(
+                    "INSERT INTO resource_resource (id, name, slug, description) "
+                    "SELECT n, :prefix || md5(n::text), :prefix || md5(n::text), "
+                    "'Benchmark resource ' || n "
+                    "FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS n"
+                ),
+                {"prefix": RESOURCE_PREFIX, "start": start, "stop": stop},
+            )
+            await db.execute(
+                text(
+                    "INSERT INTO resource_resourcetagassociation (tag_id, resource_id) "
+                    "SELECT DISTINCT "
+                    "floor(CAST(:tags AS integer) * power(random(), CAST(:skew AS float)))::int + 1, n "
+                    "FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS n, "
+                    "LATERAL generate_series(1, 1 + n % CAST(:max_tags AS integer)) AS k"
+                ),
+                {
+                    "tags": tags,
+                    "skew": skew,
+                    "max_tags": max_tags,
+                    "start": start,
+                    "stop": stop,
+                },
+            )
+            await db.commit()
+            print(f"seeded {stop}/{resources} resources", flush=True)
+
+        await finish_load(db, resources, tags)
+        await db.commit()
+
+    await analyze()
+    return {"resources": resources, "tags": tags}
+
+
+async def finish_load(db, resources: int, tags: int):
+    """
+    Moves the id sequences past the loaded rows and backfills the resource counts
+    per tag, for datasets loaded with explicit ids.
+    """
+    for table, rows in (("resource_resource", resources), ("tag_tag", tags)):
+        await db.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                "greatest(CAST(:rows AS integer), 1))"
+            ),
+            {"rows": rows},
+        )
+    await db.execute(
+        text(
+            "INSERT INTO tag_tagresourcecount (tag_id, resource_count) "
+            "SELECT tag_id, count(*) FROM resource_resourcetagassociation "
+            "GROUP BY tag_id"
+        )
+    )
+
+
+async def analyze():
+    # ANALYZE can't run in a transaction block
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text(f"ANALYZE {', '.join(TABLES)}"))
+
+
+async def main(args):
+    start = time.perf_counter()
+    size = await seed(
+        args.resources, args.tags, args.max_tags, args.skew, args.seed, args.force
+    )
+    print(f"dataset {size} ready in {time.perf_counter() - start:.1f}s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--resources", type=int, default=10_000)
+    parser.add_argument("--tags", type=int, default=1000)
+    parser.add_argument("--max-tags", type=int, default=8)
+    parser.add_argument("--skew", type=float, default=3.0)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--force", action="store_true")
+    asyncio.run(main(parser.parse_args()))
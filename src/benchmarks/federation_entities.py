@@ -0,0 +1,71 @@
+"""
+Resolves `_entities` for large lists of representations, half resources and half
+tags, and reports how long it takes and how many statements it runs. With the
+batched resolver from `api/graphql/core/federation.py` that should be one statement
+per type, whatever the number of representations.
+
+Ids are generated as 1..n for both types, ids that don't exist in the database
+resolve to null but still go through the decode, the batch and the `IN` list.
+Representations are inlined in the document rather than passed as variables,
+since the query cost validator doesn't get to see the variables.
+"""
+import argparse
+import asyncio
+
+from graphql_relay import to_global_id
+
+from api.db.session import AsyncSessionLocal, engine
+from api.graphql.schema import schema
+from benchmarks.common import StatementCounter, measure, report
+
+QUERY = """
+query Entities {
+  _entities(representations: [%s]) {
+    ... on Resource { id name }
+    ... on Tag { id name }
+  }
+}
+"""
+
+
+def entities_query(size: int) -> str:
+    type_names = ["Resource", "Tag"]
+    representations = [
+        '{__typename: "%s", id: "%s"}'
+        % (type_names[index % 2], to_global_id(type_names[index % 2], index // 2 + 1))
+        for index in range(size)
+    ]
+    return QUERY % ", ".join(representations)
+
+
+async def resolve_entities(query: str):
+    async with AsyncSessionLocal() as db:
+        result = await schema.execute(query, context_value={"db": db})
+    if result.errors:
+        raise result.errors[0]
+    return result
+
+
+async def main(sizes, repeat):
+    for size in sizes:
+        query = entities_query(size)
+        with StatementCounter(engine) as counter:
+            await resolve_entities(query)
+        samples = await measure(lambda: resolve_entities(query), repeat)
+        report(
+            "federation_entities",
+            {"representations": size},
+            samples,
+            statements=counter.count,
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
@@ -0,0 +1,84 @@
+"""
+Conditional requests against full executions, on a `resources` connection of
+`--edges` edges (100 by default) from the seeded dataset (see `benchmarks.dataset`),
+with the tags of every resource, sent as a persisted query over GET through an app
+in-process with http caching enabled.
+
+Cases:
+- `executed`: requests without `If-None-Match`, the query is executed and its
+  result gets an ETag.
+- `not_modified`: requests with the ETag of the previous case, answered with a 304
+  after looking up the versions of what the result was built from.
+
+Raise `MAX_QUERY_COST` if the query is rejected for its cost.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from api.db.session import dispose_engine, get_engine
+from api.graphql.core.context import get_context_for_fastapi
+from api.graphql.core.http_cache import HTTPCache
+from api.graphql.core.persisted_queries import PersistedQueries
+from api.graphql.core.router import GraphQLRouter
+from api.graphql.schema import get_schema
+from benchmarks.common import StatementCounter, report
+
+QUERY = """query Resources {
+  resources(first: %d) {
+    totalCount
+    edges { cursor node { id name description tags { id name } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}"""
+
+
+async def time_requests(client: httpx.AsyncClient, headers, count: int, status: int):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.get("/graphql", params={"id": "resources"}, headers=headers)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == status, response.text
+    return samples
+
+
+async def main(args):
+    app = FastAPI()
+    app.include_router(
+        GraphQLRouter(
+            get_schema(),
+            context_getter=get_context_for_fastapi,
+            http_cache=HTTPCache(),
+            persisted_queries=PersistedQueries({"resources": QUERY % args.edges}),
+        ),
+        prefix="/graphql",
+    )
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        response = await client.get("/graphql", params={"id": "resources"})  # warm up
+        etag = response.headers["etag"]
+        cases = {
+            "executed": ({}, 200),
+            "not_modified": ({"if-none-match": etag}, 304),
+        }
+        for name, (headers, status) in cases.items():
+            with StatementCounter(get_engine()) as counter:
+                samples = await time_requests(client, headers, args.requests, status)
+            report(
+                "http_cache",
+                {"edges": args.edges, "case": name},
+                samples,
+                statements=counter.count / args.requests,
+            )
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--edges", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""
+Time to first byte and total time of a `resources` connection of `--edges` edges
+(500 by default) from the seeded dataset (see `benchmarks.dataset`), with the name
+and tags of every resource, through the app in-process.
+
+Cases:
+- `plain`: the whole connection in one json response.
+- `stream`: edges under `@stream(initialCount: --initial)` and page info under
+  `@defer`, in a `multipart/mixed` response. The first byte is the first payload,
+  with the first edges.
+
+Raise `MAX_QUERY_COST` if the query is rejected for its cost.
+"""
+import argparse
+import asyncio
+import time
+
+import orjson
+
+from api.app import create_app
+from api.db.session import dispose_engine
+from benchmarks.common import report
+
+PLAIN = """{
+  resources(first: %(edges)d) {
+    edges { cursor node { id name tags { name } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}"""
+
+STREAM = """{
+  resources(first: %(edges)d) {
+    edges @stream(initialCount: %(initial)d) { cursor node { id name tags { name } } }
+    ... on ResourceConnection @defer { pageInfo { hasNextPage endCursor } }
+  }
+}"""
+
+
+async def request(app, body: bytes, accept: bytes):
+    """Sends a request to the app, returns the times to the first body chunk and to the end"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/graphql",
+        "raw_path": b"/graphql",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"app"),
+            (b"content-type", b"application/json"),
+            (b"accept", accept),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("app", 80),
+    }
+    received = False
+    first = None
+    status = None
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # no disconnect while the response is sent
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal first, status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and first is None and message.get("body"):
+            first = time.perf_counter()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    end = time.perf_counter()
+    assert status == 200, status
+    return first - start, end - start
+
+
+async def main(args):
+    app = create_app()
+    await app.router.startup()
+    cases = {
+        "plain": (PLAIN, b"application/json"),
+        "stream": (STREAM, b"multipart/mixed; deferSpec=20220824, application/json"),
+    }
+    for name, (query, accept) in cases.items():
+        body = orjson.dumps({"query": query % {"edges": args.edges, "initial": args.initial}})
+        await request(app, body, accept)  # warm up
+        ttfb, total = [], []
+        for _ in range(args.repeat):
+            first, end = await request(app, body, accept)
+            ttfb.append(first)
+            total.append(end)
+        case = {"edges": args.edges, "initial": args.initial, "case": name}
+        report("incremental_delivery", {**case, "measure": "ttfb"}, ttfb)
+        report("incremental_delivery", {**case, "measure": "total"}, total)
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--edges", type=int, default=500)
+    parser.add_argument("--initial", type=int, default=10, help="initialCount of the streamed edges")
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,165 @@
+"""
+Latency and allocations of `get_page` from aio_sqlakeyset on a seeded dataset
+(see `benchmarks.dataset`), compared with the same page fetched with OFFSET.
+
+Cases are every combination of:
+- sort: `id`, `name_id` (name, id), `desc` (id descending) and `mixed` (name
+  descending, id ascending).
+- filter: none, or the grouped tag filter of the `resources` query (GROUP BY with
+  a HAVING on the number of matching tags) on the most popular tag or the three
+  most popular ones.
+- page size and page depth, the depth being the number of the page. Depths past
+  the end of the filtered rows are skipped.
+- direction: forward pages start after the last row of the previous page, backward
+  pages end before the first row of the next one, so both fetch the same rows.
+
+The keyset place of a page is found before measuring, with `get_page_at`. The
+OFFSET baseline runs `OFFSET (depth - 1) * per_page LIMIT per_page + 1` on the
+same sorted statement. `peak_kb` is the peak of allocations during one call,
+measured with tracemalloc on a separate call. Results are printed as json lines,
+and written to `--output` as well if given.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+
+from sqlalchemy import func, select
+
+from aio_sqlakeyset.paging import get_page, get_page_at
+from api.db.models import Resource
+from api.db.session import AsyncSessionLocal, engine
+from api.graphql.resource.types import ResourcesFilter
+from benchmarks.common import measure, report
+from benchmarks.dataset import dataset_size, seed, tag_name
+
+SORTS = {
+    "id": (Resource.id.asc(),),
+    "name_id": (Resource.name.asc(), Resource.id.asc()),
+    "desc": (Resource.id.desc(),),
+    "mixed": (Resource.name.desc(), Resource.id.asc()),
+}
+
+FILTERS = {
+    "none": None,
+    "tag": ResourcesFilter(tags=[tag_name(1)]),
+    "tags_3": ResourcesFilter(tags=[tag_name(1), tag_name(2), tag_name(3)]),
+}
+
+
+async def peak_kb(fn) -> float:
+    """Peak of the allocations made by one call of `fn`, in KiB"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        await fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+async def place_at(selectable, position, db, params):
+    """Keyset place right before the 0-based `position`, or False past the end"""
+    if position == 0:
+        return None
+    page = await get_page_at(selectable, 1, position - 1, db, params=params)
+    return page.paging.marker_n if page else False
+
+
+async def run_case(db, case, selectable, params, per_page, depth, repeat):
+    results = []
+    start = (depth - 1) * per_page
+
+    for backwards in (False, True):
+        position = start + per_page if backwards else start
+        place = await place_at(selectable, position, db, params)
+        if place is False:
+            # a backward page has to be followed by a row, to start from its place
+            continue
+
+        async def keyset():
+            return await get_page(selectable, per_page, db, place, backwards, params)
+
+        samples = await measure(keyset, repeat)
+        results.append(
+            report(
+                "keyset_pagination",
+                {**case, "method": "keyset", "backwards": backwards},
+                samples,
+                peak_kb=await peak_kb(keyset),
+            )
+        )
+
+    async def offset():
+        result = await db.execute(
+            selectable.offset(start).limit(per_page + 1), params
+        )
+        return result.all()
+
+    samples = await measure(offset, repeat)
+    results.append(
+        report(
+            "keyset_pagination",
+            {**case, "method": "offset", "backwards": False},
+            samples,
+            peak_kb=await peak_kb(offset),
+        )
+    )
+    return results
+
+
+async def main(args):
+    if args.resources:
+        await seed(args.resources)
+    results = []
+    async with AsyncSessionLocal() as db:
+        size = await dataset_size(db)
+        for filter_name in args.filters:
+            base = select(Resource.id)
+            params = {}
+            resource_filter = FILTERS[filter_name]
+            if resource_filter is not None:
+                base = resource_filter.add_filters(base)
+                params = resource_filter.bind_params()
+            rows = await db.scalar(
+                select(func.count()).select_from(base.subquery()), params
+            )
+            for sort in args.sorts:
+                selectable = base.order_by(*SORTS[sort])
+                for per_page in args.page_sizes:
+                    for depth in args.depths:
+                        if (depth - 1) * per_page >= rows:
+                            continue
+                        case = {
+                            **(size or {}),
+                            "rows": rows,
+                            "sort": sort,
+                            "filter": filter_name,
+                            "per_page": per_page,
+                            "depth": depth,
+                        }
+                        results += await run_case(
+                            db, case, selectable, params, per_page, depth, args.repeat
+                        )
+    await engine.dispose()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            for result in results:
+                output.write(json.dumps(result, default=str) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--resources", type=int, help="seed a dataset of this size first"
+    )
+    parser.add_argument("--sorts", nargs="+", choices=SORTS, default=list(SORTS))
+    parser.add_argument("--filters", nargs="+", choices=FILTERS, default=list(FILTERS))
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="file to write the results to, as json lines")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,151 @@
+"""
+End to end load test of the app in `api/app.py`: requests go through fastapi,
+strawberry, its extensions and validation, the dataloaders and the database, like
+in production, but without a network in between. The app is called in-process
+through httpx's ASGI transport.
+
+`--concurrency` clients each send one request at a time, picking operations from
+`benchmarks.operations` by weight, for `--duration` seconds after a `--warmup`.
+Every operation gets a json line with its throughput, latency percentiles and
+error count, and so does the whole mix. Statements per request are counted
+beforehand, running every operation `--statement-runs` times alone.
+
+Seed the dataset first, or pass `--resources` to have it seeded, see
+`benchmarks.dataset`. Settings are read as usual, so e.g. `RESULT_CACHE_ENABLED=1`
+load tests with the result cache. The mix creates resources, in the seeded
+dataset's namespace. Raise `MAX_QUERY_COST` if operations are rejected for their
+cost.
+"""
+import argparse
+import asyncio
+import time
+from random import Random
+from typing import Dict, List
+
+import httpx
+
+from api.app import app
+from api.db.session import AsyncSessionLocal, engine
+from api.settings import get_settings
+from benchmarks.common import StatementCounter, report
+from benchmarks.dataset import dataset_size, seed
+from benchmarks.operations import OPERATIONS
+
+
+class Stats:
+    """Latencies and errors of the requests of one operation"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self.errors = 0
+
+
+async def send(client: httpx.AsyncClient, body) -> bool:
+    """Sends a graphql request, returns whether it succeeded"""
+    response = await client.post("/graphql", json=body)
+    return response.status_code == 200 and not response.json().get("errors")
+
+
+async def count_statements(client, size, runs) -> Dict[str, float]:
+    """Mean number of statements per request of every operation, run alone"""
+    counts = {}
+    rng = Random(0)
+    for name, operation in OPERATIONS.items():
+        with StatementCounter(engine) as counter:
+            for _ in range(runs):
+                await send(client, operation.build(rng, size))
+        counts[name] = counter.count / runs
+    return counts
+
+
+async def client_loop(client, size, rng, stats, warmup_until, stop_at):
+    names = list(OPERATIONS)
+    weights = [OPERATIONS[name].weight for name in names]
+    while True:
+        name = rng.choices(names, weights)[0]
+        body = OPERATIONS[name].build(rng, size)
+        start = time.perf_counter()
+        if start >= stop_at:
+            return
+        try:
+            ok = await send(client, body)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if start < warmup_until:
+            continue
+        stats[name].samples.append(elapsed)
+        stats[name].errors += not ok
+
+
+async def main(args):
+    if args.resources:
+        await seed(args.resources)
+    async with AsyncSessionLocal() as db:
+        size = await dataset_size(db)
+    if not size or not size["resources"] or not size["tags"]:
+        raise SystemExit("Seed a dataset first, see benchmarks.dataset.")
+
+    settings = get_settings()
+    case = {
+        **size,
+        "concurrency": args.concurrency,
+        "result_cache": settings.result_cache_enabled,
+        "coalesce_queries": settings.coalesce_queries,
+        "read_only_nodes": settings.read_only_nodes,
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        statements = await count_statements(client, size, args.statement_runs)
+
+        stats = {name: Stats() for name in OPERATIONS}
+        now = time.perf_counter()
+        warmup_until = now + args.warmup
+        stop_at = warmup_until + args.duration
+        with StatementCounter(engine) as counter:
+            await asyncio.gather(
+                *(
+                    client_loop(
+                        client, size, Random(args.seed + index), stats, warmup_until, stop_at
+                    )
+                    for index in range(args.concurrency)
+                )
+            )
+
+    total = []
+    for name, operation_stats in stats.items():
+        if not operation_stats.samples:
+            continue
+        total += operation_stats.samples
+        report(
+            "load_test",
+            {**case, "operation": name},
+            operation_stats.samples,
+            requests=len(operation_stats.samples),
+            throughput=len(operation_stats.samples) / args.duration,
+            errors=operation_stats.errors,
+            statements_per_request=statements[name],
+        )
+    if total:
+        report(
+            "load_test",
+            {**case, "operation": "all"},
+            total,
+            requests=len(total),
+            throughput=len(total) / args.duration,
+            errors=sum(operation_stats.errors for operation_stats in stats.values()),
+            # statements are counted during the warmup too
+            statements_per_second=counter.count / (args.duration + args.warmup),
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--resources", type=int, help="seed a dataset of this size first")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds")
+    parser.add_argument("--statement-runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
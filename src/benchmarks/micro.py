@@ -0,0 +1,194 @@
+"""
+Microbenchmarks of the pure python hot spots of a graphql request, no database
+needed:
+- bookmark (de)serialization: `Serial.serialize_values`, `unserialize_values`,
+  `serialize_bookmark` and `unserialize_bookmark`.
+- `DataLoader.ensure_order` with thousands of keys.
+- `RelayIdExtension.resolve` on an id field and on any other field, next to the
+  bare resolver, for its overhead per field.
+- `CostValidator` alone on a document with many aliased connections.
+- building the ordering columns of a statement, `parse_ob_clause` and
+  `find_order_key`.
+
+Every case is timed with timeit, and reported per call as a json line. Track them
+against a baseline: `--save-baseline baseline.json` on the main branch, then
+`--compare baseline.json` on a branch flags every case that got slower by more
+than `--threshold` (a fraction), and exits with 1 if any did. The fastest sample
+is compared, like timeit does, as it's the least noisy. Timings depend on the
+machine, so compare runs from the same one.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import timeit
+from random import Random
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+from graphql import GraphQLID, GraphQLNonNull, GraphQLString, parse, validate
+from sqlalchemy import select
+
+from aio_sqlakeyset.columns import find_order_key, parse_ob_clause
+from aio_sqlakeyset.results import s as serial
+from aio_sqlakeyset.results import serialize_bookmark, unserialize_bookmark
+from api.db.models import Resource
+from api.graphql.core.extensions import RelayIdExtension
+from api.graphql.core.validators.query_cost import cost_validator
+from api.graphql.query_cost_map import COST_MAP
+from api.graphql.resource.dataloaders import ResourceRow, ResourceRowByIdLoader
+from api.graphql.schema import schema
+from benchmarks.common import summarize
+
+MARKER = ("Some resource name, with a comma", 123456, datetime.datetime(2022, 5, 1, 12))
+
+
+def bookmark_cases():
+    values = serial.serialize_values(MARKER)
+    bookmark = serialize_bookmark((MARKER, False))
+    return {
+        "serialize_values": lambda: serial.serialize_values(MARKER),
+        "unserialize_values": lambda: serial.unserialize_values(values),
+        "serialize_bookmark": lambda: serialize_bookmark((MARKER, False)),
+        "unserialize_bookmark": lambda: unserialize_bookmark(bookmark),
+    }
+
+
+def ensure_order_cases():
+    cases = {}
+    loader = ResourceRowByIdLoader({})
+    rng = Random(0)
+    for size in (1000, 10000):
+        keys = list(range(size))
+        results = [ResourceRow(key) for key in keys]
+        rng.shuffle(results)
+        cases[f"ensure_order_{size}"] = lambda keys=keys, results=results: (
+            loader.ensure_order(keys, results)
+        )
+    return cases
+
+
+def relay_id_cases():
+    extension = RelayIdExtension(execution_context=None)
+    root = SimpleNamespace(id=1, name="name")
+    parent_type = SimpleNamespace(name="Resource")
+    id_info = SimpleNamespace(
+        field_name="id", return_type=GraphQLNonNull(GraphQLID), parent_type=parent_type
+    )
+    name_info = SimpleNamespace(
+        field_name="name", return_type=GraphQLNonNull(GraphQLString), parent_type=parent_type
+    )
+
+    def _next(root, info):
+        return getattr(root, info.field_name)
+
+    return {
+        "resolver": lambda: _next(root, name_info),
+        "relay_id_extension_id": lambda: extension.resolve(_next, root, id_info),
+        "relay_id_extension_other": lambda: extension.resolve(_next, root, name_info),
+    }
+
+
+def cost_validator_cases():
+    rule = cost_validator(maximum_cost=10**9, cost_map=COST_MAP)
+    connection = """
+      r%d: resources(first: 20, sortBy: {field: NAME}) {
+        edges { node { id name description tags { id name resources(first: 5) {
+          edges { node { id name } } } } } }
+        pageInfo { hasNextPage endCursor }
+      }"""
+    document = parse("{%s}" % "".join(connection % index for index in range(100)))
+    graphql_schema = schema._schema
+    return {
+        "cost_validator_100_connections": lambda: validate(
+            graphql_schema, document, [rule]
+        )
+    }
+
+
+def order_key_cases():
+    selectable = select(Resource.id).order_by(Resource.name.desc(), Resource.id)
+
+    def order_keys():
+        order_cols = parse_ob_clause(selectable, False)
+        return [
+            find_order_key(ocol, selectable.column_descriptions) for ocol in order_cols
+        ]
+
+    return {"order_keys": order_keys}
+
+
+def time_case(fn: Callable, repeat: int):
+    """Per call durations of `repeat` timeit samples"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return [total / number for total in timer.repeat(repeat, number)]
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, float], threshold: float):
+    """Adds the change from the baseline to the results, returns the regressions"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["min_ms"] / baseline[name] - 1
+        result["baseline_min_ms"] = baseline[name]
+        result["change"] = round(change, 3)
+        result["regressed"] = change > threshold
+        if result["regressed"]:
+            regressions.append(name)
+    return regressions
+
+
+async def main(args):
+    # the dataloader wants a running event loop
+    cases = {
+        **bookmark_cases(),
+        **ensure_order_cases(),
+        **relay_id_cases(),
+        **cost_validator_cases(),
+        **order_key_cases(),
+    }
+    if args.cases:
+        cases = {name: fn for name, fn in cases.items() if name in args.cases}
+
+    results = {
+        name: {"benchmark": "micro", "case": name, **summarize(time_case(fn, args.repeat))}
+        for name, fn in cases.items()
+    }
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.threshold)
+    for result in results.values():
+        print(json.dumps(result), flush=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(
+                {name: result["min_ms"] for name, result in results.items()},
+                baseline_file,
+                indent=2,
+                sort_keys=True,
+            )
+    if regressions:
+        print(
+            f"{len(regressions)} regressions over {args.threshold:.0%}: "
+            + ", ".join(regressions),
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cases", nargs="+", help="only run these cases")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--save-baseline", help="file to save the timings to")
+    sys.exit(asyncio.run(main(parser.parse_args())))
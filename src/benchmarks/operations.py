@@ -0,0 +1,126 @@
+"""
+Representative graphql operations for load tests, over the dataset seeded by
+`benchmarks.dataset`. Every operation has a weight, its share of the traffic, and
+builds a request body out of a random generator and the size of the dataset.
+
+Values are inlined in the documents rather than passed as variables, since the
+query cost validator doesn't get to see the variables.
+"""
+import json
+import uuid
+from random import Random
+from typing import Any, Callable, Dict, NamedTuple
+
+from graphql_relay import to_global_id
+
+from aio_sqlakeyset.results import serialize_bookmark
+from benchmarks.dataset import RESOURCE_PREFIX, tag_name
+
+RESOURCE_FIELDS = "id name description"
+PAGE_INFO = "pageInfo { hasNextPage endCursor }"
+
+
+class Operation(NamedTuple):
+    weight: int
+    build: Callable[[Random, Dict[str, int]], Dict[str, Any]]
+
+
+def _body(operation_name: str, query: str) -> Dict[str, Any]:
+    return {"query": query, "operationName": operation_name}
+
+
+def _popular_tag(rng: Random, size: Dict[str, int]) -> str:
+    # the seeded fan-out makes the first tags the popular ones
+    return tag_name(rng.randint(1, min(10, size["tags"])))
+
+
+def resources_by_name(rng, size):
+    return _body(
+        "ResourcesByName",
+        """query ResourcesByName {
+          resources(first: 20, sortBy: {field: NAME}) {
+            totalCount edges { node { %s } } %s
+          }
+        }"""
+        % (RESOURCE_FIELDS, PAGE_INFO),
+    )
+
+
+def resources_by_tags(rng, size):
+    tags = {_popular_tag(rng, size) for _ in range(rng.randint(1, 2))}
+    return _body(
+        "ResourcesByTags",
+        """query ResourcesByTags {
+          resources(first: 20, filter: {tags: %s}, sortBy: {direction: DESC}) {
+            edges { node { %s tags { id name } } } %s
+          }
+        }"""
+        % (json.dumps(sorted(tags)), RESOURCE_FIELDS, PAGE_INFO),
+    )
+
+
+def resources_after(rng, size):
+    # a page somewhere in the middle, from the cursor of a random resource
+    cursor = serialize_bookmark(((rng.randint(1, size["resources"]),), False))
+    return _body(
+        "ResourcesAfter",
+        """query ResourcesAfter {
+          resources(first: 50, after: "%s") { edges { cursor node { %s } } %s }
+        }"""
+        % (cursor, RESOURCE_FIELDS, PAGE_INFO),
+    )
+
+
+def tags_nested(rng, size):
+    return _body(
+        "TagsNested",
+        """query TagsNested {
+          tags(first: 10) {
+            edges { node {
+              id name resourceCount
+              resources(first: 5, sortBy: {field: NAME}) {
+                totalCount edges { node { id name tags { name } } }
+              }
+            } }
+          }
+        }""",
+    )
+
+
+def resource_by_id(rng, size):
+    return _body(
+        "ResourceById",
+        """query ResourceById {
+          resource(id: %d) { %s tags { id name } }
+        }"""
+        % (rng.randint(1, size["resources"]), RESOURCE_FIELDS),
+    )
+
+
+def resource_create(rng, size):
+    tags = [
+        to_global_id("Tag", rng.randint(1, size["tags"]))
+        for _ in range(rng.randint(1, 3))
+    ]
+    # named like the seeded resources, so that reseeding doesn't refuse to replace
+    # them, and unique across runs since names are
+    name = f"{RESOURCE_PREFIX}load-{uuid.uuid4()}"
+    return _body(
+        "ResourceCreate",
+        """mutation ResourceCreate {
+          resourceCreate(input: {name: "%s", description: "load test", tags: %s}) {
+            id name tags { id }
+          }
+        }"""
+        % (name, json.dumps(sorted(set(tags)))),
+    )
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "resources_by_name": Operation(30, resources_by_name),
+    "resources_by_tags": Operation(15, resources_by_tags),
+    "resources_after": Operation(15, resources_after),
+    "tags_nested": Operation(10, tags_nested),
+    "resource_by_id": Operation(25, resource_by_id),
+    "resource_create": Operation(5, resource_create),
+}
@@ -0,0 +1,83 @@
+"""
+Builds pages out of already fetched rows, the way `get_page` does, and reports
+what a page costs on top of the rows themselves: the memory it keeps
+(`retained_kb`, `retained_blocks`), the peak while building it (`peak_kb`), and
+how long it takes to build it and read every row's first column and the page's
+bookmarks, like the graphql resolvers do.
+
+Tags are paged, sorted by id (no extra ordering columns) and by name (the name is
+added as an extra column, and trimmed off the rows). Fill the database with at
+least `per_page` tags first.
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+from sqlalchemy import select
+
+from aio_sqlakeyset.paging import _build_page, _prepare_selectable
+from api.db.models import Tag
+from api.db.session import AsyncSessionLocal, engine
+from benchmarks.common import measure, report
+
+SORTS = {"id": (Tag.id,), "name": (Tag.name, Tag.id)}
+
+
+def read(page):
+    ids = [row[0] for row in page]
+    return ids, page.paging.bookmark_first, page.paging.bookmark_last
+
+
+async def main(per_page, repeat):
+    async with AsyncSessionLocal() as db:
+        for sort, order_by in SORTS.items():
+            selectable = select(Tag.id).order_by(*order_by)
+            selectable, order_cols, mapped_ocols, extra_columns = _prepare_selectable(
+                selectable, db, None, False
+            )
+            selected = await db.execute(selectable.limit(per_page + 1))
+            row_keys = list(selected.keys())
+            rows = selected.all()
+            args = (row_keys, per_page, order_cols, mapped_ocols, len(extra_columns))
+
+            def build():
+                return _build_page(rows, *args, False, None)
+
+            gc.collect()
+            tracemalloc.start()
+            try:
+                before = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+                start, _ = tracemalloc.get_traced_memory()
+                page = build()
+                read(page)
+                _, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+            stats = after.compare_to(before, "filename")
+            retained = sum(stat.size_diff for stat in stats)
+            blocks = sum(stat.count_diff for stat in stats)
+
+            async def build_and_read():
+                read(build())
+
+            samples = await measure(build_and_read, repeat)
+            report(
+                "page_allocations",
+                {"sort": sort, "per_page": per_page, "rows": len(page)},
+                samples,
+                retained_kb=round(retained / 1024, 1),
+                retained_blocks=blocks,
+                peak_kb=round((peak - start) / 1024, 1),
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--per-page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.per_page, args.repeat))
@@ -0,0 +1,72 @@
+"""
+Loads the same resources, with their tags, through the ORM loader
+(`ResourceByIdLoader`) and the read-only row loader (`ResourceRowByIdLoader`), and
+reports how long it takes and how much memory it takes. See `read_only_nodes` in
+the settings.
+
+Memory is measured with tracemalloc, which slows everything down, so it's measured
+on a separate run from the latency: `peak_kb` is the peak while loading, and
+`retained_kb` what's still allocated once the nodes are loaded, with the session
+(and its identity map) still open. Resources are loaded by ids 1..n, so fill the
+database first.
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+from api.db.session import AsyncSessionLocal, engine
+from api.graphql.resource.dataloaders import ResourceByIdLoader, ResourceRowByIdLoader
+from benchmarks.common import StatementCounter, measure, report
+
+LOADERS = {"orm": ResourceByIdLoader, "rows": ResourceRowByIdLoader}
+
+
+async def load(loader_class, ids):
+    async with AsyncSessionLocal() as db:
+        return await loader_class({"db": db}).load_many(ids)
+
+
+async def memory(loader_class, ids):
+    """Peak and retained allocations in KiB, of loading `ids` in a new session"""
+    async with AsyncSessionLocal() as db:
+        # connect outside of the measurement
+        await db.connection()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            nodes = await loader_class({"db": db}).load_many(ids)
+            gc.collect()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        found = sum(node is not None for node in nodes)
+    return peak / 1024, retained / 1024, found
+
+
+async def main(sizes, repeat):
+    for size in sizes:
+        ids = list(range(1, size + 1))
+        for name, loader_class in LOADERS.items():
+            with StatementCounter(engine) as counter:
+                await load(loader_class, ids)
+            peak_kb, retained_kb, found = await memory(loader_class, ids)
+            samples = await measure(lambda: load(loader_class, ids), repeat)
+            report(
+                "read_path",
+                {"loader": name, "ids": size},
+                samples,
+                found=found,
+                statements=counter.count,
+                peak_kb=round(peak_kb),
+                retained_kb=round(retained_kb),
+            )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
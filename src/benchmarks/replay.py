@@ -0,0 +1,245 @@
+"""
+Replays graphql traffic captured with `TRAFFIC_CAPTURE_ENABLED=1` (see
+`api/graphql/core/capture.py`), and compares the latencies of two replays.
+
+`python -m benchmarks.replay run traffic.jsonl.1 traffic.jsonl --output a.jsonl`
+re-issues the captured operations in the order they arrived, keeping the time
+between them divided by `--speed` (1 is the captured rate, 2 twice as fast). It
+doesn't wait for responses before sending the next operation, up to
+`--max-in-flight` operations at a time. Operations go to `--target`, the url of
+the graphql endpoint of a running instance, or to the app in-process through
+httpx's ASGI transport, using the database from your settings. Mutations are
+skipped unless `--mutations`, since they'd write to the target. Redacted
+variables are sent redacted, so operations relying on them may fail.
+
+Every response is written to `--output` as a json line, and every operation gets
+a summary line with its latency percentiles, errors, and its captured median.
+
+`python -m benchmarks.replay diff a.jsonl b.jsonl` compares two such outputs, e.g.
+the same capture replayed against two builds: the latency percentiles of every
+operation in both, and the change of their medians. Operations whose median got
+slower by more than `--threshold` (a fraction) are flagged, and the diff exits
+with 1 if any are.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+import httpx
+
+from benchmarks.common import report, summarize
+
+
+def read_captures(paths: Iterable[str], mutations: bool = False) -> List[dict]:
+    """
+    Captured operations of the files, in the order they arrived, with their
+    documents. Operations whose document isn't in any file are dropped.
+    """
+    documents = {}
+    entries = []
+    for path in paths:
+        with open(path) as capture_file:
+            for line in capture_file:
+                entry = json.loads(line)
+                if "document" in entry:
+                    documents[entry["hash"]] = entry.pop("document")
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry["timestamp"])
+
+    captures = []
+    for entry in entries:
+        if entry["hash"] not in documents:
+            continue
+        if entry["operation_type"] == "mutation" and not mutations:
+            continue
+        captures.append({**entry, "document": documents[entry["hash"]]})
+    return captures
+
+
+def operation_label(entry: dict) -> str:
+    return entry["operation_name"] or entry["hash"][:12]
+
+
+async def send(client: httpx.AsyncClient, url: str, capture: dict) -> bool:
+    """Sends a captured operation, returns whether it succeeded"""
+    response = await client.post(
+        url,
+        json={
+            "query": capture["document"],
+            "variables": capture["variables"],
+            "operationName": capture["operation_name"],
+        },
+    )
+    return response.status_code == 200 and not response.json().get("errors")
+
+
+async def replay(client, url, captures, speed, max_in_flight, output):
+    semaphore = asyncio.Semaphore(max_in_flight)
+    first = captures[0]["timestamp"]
+    start = time.perf_counter()
+
+    async def _send(capture, scheduled):
+        async with semaphore:
+            sent = time.perf_counter()
+            try:
+                ok = await send(client, url, capture)
+            except Exception:
+                ok = False
+            latency = time.perf_counter() - sent
+        output.write(
+            json.dumps(
+                {
+                    "operation": operation_label(capture),
+                    "hash": capture["hash"],
+                    "latency_ms": round(latency * 1000, 3),
+                    # how late it was sent, a growing lag means the target can't keep up
+                    "lag_ms": round((sent - start - scheduled) * 1000, 3),
+                    "captured_ms": capture["duration_ms"],
+                    "ok": ok,
+                }
+            )
+            + "\n"
+        )
+
+    tasks = []
+    for capture in captures:
+        scheduled = (capture["timestamp"] - first) / speed
+        delay = scheduled - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(capture, scheduled)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start
+
+
+def read_results(path: str) -> Dict[str, List[dict]]:
+    results = defaultdict(list)
+    with open(path) as results_file:
+        for line in results_file:
+            result = json.loads(line)
+            results[result["operation"]].append(result)
+    return results
+
+
+async def run(args):
+    captures = read_captures(args.captures, args.mutations)
+    if args.limit:
+        captures = captures[: args.limit]
+    if not captures:
+        raise SystemExit("Nothing to replay.")
+
+    if args.target:
+        client = httpx.AsyncClient(timeout=args.timeout)
+        url = args.target
+    else:
+        from api.app import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://app",
+            timeout=args.timeout,
+        )
+        url = "/graphql"
+
+    async with client:
+        with open(args.output, "w") as output:
+            elapsed = await replay(
+                client, url, captures, args.speed, args.max_in_flight, output
+            )
+
+    if not args.target:
+        from api.db.session import engine
+
+        await engine.dispose()
+
+    case = {"target": args.target or "in-process", "speed": args.speed}
+    for operation, results in read_results(args.output).items():
+        report(
+            "replay",
+            {**case, "operation": operation},
+            [result["latency_ms"] / 1000 for result in results],
+            requests=len(results),
+            errors=sum(not result["ok"] for result in results),
+            captured_median_ms=statistics.median(
+                result["captured_ms"] for result in results
+            ),
+            max_lag_ms=max(result["lag_ms"] for result in results),
+        )
+    print(
+        json.dumps(
+            {
+                "benchmark": "replay",
+                **case,
+                "operation": "all",
+                "requests": len(captures),
+                "throughput": len(captures) / elapsed,
+            }
+        )
+    )
+
+
+def diff(args) -> int:
+    base = read_results(args.base)
+    new = read_results(args.new)
+    regressions = []
+    for operation in sorted(set(base) | set(new)):
+        result: Dict[str, Any] = {"benchmark": "replay_diff", "operation": operation}
+        for name, results in (("base", base.get(operation)), ("new", new.get(operation))):
+            if not results:
+                continue
+            latencies = [item["latency_ms"] / 1000 for item in results]
+            result[f"{name}_requests"] = len(results)
+            result[f"{name}_errors"] = sum(not item["ok"] for item in results)
+            for stat, value in summarize(latencies).items():
+                result[f"{name}_{stat}"] = value
+        if operation in base and operation in new:
+            change = result["new_median_ms"] / result["base_median_ms"] - 1
+            result["change"] = round(change, 3)
+            result["regressed"] = change > args.threshold
+            if result["regressed"]:
+                regressions.append(operation)
+        print(json.dumps(result), flush=True)
+
+    if regressions:
+        print(
+            f"{len(regressions)} regressions over {args.threshold:.0%}: "
+            + ", ".join(regressions),
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay captured traffic")
+    run_parser.add_argument("captures", nargs="+", help="capture files")
+    run_parser.add_argument("--output", required=True, help="file to write the responses to")
+    run_parser.add_argument("--target", help="graphql url, the app in-process by default")
+    run_parser.add_argument("--speed", type=float, default=1.0)
+    run_parser.add_argument("--max-in-flight", type=int, default=100)
+    run_parser.add_argument("--mutations", action="store_true", help="replay mutations too")
+    run_parser.add_argument("--limit", type=int, help="only replay the first operations")
+    run_parser.add_argument("--timeout", type=float, default=30, help="seconds")
+
+    diff_parser = commands.add_parser("diff", help="compare the latencies of two replays")
+    diff_parser.add_argument("base")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--threshold", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if args.speed <= 0:
+            parser.error("--speed must be positive")
+        asyncio.run(run(args))
+    else:
+        sys.exit(diff(args))
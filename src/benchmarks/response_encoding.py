@@ -0,0 +1,125 @@
+"""
+Encoding of large responses, the json module against orjson, on a `resources`
+connection of `--edges` edges (1000 by default) from the seeded dataset (see
+`benchmarks.dataset`), with the tags of every resource.
+
+Cases:
+- `graphql_json` and `graphql_orjson`: encoding the result, like strawberry's
+  `JSONResponse` and our router's `ORJSONResponse` do.
+- `graphql_request_json` and `graphql_request_orjson`: the whole request through
+  an app in-process, with strawberry's `execute_request` and with ours.
+- `rest_json` and `rest_orjson`: `--edges` resources as the REST route answers
+  them, validated pydantic models through `jsonable_encoder` and a `JSONResponse`,
+  against models built with `construct` in an `ORJSONResponse`.
+
+Raise `MAX_QUERY_COST` if the query is rejected for its cost.
+"""
+import argparse
+import asyncio
+import json
+import timeit
+
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from strawberry.fastapi import GraphQLRouter as BaseGraphQLRouter
+from strawberry.http import process_result
+
+from api.db.session import AsyncSessionLocal, engine
+from api.graphql.core.context import get_context_for_fastapi
+from api.graphql.core.router import GraphQLRouter
+from api.graphql.schema import get_schema
+from benchmarks.common import report
+from schemas.resource import Resource
+
+QUERY = """{
+  resources(first: %d) {
+    totalCount
+    edges { cursor node { id name description tags { id name } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}"""
+
+
+class JSONGraphQLRouter(GraphQLRouter):
+    """Our router, answering with strawberry's `JSONResponse` like before orjson"""
+
+    execute_request = BaseGraphQLRouter.execute_request
+
+
+def time_case(fn, repeat):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return [total / number for total in timer.repeat(repeat, number)]
+
+
+async def time_requests(client, path, body, repeat):
+    samples = []
+    for index in range(repeat + 1):
+        start = asyncio.get_running_loop().time()
+        response = await client.post(path, json=body)
+        assert response.status_code == 200 and "errors" not in response.json()
+        if index:  # the first one warms up
+            samples.append(asyncio.get_running_loop().time() - start)
+    return samples
+
+
+async def main(args):
+    schema = get_schema()
+    query = QUERY % args.edges
+    async with AsyncSessionLocal() as db:
+        result = await schema.execute(query, context_value={"db": db})
+    if result.errors:
+        raise SystemExit(result.errors[0].message)
+    data = process_result(result)
+    nodes = [edge["node"] for edge in data["data"]["resources"]["edges"]]
+    size = len(json.dumps(data))
+    case = {"edges": len(nodes), "bytes": size}
+
+    report("response_encoding", {**case, "case": "graphql_json"},
+           time_case(lambda: JSONResponse(data), args.repeat))
+    report("response_encoding", {**case, "case": "graphql_orjson"},
+           time_case(lambda: ORJSONResponse(data), args.repeat))
+
+    app = FastAPI()
+    for path, router_class in (("/json", JSONGraphQLRouter), ("/orjson", GraphQLRouter)):
+        app.include_router(
+            router_class(schema, context_getter=get_context_for_fastapi), prefix=path
+        )
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        for path in ("/json", "/orjson"):
+            samples = await time_requests(client, path, {"query": query}, args.requests)
+            report(
+                "response_encoding",
+                {**case, "case": f"graphql_request_{path[1:]}"},
+                samples,
+            )
+
+    rows = [
+        {
+            "name": node["name"],
+            "description": node["description"] or "",
+            "tags": [tag["name"] for tag in node["tags"]],
+        }
+        for node in nodes
+    ]
+
+    def rest_json():
+        return JSONResponse(jsonable_encoder([Resource(**row) for row in rows]))
+
+    def rest_orjson():
+        return ORJSONResponse([Resource.construct(**row).dict() for row in rows])
+
+    report("response_encoding", {**case, "case": "rest_json"}, time_case(rest_json, args.repeat))
+    report("response_encoding", {**case, "case": "rest_orjson"}, time_case(rest_orjson, args.repeat))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--edges", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5, help="timeit samples")
+    parser.add_argument("--requests", type=int, default=20, help="requests per router")
+    asyncio.run(main(parser.parse_args()))
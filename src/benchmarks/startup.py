@@ -0,0 +1,123 @@
+"""
+Cold start of the app, measured in fresh python processes, each one going through:
+- `import`: importing `api.app`.
+- `app`: getting `api.app.app`, which builds the app, its routes and the graphql
+  schema.
+- `startup`: the app's startup handlers, like a server runs them.
+- `first_request`: answering `{ __typename }` in-process, which doesn't need the
+  database.
+
+Every phase is reported with its median over `--runs` processes, in milliseconds,
+as a json line. Then comes the import time profile of one more process, run with
+python's `-X importtime` since it slows imports down: the `--top` slowest modules
+of the app by cumulative import time, and the `--top` slowest third party
+packages by the time spent importing their own modules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PACKAGES = ("api", "aio_sqlakeyset", "dependencies", "schemas", "exceptions")
+
+PROCESS = """
+import asyncio, json, time
+start = time.perf_counter()
+phases = {}
+import api.app
+phases["import"] = time.perf_counter()
+app = api.app.app
+phases["app"] = time.perf_counter()
+asyncio.run(app.router.startup())
+phases["startup"] = time.perf_counter()
+import httpx
+async def first_request():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        response = await client.post("/graphql", json={"query": "{ __typename }"})
+        assert response.status_code == 200, response.text
+before = time.perf_counter()
+asyncio.run(first_request())
+# not counting the import of httpx
+phases["first_request"] = time.perf_counter() - before + phases["startup"]
+previous = start
+for phase in ("import", "app", "startup", "first_request"):
+    phases[phase], previous = phases[phase] - previous, phases[phase]
+phases["total"] = sum(phases.values())
+print(json.dumps(phases))
+"""
+
+
+def run_process(
+    importtime: bool = False,
+) -> Tuple[Dict[str, float], List[Tuple[str, int, int]]]:
+    """Phases of one process in seconds, and its import times in microseconds"""
+    options = ["-X", "importtime"] if importtime else []
+    completed = subprocess.run(
+        [sys.executable, "-W", "ignore", *options, "-c", PROCESS],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return json.loads(completed.stdout.splitlines()[-1]), imports
+
+
+def top_modules(imports, top: int):
+    """Slowest modules of the app, and slowest third party top level packages"""
+    app_modules = [
+        (name, cumulative)
+        for name, _, cumulative in imports
+        if name.split(".")[0] in APP_PACKAGES
+    ]
+    packages = defaultdict(int)
+    for name, self_us, _ in imports:
+        package = name.split(".")[0]
+        if package not in APP_PACKAGES:
+            packages[package] += self_us
+    return (
+        sorted(app_modules, key=lambda item: -item[1])[:top],
+        sorted(packages.items(), key=lambda item: -item[1])[:top],
+    )
+
+
+def main(args):
+    runs = [run_process() for _ in range(args.runs)]
+    phases = {
+        f"{phase}_ms": round(statistics.median(run[0][phase] for run in runs) * 1000, 1)
+        for phase in runs[0][0]
+    }
+    print(json.dumps({"benchmark": "startup", "runs": args.runs, **phases}))
+
+    _, imports = run_process(importtime=True)
+    app_modules, packages = top_modules(imports, args.top)
+    for name, cumulative in app_modules:
+        print(
+            json.dumps(
+                {"benchmark": "startup_imports", "module": name, "cumulative_ms": cumulative / 1000}
+            )
+        )
+    for name, self_us in packages:
+        print(
+            json.dumps(
+                {"benchmark": "startup_imports", "package": name, "self_ms": self_us / 1000}
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    main(parser.parse_args())
@@ -3,13 +3,13 @@ import traceback
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.db.session import AsyncSessionLocal
+from api.db.session import get_sessionmaker
 
 logger = logging.getLogger(__name__)
 
 
 async def get_db() -> AsyncSession:
-    async with AsyncSessionLocal() as session:
+    async with get_sessionmaker()() as session:
         try:
             yield session
         except Exception as exc:
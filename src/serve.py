@@ -0,0 +1,87 @@
+"""
+Production entry point, `python serve.py` from the src folder. `__main__.py` is the
+development server.
+
+Runs the app with gunicorn, managing `WEB_CONCURRENCY` uvicorn worker processes
+(one per core by default) that use uvloop and httptools:
+- the app is built, and the database driver imported, once in the master process
+  before forking the workers, so they share its memory and start faster. The
+  engine isn't created until the app's startup, which runs in every worker after
+  the fork, so workers never share a pool.
+- every worker gets its share of `DB_CONNECTION_BUDGET`, see `pool_options` in
+  `api/db/session.py`. There are never more workers than connections in the budget.
+- every worker has its own result cache, which only learns of the writes of the
+  others after `RESULT_CACHE_TTL`. With http caching enabled, cached results are
+  served only if the versions of what they read haven't changed, which does see
+  them. Running several workers with the result cache but without it warns.
+- on SIGTERM, workers stop accepting connections, finish the requests in flight,
+  and close their database connections on shutdown. Workers still busy after
+  `GRACEFUL_TIMEOUT` seconds are killed.
+"""
+import logging
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from api.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+
+class Application(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from api.app import create_app
+        from api.db.session import import_driver
+
+        import_driver()
+        return create_app()
+
+
+def main():
+    if settings.web_concurrency and settings.web_concurrency > settings.worker_count:
+        logger.warning(
+            "Running %d workers rather than WEB_CONCURRENCY=%d, one per connection "
+            "of DB_CONNECTION_BUDGET.",
+            settings.worker_count,
+            settings.web_concurrency,
+        )
+    if (
+        settings.worker_count > 1
+        and settings.result_cache_enabled
+        and not settings.http_cache_enabled
+    ):
+        logger.warning(
+            "Every worker has its own result cache, which can serve results older "
+            "than the writes of the other workers until they expire "
+            "(RESULT_CACHE_TTL=%s). Enable HTTP_CACHE_ENABLED to check cached "
+            "results against the table versions instead.",
+            settings.result_cache_ttl,
+        )
+    Application(
+        {
+            "bind": f"{settings.host}:{settings.port}",
+            "workers": settings.worker_count,
+            # by path, gunicorn logs its name
+            "worker_class": "serve.Worker",
+            "preload_app": True,
+            "graceful_timeout": settings.graceful_timeout,
+            "loglevel": settings.log_level,
+        }
+    ).run()
+
+
+if __name__ == "__main__":
+    main()